@@ -0,0 +1,226 @@
+# Bundled city list for the offline gazetteer: (name, country code, lat, lon, population).
+# Country codes match COUNTRIES; populations are approximate and only used for ranking.
+CITIES = [
+    # India
+    ("Mumbai", "in", 19.0760, 72.8777, 12442373), ("Delhi", "in", 28.6139, 77.2090, 11034555),
+    ("Bengaluru", "in", 12.9716, 77.5946, 8443675), ("Hyderabad", "in", 17.3850, 78.4867, 6809970),
+    ("Ahmedabad", "in", 23.0225, 72.5714, 5577940), ("Chennai", "in", 13.0827, 80.2707, 4646732),
+    ("Kolkata", "in", 22.5726, 88.3639, 4496694), ("Surat", "in", 21.1702, 72.8311, 4467797),
+    ("Pune", "in", 18.5204, 73.8567, 3124458), ("Jaipur", "in", 26.9124, 75.7873, 3046163),
+    ("Lucknow", "in", 26.8467, 80.9462, 2817105), ("Kanpur", "in", 26.4499, 80.3319, 2765348),
+    ("Nagpur", "in", 21.1458, 79.0882, 2405665), ("Indore", "in", 22.7196, 75.8577, 1964086),
+    ("Thane", "in", 19.2183, 72.9781, 1841488), ("Bhopal", "in", 23.2599, 77.4126, 1798218),
+    ("Visakhapatnam", "in", 17.6868, 83.2185, 1728128), ("Patna", "in", 25.5941, 85.1376, 1684222),
+    ("Vadodara", "in", 22.3072, 73.1812, 1670806), ("Ghaziabad", "in", 28.6692, 77.4538, 1648643),
+    ("Ludhiana", "in", 30.9010, 75.8573, 1618879), ("Agra", "in", 27.1767, 78.0081, 1585704),
+    ("Nashik", "in", 19.9975, 73.7898, 1486053), ("Faridabad", "in", 28.4089, 77.3178, 1414050),
+    ("Meerut", "in", 28.9845, 77.7064, 1305429), ("Rajkot", "in", 22.3039, 70.8022, 1286678),
+    ("Varanasi", "in", 25.3176, 82.9739, 1198491), ("Srinagar", "in", 34.0837, 74.7973, 1180570),
+    ("Aurangabad", "in", 19.8762, 75.3433, 1175116), ("Dhanbad", "in", 23.7957, 86.4304, 1162472),
+    ("Amritsar", "in", 31.6340, 74.8723, 1132761), ("Prayagraj", "in", 25.4358, 81.8463, 1112544),
+    ("Ranchi", "in", 23.3441, 85.3096, 1073427), ("Howrah", "in", 22.5958, 88.2636, 1072161),
+    ("Coimbatore", "in", 11.0168, 76.9558, 1061447), ("Jabalpur", "in", 23.1815, 79.9864, 1055525),
+    ("Gwalior", "in", 26.2183, 78.1828, 1054420), ("Vijayawada", "in", 16.5062, 80.6480, 1048240),
+    ("Jodhpur", "in", 26.2389, 73.0243, 1033756), ("Madurai", "in", 9.9252, 78.1198, 1017865),
+    ("Raipur", "in", 21.2514, 81.6296, 1010087), ("Kota", "in", 25.2138, 75.8648, 1001694),
+    ("Guwahati", "in", 26.1445, 91.7362, 962334), ("Chandigarh", "in", 30.7333, 76.7794, 960787),
+    ("Solapur", "in", 17.6599, 75.9064, 951558), ("Tiruchirappalli", "in", 10.7905, 78.7047, 916857),
+    ("Bareilly", "in", 28.3670, 79.4304, 903668), ("Mysuru", "in", 12.2958, 76.6394, 887446),
+    ("Tiruppur", "in", 11.1085, 77.3411, 877778), ("Gurugram", "in", 28.4595, 77.0266, 876824),
+    ("Aligarh", "in", 27.8974, 78.0880, 874408), ("Jalandhar", "in", 31.3260, 75.5762, 862886),
+    ("Bhubaneswar", "in", 20.2961, 85.8245, 837737), ("Salem", "in", 11.6643, 78.1460, 829267),
+    ("Warangal", "in", 17.9689, 79.5941, 811844), ("Thiruvananthapuram", "in", 8.5241, 76.9366, 752490),
+    ("Guntur", "in", 16.3067, 80.4365, 743354), ("Bhiwandi", "in", 19.2813, 73.0483, 711329),
+    ("Kochi", "in", 9.9312, 76.2673, 677381), ("Dehradun", "in", 30.3165, 78.0322, 578420),
+    ("Mangaluru", "in", 12.9141, 74.8560, 499487), ("Tirupati", "in", 13.6288, 79.4192, 374260),
+    ("Nellore", "in", 14.4426, 79.9865, 505258), ("Karimnagar", "in", 18.4386, 79.1288, 261185),
+    ("Nizamabad", "in", 18.6725, 78.0941, 311152), ("Kurnool", "in", 15.8281, 78.0373, 484327),
+    ("Shimla", "in", 31.1048, 77.1734, 169578), ("Panaji", "in", 15.4909, 73.8278, 114405),
+    ("Puducherry", "in", 11.9416, 79.8083, 244377), ("Jammu", "in", 32.7266, 74.8570, 502197),
+    ("Udaipur", "in", 24.5854, 73.7125, 451100), ("Ajmer", "in", 26.4499, 74.6399, 542321),
+    ("Secunderabad", "in", 17.4399, 78.4983, 217910), ("Noida", "in", 28.5355, 77.3910, 637272),
+    # United States
+    ("New York", "us", 40.7128, -74.0060, 8336817), ("Los Angeles", "us", 34.0522, -118.2437, 3979576),
+    ("Chicago", "us", 41.8781, -87.6298, 2693976), ("Houston", "us", 29.7604, -95.3698, 2320268),
+    ("Phoenix", "us", 33.4484, -112.0740, 1680992), ("Philadelphia", "us", 39.9526, -75.1652, 1584064),
+    ("San Antonio", "us", 29.4241, -98.4936, 1547253), ("San Diego", "us", 32.7157, -117.1611, 1423851),
+    ("Dallas", "us", 32.7767, -96.7970, 1343573), ("San Jose", "us", 37.3382, -121.8863, 1021795),
+    ("Austin", "us", 30.2672, -97.7431, 978908), ("Jacksonville", "us", 30.3322, -81.6557, 911507),
+    ("San Francisco", "us", 37.7749, -122.4194, 881549), ("Columbus", "us", 39.9612, -82.9988, 898553),
+    ("Seattle", "us", 47.6062, -122.3321, 753675), ("Denver", "us", 39.7392, -104.9903, 727211),
+    ("Washington", "us", 38.9072, -77.0369, 705749), ("Boston", "us", 42.3601, -71.0589, 692600),
+    ("Nashville", "us", 36.1627, -86.7816, 670820), ("Detroit", "us", 42.3314, -83.0458, 670031),
+    ("Portland", "us", 45.5152, -122.6784, 654741), ("Las Vegas", "us", 36.1699, -115.1398, 651319),
+    ("Atlanta", "us", 33.7490, -84.3880, 506811), ("Miami", "us", 25.7617, -80.1918, 467963),
+    ("Minneapolis", "us", 44.9778, -93.2650, 429606), ("New Orleans", "us", 29.9511, -90.0715, 390144),
+    ("Honolulu", "us", 21.3069, -157.8583, 345064), ("Anchorage", "us", 61.2181, -149.9003, 288000),
+    # Canada, Mexico, Central America, Caribbean
+    ("Toronto", "ca", 43.6532, -79.3832, 2731571), ("Montreal", "ca", 45.5017, -73.5673, 1704694),
+    ("Calgary", "ca", 51.0447, -114.0719, 1239220), ("Ottawa", "ca", 45.4215, -75.6972, 934243),
+    ("Edmonton", "ca", 53.5461, -113.4938, 932546), ("Vancouver", "ca", 49.2827, -123.1207, 631486),
+    ("Mexico City", "mx", 19.4326, -99.1332, 9209944), ("Guadalajara", "mx", 20.6597, -103.3496, 1385629),
+    ("Monterrey", "mx", 25.6866, -100.3161, 1142994), ("Puebla", "mx", 19.0414, -98.2063, 1692181),
+    ("Cancun", "mx", 21.1619, -86.8515, 888797), ("Guatemala City", "gt", 14.6349, -90.5069, 2450212),
+    ("San Salvador", "sv", 13.6929, -89.2182, 567698), ("Tegucigalpa", "hn", 14.0723, -87.1921, 1682725),
+    ("Managua", "ni", 12.1140, -86.2362, 1055247), ("San Jose", "cr", 9.9281, -84.0907, 342188),
+    ("Panama City", "pa", 8.9824, -79.5199, 880691), ("Belmopan", "bz", 17.2510, -88.7590, 20621),
+    ("Havana", "cu", 23.1136, -82.3666, 2130081), ("Kingston", "jm", 17.9712, -76.7936, 662426),
+    ("Santo Domingo", "do", 18.4861, -69.9312, 2908607), ("Port-au-Prince", "ht", 18.5944, -72.3074, 987310),
+    ("Nassau", "bs", 25.0443, -77.3504, 274400), ("Bridgetown", "bb", 13.0975, -59.6167, 110000),
+    ("Port of Spain", "tt", 10.6596, -61.5019, 37074),
+    # South America
+    ("Sao Paulo", "br", -23.5505, -46.6333, 12325232), ("Rio de Janeiro", "br", -22.9068, -43.1729, 6747815),
+    ("Brasilia", "br", -15.7939, -47.8828, 3055149), ("Salvador", "br", -12.9777, -38.5016, 2886698),
+    ("Fortaleza", "br", -3.7319, -38.5267, 2686612), ("Belo Horizonte", "br", -19.9167, -43.9345, 2521564),
+    ("Manaus", "br", -3.1190, -60.0217, 2219580), ("Recife", "br", -8.0476, -34.8770, 1653461),
+    ("Buenos Aires", "ar", -34.6037, -58.3816, 3075646), ("Cordoba", "ar", -31.4201, -64.1888, 1391000),
+    ("Rosario", "ar", -32.9442, -60.6505, 1193605), ("Lima", "pe", -12.0464, -77.0428, 9751717),
+    ("Bogota", "co", 4.7110, -74.0721, 7412566), ("Medellin", "co", 6.2442, -75.5812, 2529403),
+    ("Cali", "co", 3.4516, -76.5320, 2227642), ("Santiago", "cl", -33.4489, -70.6693, 6257516),
+    ("Caracas", "ve", 10.4806, -66.9036, 1943901), ("Quito", "ec", -0.1807, -78.4678, 2011388),
+    ("Guayaquil", "ec", -2.1710, -79.9224, 2723665), ("La Paz", "bo", -16.4897, -68.1193, 757184),
+    ("Santa Cruz de la Sierra", "bo", -17.8146, -63.1561, 1453549), ("Asuncion", "py", -25.2637, -57.5759, 521559),
+    ("Montevideo", "uy", -34.9011, -56.1645, 1319108), ("Georgetown", "gy", 6.8013, -58.1551, 118363),
+    ("Paramaribo", "sr", 5.8520, -55.2038, 240924),
+    # Europe
+    ("London", "gb", 51.5074, -0.1278, 8982000), ("Birmingham", "gb", 52.4862, -1.8904, 1141816),
+    ("Manchester", "gb", 53.4808, -2.2426, 553230), ("Glasgow", "gb", 55.8642, -4.2518, 635640),
+    ("Edinburgh", "gb", 55.9533, -3.1883, 524930), ("Liverpool", "gb", 53.4084, -2.9916, 498042),
+    ("Dublin", "ie", 53.3498, -6.2603, 554554), ("Paris", "fr", 48.8566, 2.3522, 2165423),
+    ("Marseille", "fr", 43.2965, 5.3698, 870018), ("Lyon", "fr", 45.7640, 4.8357, 516092),
+    ("Toulouse", "fr", 43.6047, 1.4442, 479553), ("Nice", "fr", 43.7102, 7.2620, 342669),
+    ("Berlin", "de", 52.5200, 13.4050, 3644826), ("Hamburg", "de", 53.5511, 9.9937, 1841179),
+    ("Munich", "de", 48.1351, 11.5820, 1471508), ("Cologne", "de", 50.9375, 6.9603, 1085664),
+    ("Frankfurt", "de", 50.1109, 8.6821, 753056), ("Stuttgart", "de", 48.7758, 9.1829, 634830),
+    ("Madrid", "es", 40.4168, -3.7038, 3223334), ("Barcelona", "es", 41.3851, 2.1734, 1620343),
+    ("Valencia", "es", 39.4699, -0.3763, 791413), ("Seville", "es", 37.3891, -5.9845, 688711),
+    ("Lisbon", "pt", 38.7223, -9.1393, 504718), ("Porto", "pt", 41.1579, -8.6291, 237591),
+    ("Rome", "it", 41.9028, 12.4964, 2872800), ("Milan", "it", 45.4642, 9.1900, 1352000),
+    ("Naples", "it", 40.8518, 14.2681, 959470), ("Turin", "it", 45.0703, 7.6869, 870952),
+    ("Amsterdam", "nl", 52.3676, 4.9041, 872680), ("Rotterdam", "nl", 51.9244, 4.4777, 651446),
+    ("Brussels", "be", 50.8503, 4.3517, 185103), ("Antwerp", "be", 51.2194, 4.4025, 529247),
+    ("Luxembourg", "lu", 49.6116, 6.1319, 124528), ("Zurich", "ch", 47.3769, 8.5417, 415367),
+    ("Geneva", "ch", 46.2044, 6.1432, 203856), ("Bern", "ch", 46.9480, 7.4474, 133883),
+    ("Vienna", "at", 48.2082, 16.3738, 1911191), ("Prague", "cz", 50.0755, 14.4378, 1309000),
+    ("Warsaw", "pl", 52.2297, 21.0122, 1790658), ("Krakow", "pl", 50.0647, 19.9450, 779115),
+    ("Budapest", "hu", 47.4979, 19.0402, 1752286), ("Bratislava", "sk", 48.1486, 17.1077, 437725),
+    ("Ljubljana", "si", 46.0569, 14.5058, 295504), ("Zagreb", "hr", 45.8150, 15.9819, 806341),
+    ("Belgrade", "rs", 44.7866, 20.4489, 1166763), ("Sarajevo", "ba", 43.8563, 18.4131, 275524),
+    ("Podgorica", "me", 42.4304, 19.2594, 150977), ("Skopje", "mk", 41.9973, 21.4280, 544086),
+    ("Tirana", "al", 41.3275, 19.8187, 418495), ("Athens", "gr", 37.9838, 23.7275, 664046),
+    ("Thessaloniki", "gr", 40.6401, 22.9444, 325182), ("Sofia", "bg", 42.6977, 23.3219, 1241675),
+    ("Bucharest", "ro", 44.4268, 26.1025, 1883425), ("Chisinau", "md", 47.0105, 28.8638, 532513),
+    ("Kyiv", "ua", 50.4501, 30.5234, 2962180), ("Kharkiv", "ua", 49.9935, 36.2304, 1443207),
+    ("Odesa", "ua", 46.4825, 30.7233, 1017699), ("Minsk", "by", 53.9006, 27.5590, 2009786),
+    ("Vilnius", "lt", 54.6872, 25.2797, 588412), ("Riga", "lv", 56.9496, 24.1052, 632614),
+    ("Tallinn", "ee", 59.4370, 24.7536, 437619), ("Helsinki", "fi", 60.1699, 24.9384, 656229),
+    ("Stockholm", "se", 59.3293, 18.0686, 975904), ("Gothenburg", "se", 57.7089, 11.9746, 583056),
+    ("Oslo", "no", 59.9139, 10.7522, 697010), ("Bergen", "no", 60.3913, 5.3221, 285911),
+    ("Copenhagen", "dk", 55.6761, 12.5683, 794128), ("Reykjavik", "is", 64.1466, -21.9426, 131136),
+    ("Moscow", "ru", 55.7558, 37.6173, 12506468), ("Saint Petersburg", "ru", 59.9311, 30.3609, 5351935),
+    ("Novosibirsk", "ru", 55.0084, 82.9357, 1625631), ("Yekaterinburg", "ru", 56.8389, 60.6057, 1493749),
+    ("Kazan", "ru", 55.8304, 49.0661, 1257391), ("Vladivostok", "ru", 43.1198, 131.8869, 606653),
+    ("Valletta", "mt", 35.8989, 14.5146, 5827), ("Nicosia", "cy", 35.1856, 33.3823, 200452),
+    ("Monaco", "mc", 43.7384, 7.4246, 38300), ("Andorra la Vella", "ad", 42.5063, 1.5218, 22256),
+    ("San Marino", "sm", 43.9424, 12.4578, 4061), ("Vaduz", "li", 47.1410, 9.5209, 5696),
+    # Middle East and Central Asia
+    ("Istanbul", "tr", 41.0082, 28.9784, 15462452), ("Ankara", "tr", 39.9334, 32.8597, 5663322),
+    ("Izmir", "tr", 38.4237, 27.1428, 2972900), ("Tehran", "ir", 35.6892, 51.3890, 8693706),
+    ("Mashhad", "ir", 36.2605, 59.6168, 3001184), ("Isfahan", "ir", 32.6546, 51.6680, 1961260),
+    ("Baghdad", "iq", 33.3152, 44.3661, 7216000), ("Basra", "iq", 30.5085, 47.7804, 1326564),
+    ("Riyadh", "sa", 24.7136, 46.6753, 7676654), ("Jeddah", "sa", 21.4858, 39.1925, 4697000),
+    ("Mecca", "sa", 21.3891, 39.8579, 2042000), ("Dubai", "ae", 25.2048, 55.2708, 3331420),
+    ("Abu Dhabi", "ae", 24.4539, 54.3773, 1483000), ("Doha", "qa", 25.2854, 51.5310, 956457),
+    ("Manama", "bh", 26.2285, 50.5860, 157474), ("Kuwait City", "kw", 29.3759, 47.9774, 2989000),
+    ("Muscat", "om", 23.5880, 58.3829, 1421409), ("Sanaa", "ye", 15.3694, 44.1910, 2545000),
+    ("Amman", "jo", 31.9454, 35.9284, 4007526), ("Beirut", "lb", 33.8938, 35.5018, 361366),
+    ("Damascus", "sy", 33.5138, 36.2765, 2079000), ("Jerusalem", "il", 31.7683, 35.2137, 936425),
+    ("Tel Aviv", "il", 32.0853, 34.7818, 460613), ("Gaza", "ps", 31.5017, 34.4668, 590481),
+    ("Tbilisi", "ge", 41.7151, 44.8271, 1118035), ("Yerevan", "am", 40.1792, 44.4991, 1092800),
+    ("Baku", "az", 40.4093, 49.8671, 2293100), ("Almaty", "kz", 43.2220, 76.8512, 1977011),
+    ("Astana", "kz", 51.1694, 71.4491, 1239900), ("Tashkent", "uz", 41.2995, 69.2401, 2571668),
+    ("Bishkek", "kg", 42.8746, 74.5698, 1074075), ("Dushanbe", "tj", 38.5598, 68.7870, 863400),
+    ("Ashgabat", "tm", 37.9601, 58.3261, 1030063), ("Kabul", "af", 34.5553, 69.2075, 4434550),
+    # South Asia (outside India)
+    ("Karachi", "pk", 24.8607, 67.0011, 14910352), ("Lahore", "pk", 31.5204, 74.3587, 11126285),
+    ("Faisalabad", "pk", 31.4504, 73.1350, 3203846), ("Islamabad", "pk", 33.6844, 73.0479, 1014825),
+    ("Dhaka", "bd", 23.8103, 90.4125, 8906039), ("Chittagong", "bd", 22.3569, 91.7832, 2592439),
+    ("Kathmandu", "np", 27.7172, 85.3240, 845767), ("Thimphu", "bt", 27.4728, 89.6390, 114551),
+    ("Colombo", "lk", 6.9271, 79.8612, 752993), ("Male", "mv", 4.1755, 73.5093, 133412),
+    # East and Southeast Asia
+    ("Tokyo", "jp", 35.6762, 139.6503, 13960000), ("Yokohama", "jp", 35.4437, 139.6380, 3757630),
+    ("Osaka", "jp", 34.6937, 135.5023, 2753862), ("Nagoya", "jp", 35.1815, 136.9066, 2320361),
+    ("Sapporo", "jp", 43.0618, 141.3545, 1973395), ("Fukuoka", "jp", 33.5904, 130.4017, 1612392),
+    ("Kyoto", "jp", 35.0116, 135.7681, 1463723), ("Seoul", "kr", 37.5665, 126.9780, 9776000),
+    ("Busan", "kr", 35.1796, 129.0756, 3429000), ("Incheon", "kr", 37.4563, 126.7052, 2957026),
+    ("Pyongyang", "kp", 39.0392, 125.7625, 3038000), ("Beijing", "cn", 39.9042, 116.4074, 21540000),
+    ("Shanghai", "cn", 31.2304, 121.4737, 24870000), ("Guangzhou", "cn", 23.1291, 113.2644, 18676605),
+    ("Shenzhen", "cn", 22.5431, 114.0579, 17560061), ("Chengdu", "cn", 30.5728, 104.0668, 16330000),
+    ("Chongqing", "cn", 29.4316, 106.9123, 15872179), ("Tianjin", "cn", 39.3434, 117.3616, 13866009),
+    ("Wuhan", "cn", 30.5928, 114.3055, 12326518), ("Xi'an", "cn", 34.3416, 108.9398, 12952907),
+    ("Hangzhou", "cn", 30.2741, 120.1551, 11936010), ("Nanjing", "cn", 32.0603, 118.7969, 9314685),
+    ("Harbin", "cn", 45.8038, 126.5350, 10009854), ("Hong Kong", "cn", 22.3193, 114.1694, 7482500),
+    ("Taipei", "tw", 25.0330, 121.5654, 2646204), ("Kaohsiung", "tw", 22.6273, 120.3014, 2773533),
+    ("Ulaanbaatar", "mn", 47.8864, 106.9057, 1466125), ("Bangkok", "th", 13.7563, 100.5018, 10539000),
+    ("Chiang Mai", "th", 18.7883, 98.9853, 127240), ("Hanoi", "vn", 21.0278, 105.8342, 8053663),
+    ("Ho Chi Minh City", "vn", 10.8231, 106.6297, 8993082), ("Da Nang", "vn", 16.0544, 108.2022, 1134310),
+    ("Phnom Penh", "kh", 11.5564, 104.9282, 2129371), ("Vientiane", "la", 17.9757, 102.6331, 948477),
+    ("Yangon", "mm", 16.8409, 96.1735, 5160512), ("Naypyidaw", "mm", 19.7633, 96.0785, 924608),
+    ("Kuala Lumpur", "my", 3.1390, 101.6869, 1982112), ("George Town", "my", 5.4141, 100.3288, 708127),
+    ("Singapore", "sg", 1.3521, 103.8198, 5685807), ("Jakarta", "id", -6.2088, 106.8456, 10562088),
+    ("Surabaya", "id", -7.2575, 112.7521, 2874314), ("Bandung", "id", -6.9175, 107.6191, 2444160),
+    ("Medan", "id", 3.5952, 98.6722, 2435252), ("Denpasar", "id", -8.6705, 115.2126, 725314),
+    ("Manila", "ph", 14.5995, 120.9842, 1846513), ("Quezon City", "ph", 14.6760, 121.0437, 2960048),
+    ("Cebu City", "ph", 10.3157, 123.8854, 964169), ("Davao City", "ph", 7.1907, 125.4553, 1776949),
+    ("Bandar Seri Begawan", "bn", 4.9031, 114.9398, 100700), ("Dili", "tl", -8.5569, 125.5603, 222323),
+    # Africa
+    ("Cairo", "eg", 30.0444, 31.2357, 9539673), ("Alexandria", "eg", 31.2001, 29.9187, 5200000),
+    ("Lagos", "ng", 6.5244, 3.3792, 14862000), ("Kano", "ng", 12.0022, 8.5920, 4103000),
+    ("Abuja", "ng", 9.0765, 7.3986, 1235880), ("Ibadan", "ng", 7.3775, 3.9470, 3649000),
+    ("Kinshasa", "cd", -4.4419, 15.2663, 14970000), ("Lubumbashi", "cd", -11.6876, 27.5026, 2584000),
+    ("Brazzaville", "cg", -4.2634, 15.2429, 1838000), ("Luanda", "ao", -8.8390, 13.2894, 8330000),
+    ("Johannesburg", "za", -26.2041, 28.0473, 5635127), ("Cape Town", "za", -33.9249, 18.4241, 4618000),
+    ("Durban", "za", -29.8587, 31.0218, 3720953), ("Pretoria", "za", -25.7479, 28.2293, 2472612),
+    ("Nairobi", "ke", -1.2921, 36.8219, 4397073), ("Mombasa", "ke", -4.0435, 39.6682, 1208333),
+    ("Addis Ababa", "et", 9.0300, 38.7400, 3604000), ("Dar es Salaam", "tz", -6.7924, 39.2083, 4364541),
+    ("Dodoma", "tz", -6.1630, 35.7516, 410956), ("Kampala", "ug", 0.3476, 32.5825, 1680000),
+    ("Kigali", "rw", -1.9441, 30.0619, 1132686), ("Bujumbura", "bi", -3.3614, 29.3599, 1013000),
+    ("Khartoum", "sd", 15.5007, 32.5599, 5274321), ("Juba", "ss", 4.8594, 31.5713, 525953),
+    ("Mogadishu", "so", 2.0469, 45.3182, 2388000), ("Djibouti", "dj", 11.5721, 43.1456, 603900),
+    ("Asmara", "er", 15.3229, 38.9251, 963000), ("Algiers", "dz", 36.7538, 3.0588, 3415811),
+    ("Oran", "dz", 35.6971, -0.6308, 803329), ("Casablanca", "ma", 33.5731, -7.5898, 3359818),
+    ("Rabat", "ma", 34.0209, -6.8416, 577827), ("Marrakesh", "ma", 31.6295, -7.9811, 928850),
+    ("Tunis", "tn", 36.8065, 10.1815, 1056247), ("Tripoli", "ly", 32.8872, 13.1913, 1165000),
+    ("Accra", "gh", 5.6037, -0.1870, 2514000), ("Kumasi", "gh", 6.6885, -1.6244, 3490000),
+    ("Abidjan", "ci", 5.3600, -4.0083, 4707404), ("Yamoussoukro", "ci", 6.8276, -5.2893, 355573),
+    ("Dakar", "sn", 14.7167, -17.4677, 1146053), ("Bamako", "ml", 12.6392, -8.0029, 2713000),
+    ("Ouagadougou", "bf", 12.3714, -1.5197, 2453496), ("Niamey", "ne", 13.5116, 2.1254, 1334984),
+    ("N'Djamena", "td", 12.1348, 15.0557, 1423000), ("Conakry", "gn", 9.6412, -13.5784, 1660973),
+    ("Freetown", "sl", 8.4657, -13.2317, 1055964), ("Monrovia", "lr", 6.3156, -10.8074, 1418000),
+    ("Lome", "tg", 6.1725, 1.2314, 1785000), ("Cotonou", "bj", 6.3703, 2.3912, 679012),
+    ("Porto-Novo", "bj", 6.4969, 2.6289, 264320), ("Douala", "cm", 4.0511, 9.7679, 3663000),
+    ("Yaounde", "cm", 3.8480, 11.5021, 4100000), ("Libreville", "ga", 0.4162, 9.4673, 703904),
+    ("Malabo", "gq", 3.7504, 8.7371, 297000), ("Bangui", "cf", 4.3947, 18.5582, 889231),
+    ("Lusaka", "zm", -15.3875, 28.3228, 2731696), ("Harare", "zw", -17.8252, 31.0335, 1542813),
+    ("Bulawayo", "zw", -20.1325, 28.6265, 665952), ("Maputo", "mz", -25.9692, 32.5732, 1124988),
+    ("Lilongwe", "mw", -13.9626, 33.7741, 989318), ("Antananarivo", "mg", -18.8792, 47.5079, 1275207),
+    ("Windhoek", "na", -22.5609, 17.0658, 431000), ("Gaborone", "bw", -24.6282, 25.9231, 246325),
+    ("Maseru", "ls", -29.3151, 27.4869, 330760), ("Mbabane", "sz", -26.3054, 31.1367, 94874),
+    ("Port Louis", "mu", -20.1609, 57.5012, 147066), ("Victoria", "sc", -4.6191, 55.4513, 26450),
+    ("Praia", "cv", 14.9330, -23.5133, 159050), ("Banjul", "gm", 13.4549, -16.5790, 31301),
+    ("Bissau", "gw", 11.8817, -15.6178, 492004), ("Nouakchott", "mr", 18.0735, -15.9582, 1195600),
+    ("Moroni", "km", -11.7172, 43.2473, 111329), ("Sao Tome", "st", 0.3365, 6.7273, 90443),
+    # Oceania
+    ("Sydney", "au", -33.8688, 151.2093, 5312163), ("Melbourne", "au", -37.8136, 144.9631, 5078193),
+    ("Brisbane", "au", -27.4698, 153.0251, 2560720), ("Perth", "au", -31.9505, 115.8605, 2085973),
+    ("Adelaide", "au", -34.9285, 138.6007, 1376601), ("Canberra", "au", -35.2809, 149.1300, 431380),
+    ("Darwin", "au", -12.4634, 130.8456, 147255), ("Hobart", "au", -42.8821, 147.3272, 240342),
+    ("Auckland", "nz", -36.8485, 174.7633, 1657200), ("Wellington", "nz", -41.2865, 174.7762, 215400),
+    ("Christchurch", "nz", -43.5321, 172.6362, 381500), ("Port Moresby", "pg", -9.4438, 147.1803, 364145),
+    ("Suva", "fj", -18.1248, 178.4501, 93970), ("Apia", "ws", -13.8507, -171.7514, 37708),
+    ("Nuku'alofa", "to", -21.1394, -175.2049, 23221), ("Port Vila", "vu", -17.7333, 168.3273, 51437),
+    ("Honiara", "sb", -9.4456, 159.9729, 84520), ("South Tarawa", "ki", 1.3278, 172.9770, 63439),
+    ("Majuro", "mh", 7.0897, 171.3803, 27797), ("Palikir", "fm", 6.9248, 158.1610, 6647),
+    ("Ngerulmud", "pw", 7.5006, 134.6242, 271), ("Yaren", "nr", -0.5477, 166.9209, 747),
+    ("Funafuti", "tv", -8.5211, 179.1983, 6320),
+]
@@ -13,7 +13,11 @@ import pandas as pd
 import altair as alt
 import uuid
 # import location_suggestions
+import gazetteer # Offline city autocomplete and geocoding
 import historical_data_fetch # Import the historical data fetcher
+import rate_limiter # Host-wide OpenWeather call budget
+import http_client # Pooled session with timeouts and retries for upstream calls
+import current_weather # Cached current weather with stale-while-revalidate
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 load_dotenv()
@@ -25,6 +29,7 @@ st.set_page_config(layout="centered", page_title="Weather App")
 st.title("Current Weather")
 
 db_cache.init_db()
+db_cache.start_cache_maintenance()  # Once per process; later reruns are no-ops
 
 # Initialize session state
 if 'weather_data' not in st.session_state: st.session_state.weather_data = None
@@ -37,7 +42,7 @@ if 'selected_db_table_view' not in st.session_state: st.session_state.selected_d
 if 'city_search_term' not in st.session_state: st.session_state.city_search_term = ""
 
 location_type = st.radio("Select input type:", ("City Name", "Zip Code", "GPS Coordinates"))
-# weather_type = st.radio("Select weather type:", ("Current Weather", "Historical Weather"))
+weather_type = st.radio("Select weather type:", ("Current Weather", "Historical Weather"))
 
 location_input_value = ""
 lat, lon = None, None
@@ -82,21 +87,35 @@ else:
         else: # City Name
             city_name = st.text_input(f"Enter City Name in {selected_country_name}", "Hyderabad", key="city_input")
             if city_name: location_input_value = f"{city_name},{selected_country_code}"
+            suggestions = gazetteer.complete_city(city_name, country_code=selected_country_code) if city_name else []
+            if suggestions and gazetteer.normalize_name(suggestions[0]['name']) != gazetteer.normalize_name(city_name):
+                st.caption("Suggestions: " + ", ".join(place['name'] for place in suggestions))
     else: st.info("Please select a country.")
 
-# # --- Date Range Input for Historical Weather (unchanged) ---
-# start_date, end_date = None, None
-# if weather_type == "Historical Weather":
-#     st.subheader("Select Date Range")
-#     today = datetime.now().date()
-#     max_past_date = today - timedelta(days=5000)
-#     default_past_data = today - timedelta(days=10)
+# --- Date Range Input for Historical Weather ---
+start_date, end_date = None, None
+if weather_type == "Historical Weather":
+    st.subheader("Select Date Range")
+    today = datetime.now().date()
+    max_past_date = today - timedelta(days=5000)
+    default_past_data = today - timedelta(days=10)
     
-#     col1, col2 = st.columns(2)
-#     with col1:
-#         start_date = st.date_input("Start Date", max_value=today, min_value=max_past_date, value=default_past_data)
-#     with col2:
-#         end_date = st.date_input("End Date", max_value=today, min_value=start_date, value=today)
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start Date", max_value=today, min_value=max_past_date, value=default_past_data)
+    with col2:
+        end_date = st.date_input("End Date", max_value=today, min_value=start_date, value=today)
+
+# --- Serve-nearby mode: answer current weather from a fresh cached point close by ---
+nearby_radius_km = None
+if weather_type == "Current Weather":
+    if st.checkbox("Use cached weather from a nearby location when available", key="serve_nearby_checkbox"):
+        nearby_radius_km = st.number_input("Maximum distance (km)", min_value=1.0, max_value=100.0,
+                                           value=db_cache.NEARBY_DEFAULT_RADIUS_KM, step=1.0, key="serve_nearby_radius")
+
+api_quota = db_cache.get_api_quota_status()
+if api_quota['cache_only']:
+    st.warning("The API call budget is used up; only cached weather can be shown until it resets.")
 
 if st.button("Get Weather", key="get_weather_main_button"):
     st.session_state.weather_data = None
@@ -115,6 +134,7 @@ if st.button("Get Weather", key="get_weather_main_button"):
         try:
             # --- Step 1: Get Lat/Lon for the location_input_value ---
             geo_response = None
+            query_location = location_input_value  # Location string logged and stored with cache rows
             if location_type == "City Name":
                 geo_url = f"http://api.openweathermap.org/data/2.5/weather?q={location_input_value}&appid={API_KEY}"
             elif location_type == "Zip Code":
@@ -126,12 +146,35 @@ if st.button("Get Weather", key="get_weather_main_button"):
                     lon = float(lon_str)
                     st.session_state.location_display = f"Coordinates: Lat={lat}, Lon={lon}"
                     geo_response = {"cod": 200, "coord": {"lat": lat, "lon": lon}}
+                    # The nearest bundled place is only shown; logs and cache rows keep the raw 'lat,lon',
+                    # since a place name would let a lookup by that name land on a fix up to
+                    # REVERSE_GEOCODE_MAX_KM away
+                    nearby_place = gazetteer.reverse_geocode(lat, lon)
+                    if nearby_place:
+                        st.session_state.location_display = (f"Coordinates near {nearby_place['name']} "
+                                                             f"({nearby_place['distance_km']:.1f} km): Lat={lat}, Lon={lon}")
                 except ValueError:
                     st.error("For GPS Coordinates, invalid format. Please use 'Lat,Lon'.")
                     st.stop()
             
             if geo_response is None:
-                geo_response = requests.get(geo_url).json()
+                geo_kind = "zip" if location_type == "Zip Code" else "q"
+                bundled_city = gazetteer.resolve_city(location_input_value) if location_type == "City Name" else None
+                cached_geo = db_cache.get_geocode(location_input_value, geo_kind) if bundled_city is None else None
+                if bundled_city is not None:  # Resolved offline from the bundled city list
+                    geo_response = {"cod": 200, "coord": {"lat": bundled_city['lat'], "lon": bundled_city['lon']}, "name": bundled_city['name']}
+                elif cached_geo is not None:
+                    if cached_geo['found']:
+                        geo_response = {"cod": 200, "coord": {"lat": cached_geo['lat'], "lon": cached_geo['lon']}, "name": cached_geo['name']}
+                    else:
+                        geo_response = {"cod": 404, "message": cached_geo['message']}
+                else:
+                    geo_response = http_client.get(geo_url, rate_limiter=rate_limiter.get_openweather_limiter()).json()
+                    if geo_response.get("cod") == 200 and 'coord' in geo_response:
+                        db_cache.set_geocode(location_input_value, geo_response['coord']['lat'], geo_response['coord']['lon'],
+                                             geo_response.get('name'), geo_kind)
+                    elif str(geo_response.get("cod")) in ("400", "404"):  # Unknown location; other errors may be transient
+                        db_cache.set_geocode_miss(location_input_value, geo_response.get('message'), geo_kind)
 
             if geo_response.get("cod") == 200 and 'coord' in geo_response:
                 lat = geo_response['coord']['lat']
@@ -143,138 +186,90 @@ if st.button("Get Weather", key="get_weather_main_button"):
                 st.stop()
 
             # --- Step 2: Log User Query ---
-            # start_ts = int(datetime.combine(start_date, datetime.min.time()).timestamp()) if start_date and weather_type == "Historical Weather" else None
-            # end_ts = int(datetime.combine(end_date, datetime.min.time()).timestamp()) if end_date and weather_type == "Historical Weather" else None
-            db_cache.log_user_query(st.session_state.session_id, location_input_value)
+            start_ts = db_cache.day_key(start_date) if start_date and weather_type == "Historical Weather" else None
+            end_ts = db_cache.day_key(end_date) if end_date and weather_type == "Historical Weather" else None
+            db_cache.log_user_query(st.session_state.session_id, query_location, start_ts, end_ts)
 
 
             # --- Step 3: Fetch Weather Data (Current or Historical) ---
-            # if weather_type == "Current Weather":
-            cached_data = db_cache.get_cache(lat, lon, None, location_input_value)
-            if cached_data:
-                st.info("Current weather data from cache...")
-                st.session_state.weather_data = cached_data
-            else:
-                onecall_url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude=minutely,hourly,alerts&appid={API_KEY}&units=metric"
-                fetched_data = requests.get(onecall_url).json()
-                if fetched_data.get("cod") == 200 or "current" in fetched_data:
-                    st.session_state.weather_data = fetched_data
-                    data_ts = fetched_data['current']['dt'] if 'current' in fetched_data and 'dt' in fetched_data['current'] else int(datetime.now().timestamp())
-                    db_cache.set_cache(lat, lon, location_input_value, fetched_data, data_ts)
+            if weather_type == "Current Weather":
+                current_data, source = current_weather.get_current_weather(lat, lon, query_location, API_KEY,
+                                                                           nearby_radius_km=nearby_radius_km)
+                if source == 'cache':
+                    st.info("Current weather data from cache...")
+                    st.session_state.weather_data = current_data
+                elif source == 'nearby':
+                    st.info(f"Showing cached current weather for a location within {nearby_radius_km:g} km.")
+                    st.session_state.weather_data = current_data
+                elif source == 'stale':
+                    st.info("Showing cached current weather that is past its refresh time; "
+                            "a refresh is running in the background.")
+                    st.session_state.weather_data = current_data
+                elif current_data.get("cod") == 200 or "current" in current_data:
+                    st.session_state.weather_data = current_data
                 else:
-                    st.error(f"Failed to fetch current weather: {fetched_data.get('message', 'Unknown error')}")
-
-            # elif weather_type == "Historical Weather":
-            #     if not start_date or not end_date:
-            #         st.error("Please select both start and end dates for historical weather.")
-            #         st.stop()
+                    st.error(f"Failed to fetch current weather: {current_data.get('message', 'Unknown error')}")
 
-            #     historical_temps_raw_data = {} # To store all raw data, keyed by daily timestamp
-                
-            #     # Convert date objects to timestamps for database query
-            #     start_ts_at_midnight = int(datetime(start_date.year, start_date.month, start_date.day, 0, 0, 0).timestamp())
-            #     end_ts_at_midnight = int(datetime(end_date.year, end_date.month, end_date.day, 0, 0, 0).timestamp())
-
-            #     # 1. Fetch all available data from the database for the entire range
-            #     st.info("Attempting to retrieve historical data from cache for the selected range...")
-            #     cached_data_for_range = db_cache.get_cache_for_range(lat, lon, start_ts_at_midnight, end_ts_at_midnight)
-                
-            #     # Populate raw data with cached entries
-            #     for ts, data in cached_data_for_range.items():
-            #         historical_temps_raw_data[ts] = data
-            #         st.write(f"Cached data found for {datetime.fromtimestamp(ts).date()}") # For debugging
-
-            #     # 2. Identify missing days and prepare for API fetch
-            #     missing_dates = []
-            #     current_day_iter = start_date
-            #     while current_day_iter <= end_date:
-            #         daily_timestamp_for_api = int(datetime(current_day_iter.year, current_day_iter.month, current_day_iter.day, 12, 0, 0, tzinfo=timezone.utc).timestamp())
-            #         daily_timestamp_for_db_key = int(datetime(current_day_iter.year, current_day_iter.month, current_day_iter.day, 0, 0, 0).timestamp())
-
-            #         if daily_timestamp_for_db_key not in historical_temps_raw_data:
-            #             missing_dates.append(current_day_iter.strftime('%Y-%m-%d'))
-            #         current_day_iter += timedelta(days=1)
-                
-            #     api_fetched_data = {}
-            #     if missing_dates:
-            #         st.subheader(f"Fetching {len(missing_dates)} missing day(s) from API (up to 240 calls total, 60/min limit)...")
-            #         # To use the concurrent fetcher, we pass the range it expects.
-            #         # It will internally re-calculate timestamps and use the rate limiter.
-            #         # We need to ensure we only get data for the *missing* days.
-            #         # The historical_data_fetch function currently fetches for a *range*.
-            #         # This means it might refetch data already in cache.
-            #         # To avoid this, historical_data_fetch would need to accept a list of specific timestamps.
-            #         # For now, we'll run it for the *full range* again, and update our `historical_temps_raw_data`
-            #         # only with truly new entries, relying on `historical_temps_raw_data` for de-duplication.
-
-            #         # To optimize, modify historical_data_fetch.py to accept a list of specific timestamps:
-            #         # historical_data_fetch.get_historical_weather_for_specific_timestamps(lat, lon, timestamps_to_fetch_from_api, API_KEY)
-                    
-            #         # Given the current structure, we need to pass the start/end date for the API fetcher,
-            #         # and then carefully merge.
-                    
-            #         # *Self-correction*: The best way to use the existing `get_historical_weather_in_range_concurrently`
-            #         # is to tell it to only fetch data for the exact range of missing days, if possible.
-            #         # However, since `get_historical_weather_in_range_concurrently` takes `start_date_str` and `end_date_str`,
-            #         # and iterates day by day, we cannot directly give it a sparse list of `missing_dates`.
-
-            #         # Option 1 (Less efficient, current `historical_data_fetch` structure):
-            #         # Fetch for the entire range, and filter what's new.
-            #         st.info(f'start_data: {type(start_date)}, end_date: {end_date}')
-            #         @st.cache_data(ttl=3600) # Cache for 1 hour
-            #         def cached_historical_fetch(lat, lon, start_date_str, end_date_str, api_key):
-            #             return historical_data_fetch.get_historical_weather_in_range_concurrently(lat, lon, start_date_str, end_date_str, api_key)
-
-            #         api_fetched_data = api_fetched_data = cached_historical_fetch(
-            #                 lat, lon, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), API_KEY
-            #             )
-            #         st.info(f"API fetched {len(api_fetched_data)} days (may include cached days if API returned them).")
-                    
-            #         for timestamp_unix, data in api_fetched_data.items():
-            #             # The API timestamps are for noon. We need to map them to midnight for DB key.
-            #             api_date = datetime.fromtimestamp(timestamp_unix, tz=timezone.utc).date()
-            #             db_key_timestamp = int(datetime(api_date.year, api_date.month, api_date.day, 0, 0, 0).timestamp())
-
-            #             if db_key_timestamp not in historical_temps_raw_data:
-            #                 historical_temps_raw_data[db_key_timestamp] = data
-            #                 db_cache.set_cache(lat, lon, location_input_value, data, db_key_timestamp)
-            #                 st.write(f"New data fetched from API and cached for {api_date}") # For debugging
-            #             else: # For debugging
-            #                 st.write(f"Skipping API data for {api_date} as it was already in cache.")
-
-            #     elif not missing_dates:
-            #         st.info("All historical data for the selected range found in cache.")
-
-                # # 3. Process all raw data (cached + API) into display format
-                # historical_temps_list = []
-                # current_day_iter_final = start_date
-                # while current_day_iter_final <= end_date:
-                #     daily_timestamp_for_db_key = int(datetime(current_day_iter_final.year, current_day_iter_final.month, current_day_iter_final.day, 0, 0, 0).timestamp())
-                    
-                #     day_data = historical_temps_raw_data.get(daily_timestamp_for_db_key)
+            elif weather_type == "Historical Weather":
+                if not start_date or not end_date:
+                    st.error("Please select both start and end dates for historical weather.")
+                    st.stop()
 
-                #     if day_data and 'data' in day_data and len(day_data['data']) > 0:
-                #         temps_for_day = [hour['temp'] for hour in day_data['data'] if 'temp' in hour]
-                #         avg_temp = sum(temps_for_day) / len(temps_for_day) if temps_for_day else None
-                        
-                #         if avg_temp is not None:
-                #             historical_temps_list.append({
-                #                 "Date": current_day_iter_final,
-                #                 "Average Temperature (°C)": round(avg_temp, 1)
-                #             })
-                #         else:
-                #             st.warning(f"No temperature data found in raw data for {current_day_iter_final}.")
-                #     else:
-                #         st.warning(f"No valid data (cached or API) found for {current_day_iter_final}. Skipping.")
-                #     current_day_iter_final += timedelta(days=1)
-                
-                # if historical_temps_list:
-                #     # Ensure sorted by date before creating DataFrame
-                #     historical_temps_list_sorted = sorted(historical_temps_list, key=lambda x: x['Date'])
-                #     st.session_state.historical_temps = pd.DataFrame(historical_temps_list_sorted)
-                # else:
-                #     st.warning("No historical temperature data could be retrieved for the selected range.")
+                # Days are drawn as they arrive: cached ones at once, the rest as each API call returns
+                requested_days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+                progress_bar = st.progress(0.0, text="Loading historical weather...")
+                chart_placeholder = st.empty()
+                historical_temps_list = []
+                days_without_data = []
+                day_stream = historical_data_fetch.iter_historical_weather_for_days(
+                    lat, lon, requested_days, API_KEY, location=query_location, session_id=st.session_state.session_id
+                )
+                for days_done, (day_ts, day_data) in enumerate(day_stream, start=1):
+                    temps_for_day = [hour['temp'] for hour in (day_data or {}).get('data', []) if 'temp' in hour]
+                    if temps_for_day:
+                        historical_temps_list.append({
+                            "Date": db_cache.day_from_key(day_ts),
+                            "Average Temperature (°C)": round(sum(temps_for_day) / len(temps_for_day), 1)
+                        })
+                        chart_placeholder.line_chart(
+                            pd.DataFrame(sorted(historical_temps_list, key=lambda x: x['Date'])).set_index("Date")
+                        )
+                    else:
+                        days_without_data.append(db_cache.day_from_key(day_ts))
+                    progress_bar.progress(days_done / len(requested_days),
+                                          text=f"Loaded {days_done} of {len(requested_days)} day(s)")
+                progress_bar.empty()
+                chart_placeholder.empty()  # The full chart is drawn below
+
+                if days_without_data and not db_cache.check_api_quota():
+                    st.warning("The API call budget is used up; the missing days stay queued as a backfill job "
+                               "and can be resumed once it resets.")
+                if days_without_data:
+                    st.warning(f"No temperature data for {len(days_without_data)} day(s): "
+                               + ", ".join(str(day) for day in sorted(days_without_data)[:10])
+                               + (" ..." if len(days_without_data) > 10 else ""))
+                if historical_temps_list:
+                    # The table comes from the stored hourly observations, aggregated in SQL; days cached
+                    # before observations were recorded keep the mean drawn while streaming
+                    temps_by_day = {row['Date']: row for row in historical_temps_list}
+                    for stats in db_cache.get_daily_temperature_stats(lat, lon, db_cache.day_key(start_date),
+                                                                      db_cache.day_key(end_date)):
+                        if not stats['samples']:
+                            continue
+                        day = db_cache.day_from_key(stats['day_ts'])
+                        temps_by_day[day] = {
+                            "Date": day,
+                            "Average Temperature (°C)": round(stats['mean_temp'], 1),
+                            "Min Temperature (°C)": round(stats['min_temp'], 1),
+                            "Max Temperature (°C)": round(stats['max_temp'], 1),
+                        }
+                    historical_temps_list_sorted = sorted(temps_by_day.values(), key=lambda x: x['Date'])
+                    st.session_state.historical_temps = pd.DataFrame(historical_temps_list_sorted)
+                else:
+                    st.warning("No historical temperature data could be retrieved for the selected range.")
 
+        except http_client.QuotaExceeded as e:
+            st.warning(f"{e}. Only locations and days already in the cache can be shown.")
         except requests.exceptions.RequestException as e:
             st.error(f"Network error: {e}")
         except Exception as e:
@@ -284,7 +279,7 @@ if st.button("Get Weather", key="get_weather_main_button"):
 if st.session_state.location_display:
     st.success(st.session_state.location_display)
 
-if st.session_state.weather_data:
+if weather_type == "Current Weather" and st.session_state.weather_data:
     st.header("Current Weather")
     if 'current' in st.session_state.weather_data:
         current_data = st.session_state.weather_data['current']
@@ -331,21 +326,74 @@ if st.session_state.weather_data:
         st.table(forecast_table)
     else: st.warning("Daily forecast data not available or malformed.")
 
-# elif weather_type == "Historical Weather" and st.session_state.historical_temps is not None:
-#     st.header("Historical Temperature Trend")
-#     st.dataframe(st.session_state.historical_temps)
+elif weather_type == "Historical Weather" and st.session_state.historical_temps is not None:
+    st.header("Historical Temperature Trend")
+    st.dataframe(st.session_state.historical_temps)
+
+    chart = alt.Chart(st.session_state.historical_temps).mark_line(point=True).encode(
+        x=alt.X('Date:T', axis=alt.Axis(format="%b %d")),
+        y=alt.Y('Average Temperature (°C):Q', title="Average Temperature (°C)"),
+        tooltip=['Date', 'Average Temperature (°C)']
+    ).properties(
+        title=f"Average Daily Temperature for {st.session_state.location_display.split(': ')[1] if st.session_state.location_display and ':' in st.session_state.location_display else 'Selected Location'}"
+    ).interactive()
 
-#     chart = alt.Chart(st.session_state.historical_temps).mark_line(point=True).encode(
-#         x=alt.X('Date:T', axis=alt.Axis(format="%b %d")),
-#         y=alt.Y('Average Temperature (°C):Q', title="Average Temperature (°C)"),
-#         tooltip=['Date', 'Average Temperature (°C)']
-#     ).properties(
-#         title=f"Average Daily Temperature for {st.session_state.location_display.split(': ')[1] if st.session_state.location_display and ':' in st.session_state.location_display else 'Selected Location'}"
-#     ).interactive()
+    st.altair_chart(chart, use_container_width=True)
+elif weather_type == "Historical Weather" and st.session_state.historical_temps is None:
+    st.info("No historical data to display. Please fetch data first.")
 
-#     st.altair_chart(chart, use_container_width=True)
-# elif weather_type == "Historical Weather" and st.session_state.historical_temps is None:
-#     st.info("No historical data to display. Please fetch data first.")
+
+# --- Historical Backfill Jobs ---
+# Every historical range request is checkpointed per day, so an interrupted one can be resumed
+st.markdown("---")
+with st.expander("Historical Backfill Jobs"):
+    st.caption(f"API calls today: {api_quota['day_calls']}"
+               + (f" of {api_quota['day_budget']}" if api_quota['day_budget'] else "")
+               + f" · this month: {api_quota['month_calls']}"
+               + (f" of {api_quota['month_budget']}" if api_quota['month_budget'] else ""))
+    backfill_jobs = db_cache.list_backfill_jobs()
+    if not backfill_jobs:
+        st.info("No backfill jobs yet.")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "Job": job['job_id'],
+            "Location": job['loc'],
+            "From": db_cache.day_from_key(job['start_ts']),
+            "To": db_cache.day_from_key(job['end_ts']),
+            "Status": job['status'],
+            "Done": f"{job['done']}/{job['total']}",
+            "Pending": job['pending'] + job['in_flight'],
+            "Failed": job['failed'],
+            "API Attempts": job['attempts'],
+            "Updated": datetime.fromtimestamp(job['updated_ts']).strftime('%Y-%m-%d %H:%M'),
+        } for job in backfill_jobs]), hide_index=True)
+
+        unfinished_jobs = {job['job_id']: job for job in backfill_jobs if job['status'] != 'done'}
+        if unfinished_jobs:
+            job_id_to_resume = st.selectbox(
+                "Unfinished job:", list(unfinished_jobs), key="backfill_job_select",
+                format_func=lambda job_id: f"#{job_id} {unfinished_jobs[job_id]['loc']} "
+                                           f"({unfinished_jobs[job_id]['done']}/{unfinished_jobs[job_id]['total']} days)"
+            )
+            failed_tasks = [task for task in db_cache.get_backfill_tasks(job_id_to_resume) if task['state'] == 'failed']
+            if failed_tasks:
+                st.dataframe(pd.DataFrame([{
+                    "Date": db_cache.day_from_key(task['data_ts']),
+                    "Attempts": task['attempts'],
+                    "Last Error": task['last_error'],
+                } for task in failed_tasks]), hide_index=True)
+            if st.button("Resume Job", key="resume_backfill_button"):
+                if not API_KEY:
+                    st.error("Please provide a valid OpenWeatherMap API key.")
+                else:
+                    db_cache.requeue_failed_backfill_tasks(job_id_to_resume)
+                    job = db_cache.get_backfill_job(job_id_to_resume)
+                    remaining = max(job['total'] - job['done'], 1)
+                    resume_progress = st.progress(0.0, text=f"Resuming job #{job_id_to_resume}...")
+                    for days_done, _ in enumerate(historical_data_fetch.run_backfill(job_id_to_resume, API_KEY), start=1):
+                        resume_progress.progress(min(days_done / remaining, 1.0),
+                                                 text=f"Fetched {days_done} of {remaining} remaining day(s)")
+                    st.rerun()
 
 
 # # --- View Past Queries Section (unchanged) ---
@@ -447,6 +495,7 @@ EDITABLE_FIELDS_PER_TABLE = {
 }
 # Define preferred display order for specific columns across tables
 FIXED_DISPLAY_ORDER_PREFIX = ['lat', 'lon', 'data_ts', 'fetch_ts', 'loc']
+DB_PAGE_SIZES = [50, 100, 250, 500]
 
 with st.expander("Browse and Edit Database Data"):
     db_tables = db_cache.get_table_names()
@@ -486,15 +535,35 @@ with st.expander("Browse and Edit Database Data"):
             with col_sort2:
                 order_direction = st.radio("Direction", ("ASC", "DESC"), key="order_direction_radio")
 
-            data = db_cache.get_table_data(selected_db_table, order_by_col if order_by_col else None, order_direction)
+            page_size = st.selectbox("Rows per page", DB_PAGE_SIZES, key="db_page_size_select")
+
+            # Keyset pagination: remember the cursor that starts each visited page; reset on any view change
+            page_view = (selected_db_table, order_by_col, order_direction, page_size)
+            if st.session_state.get('db_page_view') != page_view:
+                st.session_state.db_page_view = page_view
+                st.session_state.db_page_cursors = [None]
+            page = db_cache.get_table_page(selected_db_table, order_by_col if order_by_col else None, order_direction,
+                                           page_size, st.session_state.db_page_cursors[-1])
+            data = page['rows']
             if data:
-                df = pd.DataFrame(data)
-                
-                if 'data' in df.columns:
-                    df['data'] = df['data'].apply(lambda x: json.loads(x) if isinstance(x, str) else x)
-                
+                df = pd.DataFrame(data)  # weather_cache payloads arrive decoded from get_table_page()
                 st.dataframe(df, use_container_width=True)
 
+                total_rows, is_estimate = db_cache.estimate_row_count(selected_db_table)
+                page_number = len(st.session_state.db_page_cursors)
+                nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+                with nav_prev:
+                    if st.button("Previous", key="db_page_prev", disabled=page_number == 1):
+                        st.session_state.db_page_cursors.pop()
+                        st.rerun()
+                with nav_info:
+                    st.caption(f"Page {page_number} of {'~' if is_estimate else ''}{max(1, -(-total_rows // page_size))} "
+                               f"({'~' if is_estimate else ''}{total_rows} rows)")
+                with nav_next:
+                    if st.button("Next", key="db_page_next", disabled=page['next_cursor'] is None):
+                        st.session_state.db_page_cursors.append(page['next_cursor'])
+                        st.rerun()
+
                 st.subheader("Edit Record")
                 st.warning("Directly editing database records can lead to data corruption if not careful. Only specific fields are editable.")
                 
@@ -531,7 +600,7 @@ with st.expander("Browse and Edit Database Data"):
                                     if not val_str:
                                         pk_complete = False
                                         break
-                                    if pk_col in ['lat', 'lon']: typed_pk_values[pk_col] = float(val_str)
+                                    if pk_col in ['lat', 'lon', 'query_ts']: typed_pk_values[pk_col] = float(val_str)
                                     # elif pk_col in ['data_ts', 'query_ts', 'start_date', 'end_date', 'fetch_ts']: typed_pk_values[pk_col] = int(val_str)
                                     else: typed_pk_values[pk_col] = val_str
                                 
@@ -568,8 +637,8 @@ with st.expander("Browse and Edit Database Data"):
                             if not val_str:
                                 delete_pk_complete = False
                                 break
-                            if pk_col in ['lat', 'lon']: typed_delete_pk_values[pk_col] = float(val_str)
-                            elif pk_col in ['data_ts', 'query_ts', 'start_date', 'end_date', 'fetch_ts']: typed_delete_pk_values[pk_col] = int(val_str)
+                            if pk_col in ['lat', 'lon', 'query_ts']: typed_delete_pk_values[pk_col] = float(val_str)
+                            elif pk_col in ['data_ts', 'start_date', 'end_date', 'fetch_ts']: typed_delete_pk_values[pk_col] = int(val_str)
                             else: typed_delete_pk_values[pk_col] = val_str
                         
                         if not delete_pk_complete:
@@ -0,0 +1,149 @@
+# current_weather.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import db_cache
+import http_client
+import rate_limiter
+import singleflight
+
+OPENWEATHER_BASE_URL = "https://api.openweathermap.org"
+
+# Background refreshes of stale entries (see db_cache.CACHE_STALE_GRACE_SECONDS). Locations past
+# CURRENT_REFRESH_MAX_PENDING queued or running refreshes are served stale without one.
+CURRENT_REFRESH_WORKERS = 4
+CURRENT_REFRESH_MAX_PENDING = 64
+
+_refresh_executor = None
+_refresh_pending = set()
+_refresh_lock = threading.Lock()
+
+def _onecall_url(lat, lon, api_key):
+    return f"{OPENWEATHER_BASE_URL}/data/3.0/onecall?lat={lat}&lon={lon}&exclude=minutely,hourly,alerts&appid={api_key}&units=metric"
+
+def _flight_key(lat, lon):
+    q_lat, q_lon = db_cache.quantize_coords(lat, lon)
+    return f"current:{q_lat}:{q_lon}"
+
+def fetch_current_weather(lat, lon, location, api_key):
+    """Calls onecall and caches a successful response; returns the response JSON either way."""
+    fetched = http_client.get(_onecall_url(lat, lon, api_key), rate_limiter=rate_limiter.get_openweather_limiter()).json()
+    if fetched.get("cod") == 200 or "current" in fetched:
+        data_ts = fetched['current']['dt'] if 'current' in fetched and 'dt' in fetched['current'] else int(time.time())
+        db_cache.set_cache(lat, lon, location, fetched, data_ts)
+    return fetched
+
+def _fetch_coalesced(lat, lon, location, api_key):
+    # Sessions (and refreshes) missing the same grid cell at once share one upstream call
+    data, _ = singleflight.get_upstream_flights().do(
+        _flight_key(lat, lon), lambda: fetch_current_weather(lat, lon, location, api_key),
+        recheck=lambda: db_cache.get_cache(lat, lon, None, location)
+    )
+    return data
+
+def _refresh(key, lat, lon, location, api_key):
+    try:
+        _fetch_coalesced(lat, lon, location, api_key)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        message = str(e).replace(api_key, "***") if api_key else str(e)
+        print(f"Background refresh of {key} failed: {message}")
+    finally:
+        with _refresh_lock:
+            _refresh_pending.discard(key)
+
+def schedule_refresh(lat, lon, location, api_key):
+    """Queues a background refresh of a location; False if one is already pending or the pool is full."""
+    global _refresh_executor
+    key = _flight_key(lat, lon)
+    with _refresh_lock:
+        if key in _refresh_pending or len(_refresh_pending) >= CURRENT_REFRESH_MAX_PENDING:
+            return False
+        _refresh_pending.add(key)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=CURRENT_REFRESH_WORKERS,
+                                                   thread_name_prefix="current-weather-refresh")
+        executor = _refresh_executor
+    executor.submit(_refresh, key, lat, lon, location, api_key)
+    return True
+
+def get_current_weather(lat, lon, location, api_key, nearby_radius_km=None):
+    """
+    Returns (data, source) with source 'cache', 'nearby', 'stale' or 'upstream'.
+
+    A fresh cache entry is returned as is. With nearby_radius_km, fresh data of the nearest
+    cached cell within that distance comes next ('nearby'). An entry expired less than the
+    stale grace window ago is returned at once as 'stale' and a background refresh is queued.
+    Otherwise onecall is called (coalesced with concurrent callers); its JSON is returned even
+    when it reports an error. Raises http_client.QuotaExceeded and requests exceptions from the call.
+    """
+    data = db_cache.get_cache(lat, lon, None, location)
+    if data:
+        return data, 'cache'
+    if nearby_radius_km:
+        data, _ = db_cache.get_nearby_cache(lat, lon, nearby_radius_km)
+        if data:
+            return data, 'nearby'
+    data, _ = db_cache.get_stale_cache(lat, lon)
+    if data:
+        schedule_refresh(lat, lon, location, api_key)
+        return data, 'stale'
+    return _fetch_coalesced(lat, lon, location, api_key), 'upstream'
+
+if __name__ == "__main__":
+    # Request latency around the expiry boundary, with and without a stale grace window,
+    # against a local stand-in for onecall that takes UPSTREAM_SECONDS per call
+    import os
+    import random
+    import tempfile
+
+    from stand_in_server import start_stand_in_server
+
+    UPSTREAM_SECONDS, TTL_SECONDS, RUN_SECONDS, CLIENTS = 0.3, 2, 10.0, 8
+    upstream_calls = []
+
+    def onecall(path):
+        upstream_calls.append(time.time())
+        time.sleep(UPSTREAM_SECONDS)
+        return 200, {}, {"current": {"dt": int(time.time()), "temp": 20.0}, "daily": []}
+
+    server, OPENWEATHER_BASE_URL = start_stand_in_server(onecall)
+
+    def percentile(sorted_values, fraction):
+        return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+    db_cache.CACHE_TTL_SECONDS[db_cache.CACHE_KIND_CURRENT] = TTL_SECONDS
+    for grace in (0, 60):
+        # A fresh database per run keeps the quota ledger, rate limiter and cache apart
+        db_cache.DB_NAME = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+        db_cache.init_db()
+        db_cache.clear_memory_cache()
+        db_cache.CACHE_STALE_GRACE_SECONDS = grace
+        rate_limiter._openweather_limiter = None
+        singleflight._upstream_flights = None
+        get_current_weather(17.385, 78.487, "Hyderabad", "stand-in")  # warm entry
+        upstream_calls.clear()
+        latencies, sources = [], {}
+        stop_at = time.time() + RUN_SECONDS
+
+        def client():
+            while time.time() < stop_at:
+                t0 = time.perf_counter()
+                _, source = get_current_weather(17.385, 78.487, "Hyderabad", "stand-in")
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                sources[source] = sources.get(source, 0) + 1
+                time.sleep(random.uniform(0, 0.05))
+
+        threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        latencies.sort()
+        print(f"grace {grace:>2}s: {len(latencies)} requests over {RUN_SECONDS:.0f}s with a {TTL_SECONDS}s TTL, "
+              f"{len(upstream_calls)} upstream calls, sources {sources}; "
+              f"p50 {percentile(latencies, 0.50):.2f} ms, p95 {percentile(latencies, 0.95):.2f} ms, "
+              f"p99 {percentile(latencies, 0.99):.2f} ms, max {latencies[-1]:.2f} ms")
+    server.shutdown()
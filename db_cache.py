@@ -2,23 +2,339 @@
 import sqlite3
 import json
 import time
+import calendar
+import datetime
+import heapq
+import math
 import os
-from datetime import datetime
+import threading
+import queue
+import atexit
+import zlib
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Use a local file for the SQLite database
 DB_NAME = "local_weather_cache.db"
+# Data migrations applied by init_db(), tracked in PRAGMA user_version
+#   1: historical rows re-keyed from server-local midnight to day_key() (UTC midnight)
+#   2: cache_locations filled from existing weather_cache rows
+#   3: rows stored before coordinate quantization re-keyed to their CACHE_GRID_DEGREES cell
+SCHEMA_VERSION = 3
+# Freshness policy: each weather_cache row is classified when written (see classify_payload())
+# and stays fresh for its kind's TTL; None means it never expires. Override a kind with
+# WEATHER_CACHE_TTL_<KIND>, e.g. WEATHER_CACHE_TTL_HISTORICAL_TODAY=1800 (or "none").
+CACHE_KIND_CURRENT = 'current'  # onecall snapshot: current conditions plus forecast
+CACHE_KIND_FORECAST = 'forecast'  # forecast-only payload
+CACHE_KIND_HISTORICAL_TODAY = 'historical-today'  # timemachine day that had not ended when fetched
+CACHE_KIND_HISTORICAL_FINAL = 'historical-final'  # timemachine day that had ended; never changes
+# Current weather is bounded by the call budget, not by OpenWeather's ~10 minute update cadence:
+# every location kept warm costs 86400 / TTL calls a day. An hour keeps a 20-location workload
+# at ~55% of API_DAILY_CALL_BUDGET, leaving room for backfills (see the TTL replay in __main__).
+CACHE_TTL_SECONDS = {
+    CACHE_KIND_CURRENT: 3600,
+    CACHE_KIND_FORECAST: 3 * 3600,
+    CACHE_KIND_HISTORICAL_TODAY: 3600,
+    CACHE_KIND_HISTORICAL_FINAL: None,
+}
+for _kind in CACHE_TTL_SECONDS:
+    _ttl = os.getenv(f"WEATHER_CACHE_TTL_{_kind.upper().replace('-', '_')}")
+    if _ttl:
+        CACHE_TTL_SECONDS[_kind] = None if _ttl.lower() == "none" else int(_ttl)
+# Entries that never expire are re-read from SQLite after this long, bounding how long the
+# memory tier can miss another process's rewrite. Also the legacy single TTL used to classify
+# rows written before kinds existed.
 CACHE_DURATION_SECONDS = 43200  # 12 hours
+# Stale-while-revalidate: for this long after expiry a current-weather row may still be served
+# (flagged stale) while a background refresh replaces it. 0 disables stale serving.
+CACHE_STALE_GRACE_SECONDS = int(os.getenv("WEATHER_CACHE_STALE_GRACE_SECONDS", "3600"))
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
+# Connection tuning, applied once per pooled connection
+DB_BUSY_TIMEOUT_SECONDS = 5.0
+DB_CACHE_SIZE_KIB = 20000  # ~20 MB page cache per connection
+DB_MMAP_SIZE_BYTES = 256 * 1024 * 1024  # 256 MB memory-mapped I/O
+
+# Cache keys snap (lat, lon) to a grid of this many degrees so that nearby readings share
+# a row; 0.01 deg is ~1.1 km north-south. Set to None to key on the exact coordinates.
+CACHE_GRID_DEGREES = 0.01
+
+# In-process first-level cache in front of SQLite; the budget counts stored (encoded) payload bytes
+MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Hourly records of timemachine payloads are also stored as typed rows in weather_observations.
+# With raw storage off, those weather_cache rows keep no blob and are rebuilt from the observations.
+STORE_RAW_HISTORICAL_PAYLOADS = True
+OBSERVATION_FIELDS = ('temp', 'feels_like', 'pressure', 'humidity', 'dew_point', 'uvi',
+                      'clouds', 'visibility', 'wind_speed', 'wind_deg', 'wind_gust')
+OBSERVATIONS_CODEC = "observations"  # data_codec tag for rows stored only as observations
+OBSERVATION_ROW_BYTES = 128  # memory-tier charge per rebuilt hourly record
+
+# Geocoding results (location string -> coordinates); misses are cached briefly
+GEOCODE_CACHE_SECONDS = 30 * 86400
+GEOCODE_NEGATIVE_CACHE_SECONDS = 600
+
+# Nearest-location lookups: cache_locations holds each distinct cached cell, kept in step with
+# weather_cache by triggers and mirrored into an R*Tree when SQLite has the module
+NEARBY_DEFAULT_RADIUS_KM = 10.0
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+# Write-behind query log: log_user_query() only enqueues; a writer thread commits batches
+QUERY_LOG_FLUSH_INTERVAL_MS = 250
+QUERY_LOG_BATCH_SIZE = 100
+QUERY_LOG_QUEUE_SIZE = 10000  # when full, log_user_query() falls back to a synchronous write
+# A failed batch write is retried with doubling backoff, then written record by record; only
+# records rejected by a constraint are dropped, the rest are kept for the next batch
+QUERY_LOG_WRITE_ATTEMPTS = 3
+QUERY_LOG_RETRY_BACKOFF_SECONDS = 0.1
+
+# Historical backfill jobs: a failing day is retried up to BACKFILL_MAX_ATTEMPTS times per run, and
+# an in-flight day whose worker vanished (process restart) can be reclaimed after the lease ends
+BACKFILL_MAX_ATTEMPTS = 3
+BACKFILL_LEASE_SECONDS = 120
+
+# Upstream API quota ledger: every call is logged and rolled up per UTC day and month. Once a
+# budget is used up the app serves cached data only. 0 disables a budget. Counters live in
+# memory and are synced with SQLite (which also sees other processes' calls) every
+# API_QUOTA_SYNC_SECONDS or API_QUOTA_SYNC_BATCH calls.
+API_DAILY_CALL_BUDGET = int(os.getenv("OPENWEATHER_DAILY_CALL_BUDGET", "1000"))
+API_MONTHLY_CALL_BUDGET = int(os.getenv("OPENWEATHER_MONTHLY_CALL_BUDGET", "30000"))
+API_QUOTA_SYNC_SECONDS = 5.0
+API_QUOTA_SYNC_BATCH = 100
+API_CALL_LOG_RETENTION_SECONDS = 35 * 86400  # raw per-call rows; roll-ups are kept
+
+# Background maintenance (see start_cache_maintenance())
+MAINTENANCE_INTERVAL_SECONDS = 600
+MAINTENANCE_BATCH_ROWS = 500  # rows deleted per transaction, keeps write locks short
+MAINTENANCE_VACUUM_PAGES = 2000  # free pages returned to the OS per run
+CACHE_MAX_DB_BYTES = 512 * 1024 * 1024
+MAINTENANCE_ANALYSIS_LIMIT = 1000  # rows sampled per index by ANALYZE
+
+# Codec used for new weather_cache.data payloads; see register_codec()
+PAYLOAD_CODEC = "zlib+json"
+ZLIB_LEVEL = 6
+
+_thread_local = threading.local()
+# Every pooled connection with the thread using it, per database. Streamlit runs each rerun on
+# a new thread, so a connection whose thread has ended is handed to the next thread that needs
+# one instead of opening another; a connection is still only used by one thread at a time.
+_pool = {}
+_pool_lock = threading.Lock()
+
+def _open_connection(db_name):
+    """Opens a new SQLite connection with WAL and the tuned pragmas applied."""
+    conn = sqlite3.connect(db_name, timeout=DB_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Access columns by name
+    conn.execute("PRAGMA journal_mode=WAL;")  # Readers no longer wait on writers
+    conn.execute("PRAGMA synchronous=NORMAL;")  # Safe with WAL, avoids an fsync per commit
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB};")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE_BYTES};")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_SECONDS * 1000)};")
     return conn
 
+def _checkout_connection(db_name):
+    """Adopts a pooled connection left by a finished thread, or opens a new one."""
+    thread = threading.current_thread()
+    with _pool_lock:
+        entries = _pool.setdefault(db_name, [])
+        conn = None
+        for entry in entries:
+            if not entry[0].is_alive():
+                entry[0], conn = thread, entry[1]
+                break
+    if conn is None:
+        conn = _open_connection(db_name)
+        with _pool_lock:
+            entries.append([thread, conn])
+    elif conn.in_transaction:
+        conn.rollback()  # the previous thread ended mid-write
+    return conn
+
+def get_db_connection():
+    """Returns this thread's pooled connection to the SQLite database, opening it on first use."""
+    conns = getattr(_thread_local, 'connections', None)
+    if conns is None:
+        conns = _thread_local.connections = {}
+    conn = conns.get(DB_NAME)
+    if conn is None:
+        conn = conns[DB_NAME] = _checkout_connection(DB_NAME)
+    return conn
+
+def close_db_connection():
+    """Closes this thread's pooled connections (e.g. before a worker thread exits)."""
+    conns = getattr(_thread_local, 'connections', None) or {}
+    with _pool_lock:
+        for db_name, conn in conns.items():
+            _pool[db_name] = [entry for entry in _pool.get(db_name, []) if entry[1] is not conn]
+    for conn in conns.values():
+        conn.close()
+    conns.clear()
+
+# --- Payload codecs ---
+# Each codec maps a Python object to the bytes stored in weather_cache.data and back.
+# The codec name is stored per row in weather_cache.data_codec; rows written before
+# codecs existed have no tag and hold plain JSON text.
+_CODECS = {}
+
+def register_codec(name, encode, decode):
+    """Registers a payload codec under the given name (stored as the row's format tag)."""
+    _CODECS[name] = (encode, decode)
+
+def get_codec_names():
+    """Returns the names of all registered payload codecs."""
+    return list(_CODECS.keys())
+
+def encode_payload(data, codec=None):
+    """Encodes a payload, returning (stored_value, codec_name)."""
+    codec = codec or PAYLOAD_CODEC
+    if codec not in _CODECS:
+        raise ValueError(f"Unknown payload codec '{codec}'. Registered: {', '.join(_CODECS)}")
+    return _CODECS[codec][0](data), codec
+
+def decode_payload(raw, codec=None):
+    """Decodes a stored payload; rows without a codec tag are treated as legacy JSON text."""
+    if raw is None:
+        return None
+    codec = codec or "json"
+    if codec not in _CODECS:
+        raise ValueError(f"Unknown payload codec '{codec}'. Registered: {', '.join(_CODECS)}")
+    return _CODECS[codec][1](raw)
+
+def _compact_json(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+register_codec("json", json.dumps, json.loads)
+register_codec("zlib+json",
+               lambda data: zlib.compress(_compact_json(data), ZLIB_LEVEL),
+               lambda raw: json.loads(zlib.decompress(raw)))
+if msgpack is not None:
+    register_codec("zlib+msgpack",
+                   lambda data: zlib.compress(msgpack.packb(data), ZLIB_LEVEL),
+                   lambda raw: msgpack.unpackb(zlib.decompress(raw), strict_map_key=False))
+if msgpack is not None and zstandard is not None:
+    register_codec("zstd+msgpack",
+                   lambda data: zstandard.ZstdCompressor(level=3).compress(msgpack.packb(data)),
+                   lambda raw: msgpack.unpackb(zstandard.ZstdDecompressor().decompress(raw), strict_map_key=False))
+
+def quantize_coords(lat, lon, grid_degrees=None):
+    """Snaps coordinates to the centre of their cache grid cell, returning (lat, lon)."""
+    grid = CACHE_GRID_DEGREES if grid_degrees is None else grid_degrees
+    if not grid:
+        return lat, lon
+    # round() to 6 places strips float noise so every member of a cell yields the identical key
+    q_lat = round(round(lat / grid) * grid, 6)
+    q_lon = round(round(lon / grid) * grid, 6)
+    if q_lon >= 180.0:  # keep the antimeridian cell on one side
+        q_lon = round(q_lon - 360.0, 6)
+    return q_lat, q_lon
+
+def day_key(day):
+    """Canonical data_ts for a calendar day: 00:00 UTC of that date, whatever the server's timezone."""
+    return calendar.timegm((day.year, day.month, day.day, 0, 0, 0))
+
+def day_from_key(ts):
+    """The calendar day a day_key() (or any timestamp within that UTC day) belongs to."""
+    return datetime.date(*time.gmtime(ts)[:3])
+
+def _nearest_day_key(ts):
+    """Rounds a midnight in any timezone within +-12h of UTC to that date's day_key()."""
+    return (int(ts) + 43200) // 86400 * 86400
+
+class MemoryCache:
+    """Process-wide, thread-safe LRU cache with a byte budget and per-entry expiry.
+
+    Values are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size, expires_at):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+_memory_cache = MemoryCache(MEMORY_CACHE_MAX_BYTES)
+
+def get_memory_cache_stats():
+    """Returns hit/miss/eviction counters and usage of the in-process cache tier."""
+    return _memory_cache.stats()
+
+def clear_memory_cache():
+    """Drops every entry from the in-process cache tier (SQLite is untouched)."""
+    _memory_cache.clear()
+
 def init_db():
     """Initializes the database tables if they don't exist."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        # Incremental auto-vacuum lets maintenance hand free pages back without a blocking full VACUUM.
+        # Existing databases need one VACUUM for the setting to take effect.
+        cursor.execute("PRAGMA auto_vacuum;")
+        if cursor.fetchone()[0] != 2:
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+            cursor.execute("VACUUM;")
         # weather_cache table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS weather_cache (
@@ -27,101 +343,1268 @@ def init_db():
                 data_ts INTEGER NOT NULL,
                 fetch_ts INTEGER NOT NULL,
                 loc TEXT,
-                data TEXT,
+                data BLOB,
+                data_codec TEXT,
+                kind TEXT,
                 PRIMARY KEY (lat, lon, data_ts)
             )
         ''')
+        # Databases created before payload codecs or TTL kinds existed lack those columns
+        cursor.execute("PRAGMA table_info(weather_cache);")
+        weather_cache_columns = [row['name'] for row in cursor.fetchall()]
+        if 'data_codec' not in weather_cache_columns:
+            cursor.execute("ALTER TABLE weather_cache ADD COLUMN data_codec TEXT")
+        if 'kind' not in weather_cache_columns:
+            cursor.execute("ALTER TABLE weather_cache ADD COLUMN kind TEXT")
+            # Same rule the purge used before kinds: data_ts within the old TTL of fetch_ts means current
+            cursor.execute(SQL_CLASSIFY_LEGACY_ROWS, (CACHE_DURATION_SECONDS, CACHE_KIND_CURRENT,
+                                                      CACHE_KIND_HISTORICAL_TODAY, CACHE_KIND_HISTORICAL_FINAL))
         # user_queries table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_queries (
                 session_id TEXT NOT NULL,
-                query_ts INTEGER NOT NULL,
+                query_ts REAL NOT NULL,
                 location_string TEXT NOT NULL,
                 start_date INTEGER,
                 end_date INTEGER,
                 PRIMARY KEY (session_id, query_ts)
             )
         ''')
+        # geocode_cache table, keyed by normalize_location_query()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                query_key TEXT PRIMARY KEY,
+                found INTEGER NOT NULL,
+                lat REAL,
+                lon REAL,
+                name TEXT,
+                message TEXT,
+                fetch_ts INTEGER NOT NULL,
+                expires_ts INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_geocode_cache_expires ON geocode_cache (expires_ts)")
+        # weather_observations table: one typed row per hourly record of historical payloads
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weather_observations (
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                ts INTEGER NOT NULL,
+                data_ts INTEGER NOT NULL,
+                temp REAL,
+                feels_like REAL,
+                pressure REAL,
+                humidity REAL,
+                dew_point REAL,
+                uvi REAL,
+                clouds REAL,
+                visibility REAL,
+                wind_speed REAL,
+                wind_deg REAL,
+                wind_gust REAL,
+                weather_main TEXT,
+                weather_description TEXT,
+                PRIMARY KEY (lat, lon, ts)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_observations_data_ts ON weather_observations (lat, lon, data_ts)")
+        # cache_locations: one row per cell present in weather_cache (see get_nearest_cached_locations())
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_locations (
+                location_id INTEGER PRIMARY KEY,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                UNIQUE (lat, lon)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_weather_cache_insert_location
+            AFTER INSERT ON weather_cache
+            BEGIN
+                INSERT OR IGNORE INTO cache_locations (lat, lon) VALUES (NEW.lat, NEW.lon);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_weather_cache_delete_location
+            AFTER DELETE ON weather_cache
+            WHEN NOT EXISTS (SELECT 1 FROM weather_cache WHERE lat = OLD.lat AND lon = OLD.lon)
+            BEGIN
+                DELETE FROM cache_locations WHERE lat = OLD.lat AND lon = OLD.lon;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_weather_cache_update_location
+            AFTER UPDATE OF lat, lon ON weather_cache
+            BEGIN
+                INSERT OR IGNORE INTO cache_locations (lat, lon) VALUES (NEW.lat, NEW.lon);
+                DELETE FROM cache_locations WHERE lat = OLD.lat AND lon = OLD.lon
+                    AND NOT EXISTS (SELECT 1 FROM weather_cache WHERE lat = OLD.lat AND lon = OLD.lon);
+            END
+        ''')
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS cache_locations_rtree
+                USING rtree(location_id, min_lat, max_lat, min_lon, max_lon)
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_cache_locations_insert_rtree
+                AFTER INSERT ON cache_locations
+                BEGIN
+                    INSERT INTO cache_locations_rtree VALUES (NEW.location_id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_cache_locations_delete_rtree
+                AFTER DELETE ON cache_locations
+                BEGIN
+                    DELETE FROM cache_locations_rtree WHERE location_id = OLD.location_id;
+                END
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"No R*Tree spatial index ({e}); nearest-location lookups scan cache_locations by latitude.")
+        # Observations follow their weather_cache row out (purge, eviction, manual delete).
+        # REPLACE does not fire this trigger, so re-fetching a day keeps its observations.
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_weather_cache_delete_observations
+            AFTER DELETE ON weather_cache
+            BEGIN
+                DELETE FROM weather_observations
+                WHERE lat = OLD.lat AND lon = OLD.lon AND data_ts = OLD.data_ts;
+            END
+        ''')
+        # backfill_jobs / backfill_tasks: checkpoint of each historical range request, one task per day
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backfill_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                loc TEXT,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                session_id TEXT,
+                created_ts INTEGER NOT NULL,
+                updated_ts INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_backfill_jobs_range ON backfill_jobs (lat, lon, start_ts, end_ts)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backfill_tasks (
+                job_id INTEGER NOT NULL,
+                data_ts INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_ts INTEGER NOT NULL,
+                PRIMARY KEY (job_id, data_ts)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_backfill_jobs_delete_tasks
+            AFTER DELETE ON backfill_jobs
+            BEGIN
+                DELETE FROM backfill_tasks WHERE job_id = OLD.job_id;
+            END
+        ''')
+        # rate_limit_buckets: state of each rate_limiter.SharedTokenBucket, shared by every process on the host
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_ts REAL NOT NULL
+            )
+        ''')
+        # singleflight_leases: key held by the process running a singleflight.SharedSingleFlight flight
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS singleflight_leases (
+                flight_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_ts REAL NOT NULL
+            )
+        ''')
+        # api_calls (raw ledger) and api_call_rollups (per UTC day / month totals)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_calls (
+                ts REAL NOT NULL,
+                endpoint TEXT NOT NULL,
+                status TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_calls_ts ON api_calls (ts)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_call_rollups (
+                period TEXT NOT NULL,
+                period_key TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                errors INTEGER NOT NULL,
+                PRIMARY KEY (period, period_key, endpoint)
+            ) WITHOUT ROWID
+        ''')
+        # Secondary indexes; the (lat, lon, data_ts) primary key already serves exact and range lookups
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_cache_loc_fetch ON weather_cache (loc, fetch_ts, lat, lon)")
+        # Latest-current lookups skip historical rows of the same cell; replaces (lat, lon, fetch_ts)
+        cursor.execute("DROP INDEX IF EXISTS idx_weather_cache_coords_fetch")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_cache_kind_fetch ON weather_cache (lat, lon, kind, fetch_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_cache_fetch_ts ON weather_cache (fetch_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_queries_query_ts ON user_queries (query_ts)")
+        cursor.execute("PRAGMA user_version;")
+        version = cursor.fetchone()[0]
+        if version < 1:
+            _migrate_day_keys(cursor)
+        if version < 2:
+            cursor.execute("INSERT OR IGNORE INTO cache_locations (lat, lon) SELECT DISTINCT lat, lon FROM weather_cache")
+        if version < 3:
+            _migrate_grid_keys(cursor)
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version={SCHEMA_VERSION};")
         conn.commit()
     print(f"SQLite database '{DB_NAME}' initialized/checked.")
 
+def _migrate_day_keys(cursor):
+    """Re-keys historical rows from the server-local midnight they were stored under to day_key().
+
+    The day comes from the payload's first hourly dt (the noon-UTC timestamp it was fetched
+    for). Keys without a payload (unreadable rows, backfill tasks and jobs) reuse the shift
+    learned from rows whose old key had the same time of day, i.e. the same old timezone,
+    else are rounded, which is exact for UTC offsets within +-12h. A row whose canonical key
+    is already taken (the day was re-fetched under it) is dropped.
+    """
+    rows = cursor.execute("SELECT lat, lon, data_ts, data, data_codec FROM weather_cache WHERE kind IN (?, ?)",
+                          (CACHE_KIND_HISTORICAL_TODAY, CACHE_KIND_HISTORICAL_FINAL)).fetchall()
+    shifts = {}  # old key's seconds past UTC midnight -> new key - old key
+    new_keys = {}
+    for row in rows:
+        lat, lon, old_key = row['lat'], row['lon'], row['data_ts']
+        first_dt = None
+        if row['data_codec'] == OBSERVATIONS_CODEC:
+            first_dt = cursor.execute("SELECT MIN(ts) FROM weather_observations WHERE lat = ? AND lon = ? AND data_ts = ?",
+                                      (lat, lon, old_key)).fetchone()[0]
+        elif row['data']:
+            try:
+                first_dt = decode_payload(row['data'], row['data_codec'])['data'][0]['dt']
+            except Exception:
+                pass  # unreadable payload: keyed like the rows without one
+        if first_dt is not None:
+            new_keys[(lat, lon, old_key)] = day_key(day_from_key(first_dt))
+            shifts[old_key % 86400] = new_keys[(lat, lon, old_key)] - old_key
+
+    def migrated(old_key):
+        shift = shifts.get(old_key % 86400)
+        return old_key + shift if shift is not None else _nearest_day_key(old_key)
+
+    moved = dropped = 0
+    for row in rows:
+        lat, lon, old_key = row['lat'], row['lon'], row['data_ts']
+        new_key = new_keys.get((lat, lon, old_key)) or migrated(old_key)
+        if new_key == old_key:
+            continue
+        if cursor.execute("SELECT 1 FROM weather_cache WHERE lat = ? AND lon = ? AND data_ts = ?",
+                          (lat, lon, new_key)).fetchone():
+            cursor.execute("DELETE FROM weather_cache WHERE lat = ? AND lon = ? AND data_ts = ?", (lat, lon, old_key))
+            dropped += 1
+            continue
+        cursor.execute("UPDATE weather_observations SET data_ts = ? WHERE lat = ? AND lon = ? AND data_ts = ?",
+                       (new_key, lat, lon, old_key))
+        cursor.execute("UPDATE weather_cache SET data_ts = ? WHERE lat = ? AND lon = ? AND data_ts = ?",
+                       (new_key, lat, lon, old_key))
+        moved += 1
+    tasks = cursor.execute("SELECT job_id, data_ts FROM backfill_tasks").fetchall()
+    cursor.executemany("UPDATE backfill_tasks SET data_ts = ? WHERE job_id = ? AND data_ts = ?",
+                       [(migrated(data_ts), job_id, data_ts) for job_id, data_ts in tasks])
+    jobs = cursor.execute("SELECT job_id, start_ts, end_ts FROM backfill_jobs").fetchall()
+    cursor.executemany("UPDATE backfill_jobs SET start_ts = ?, end_ts = ? WHERE job_id = ?",
+                       [(migrated(start_ts), migrated(end_ts), job_id) for job_id, start_ts, end_ts in jobs])
+    if moved or dropped:
+        print(f"Day-key migration: {moved} historical row(s) re-keyed, {dropped} duplicate(s) dropped.")
+
+def _migrate_grid_keys(cursor):
+    """Re-keys rows stored under raw coordinates (before quantization) to their grid cell.
+
+    Lookups only ever ask for quantized coordinates, so such rows were unreachable, and
+    historical ones never expire. A row whose cell already holds the same data_ts is dropped;
+    the triggers keep cache_locations and weather_observations in step. Backfill jobs are
+    re-keyed too. Does nothing while quantization is disabled (CACHE_GRID_DEGREES = 0).
+    """
+    if not CACHE_GRID_DEGREES:
+        return
+    rows = cursor.execute("SELECT lat, lon, data_ts FROM weather_cache").fetchall()
+    moved = dropped = 0
+    for lat, lon, data_ts in rows:
+        q_lat, q_lon = quantize_coords(lat, lon)
+        if (q_lat, q_lon) == (lat, lon):
+            continue
+        if cursor.execute("SELECT 1 FROM weather_cache WHERE lat = ? AND lon = ? AND data_ts = ?",
+                          (q_lat, q_lon, data_ts)).fetchone():
+            cursor.execute("DELETE FROM weather_cache WHERE lat = ? AND lon = ? AND data_ts = ?", (lat, lon, data_ts))
+            dropped += 1
+            continue
+        cursor.execute("UPDATE OR REPLACE weather_observations SET lat = ?, lon = ? WHERE lat = ? AND lon = ? AND data_ts = ?",
+                       (q_lat, q_lon, lat, lon, data_ts))
+        cursor.execute("UPDATE weather_cache SET lat = ?, lon = ? WHERE lat = ? AND lon = ? AND data_ts = ?",
+                       (q_lat, q_lon, lat, lon, data_ts))
+        moved += 1
+    jobs = cursor.execute("SELECT job_id, lat, lon FROM backfill_jobs").fetchall()
+    cursor.executemany("UPDATE backfill_jobs SET lat = ?, lon = ? WHERE job_id = ?",
+                       [quantize_coords(lat, lon) + (job_id,) for job_id, lat, lon in jobs
+                        if quantize_coords(lat, lon) != (lat, lon)])
+    if moved or dropped:
+        print(f"Grid-key migration: {moved} row(s) re-keyed to quantized coordinates, {dropped} duplicate(s) dropped.")
+
+# --- Cache lookup queries (kept here so check_query_plans() covers exactly what runs) ---
+SQL_LATEST_COORDS_FOR_LOCATION = """
+    SELECT lat, lon FROM weather_cache
+    WHERE loc = ?
+    ORDER BY fetch_ts DESC
+    LIMIT 1
+"""
+SQL_LATEST_CURRENT = f"""
+    SELECT data_ts, fetch_ts, data, data_codec FROM weather_cache
+    WHERE lat = ? AND lon = ? AND kind = '{CACHE_KIND_CURRENT}' AND fetch_ts > ?
+    ORDER BY fetch_ts DESC
+    LIMIT 1
+"""
+SQL_BY_DATA_TS = """
+    SELECT data_ts, fetch_ts, kind, data, data_codec FROM weather_cache
+    WHERE lat = ? AND lon = ? AND data_ts = ?
+    LIMIT 1
+"""
+SQL_RANGE_BY_DATA_TS = """
+    SELECT data_ts, fetch_ts, kind, data, data_codec FROM weather_cache
+    WHERE lat = ? AND lon = ? AND data_ts BETWEEN ? AND ?
+"""
+SQL_MANY_BY_DATA_TS = """
+    WITH wanted(lat, lon, data_ts) AS (VALUES {values})
+    SELECT weather_cache.lat, weather_cache.lon, weather_cache.data_ts, weather_cache.fetch_ts,
+           weather_cache.kind, weather_cache.data, weather_cache.data_codec
+    FROM wanted CROSS JOIN weather_cache
+    WHERE weather_cache.lat = wanted.lat AND weather_cache.lon = wanted.lon AND weather_cache.data_ts = wanted.data_ts
+"""
+GET_CACHE_MANY_CHUNK = 300  # keys per statement; 3 bound parameters each stays under SQLite's 999 limit
+SQL_REPLACE_CACHE = """
+    REPLACE INTO weather_cache (lat, lon, loc, data_ts, fetch_ts, data, data_codec, kind)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_CLASSIFY_LEGACY_ROWS = """
+    UPDATE weather_cache SET kind = CASE
+        WHEN data_ts >= fetch_ts - ? THEN ?
+        WHEN data_ts + 86400 > fetch_ts THEN ?
+        ELSE ?
+    END
+    WHERE kind IS NULL
+"""
+SQL_REPLACE_OBSERVATION = f"""
+    REPLACE INTO weather_observations (lat, lon, ts, data_ts, {', '.join(OBSERVATION_FIELDS)}, weather_main, weather_description)
+    VALUES ({', '.join(['?'] * (len(OBSERVATION_FIELDS) + 6))})
+"""
+SQL_OBSERVATIONS_BY_DATA_TS_RANGE = """
+    SELECT * FROM weather_observations
+    WHERE lat = ? AND lon = ? AND data_ts BETWEEN ? AND ?
+"""
+SQL_OBSERVATIONS_BY_TS_RANGE = """
+    SELECT * FROM weather_observations
+    WHERE lat = ? AND lon = ? AND ts BETWEEN ? AND ?
+    ORDER BY ts
+"""
+SQL_DAILY_TEMPERATURE_STATS = """
+    SELECT data_ts AS day_ts, MIN(temp) AS min_temp, MAX(temp) AS max_temp,
+           AVG(temp) AS mean_temp, COUNT(temp) AS samples
+    FROM weather_observations
+    WHERE lat = ? AND lon = ? AND data_ts BETWEEN ? AND ?
+    GROUP BY data_ts
+    ORDER BY data_ts
+"""
+SQL_GEOCODE_BY_KEY = """
+    SELECT found, lat, lon, name, message FROM geocode_cache
+    WHERE query_key = ? AND expires_ts > ?
+"""
+SQL_REPLACE_GEOCODE = """
+    REPLACE INTO geocode_cache (query_key, found, lat, lon, name, message, fetch_ts, expires_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_PURGE_EXPIRED_GEOCODES = "DELETE FROM geocode_cache WHERE expires_ts <= ?"
+SQL_PURGE_EXPIRED_BATCH = """
+    DELETE FROM weather_cache WHERE rowid IN (
+        SELECT rowid FROM weather_cache
+        WHERE fetch_ts < ? AND kind = ?
+        LIMIT ?
+    )
+"""
+SQL_EVICT_OLDEST_BATCH = """
+    DELETE FROM weather_cache WHERE rowid IN (
+        SELECT rowid FROM weather_cache
+        ORDER BY fetch_ts
+        LIMIT ?
+    )
+"""
+# Cells inside a (min_lat, max_lat, min_lon, max_lon) box with their latest fetch_ts of one kind,
+# through the R*Tree or, without it, a latitude range on cache_locations' (lat, lon) index
+SQL_NEARBY_LOCATIONS_RTREE = """
+    SELECT cache_locations.lat, cache_locations.lon,
+           (SELECT MAX(weather_cache.fetch_ts) FROM weather_cache
+            WHERE weather_cache.lat = cache_locations.lat AND weather_cache.lon = cache_locations.lon
+              AND weather_cache.kind = ?) AS fetch_ts
+    FROM cache_locations_rtree CROSS JOIN cache_locations
+    WHERE cache_locations_rtree.max_lat >= ? AND cache_locations_rtree.min_lat <= ?
+      AND cache_locations_rtree.max_lon >= ? AND cache_locations_rtree.min_lon <= ?
+      AND cache_locations.location_id = cache_locations_rtree.location_id
+"""
+SQL_NEARBY_LOCATIONS_SCAN = """
+    SELECT cache_locations.lat, cache_locations.lon,
+           (SELECT MAX(weather_cache.fetch_ts) FROM weather_cache
+            WHERE weather_cache.lat = cache_locations.lat AND weather_cache.lon = cache_locations.lon
+              AND weather_cache.kind = ?) AS fetch_ts
+    FROM cache_locations
+    WHERE cache_locations.lat BETWEEN ? AND ? AND cache_locations.lon BETWEEN ? AND ?
+"""
+SQL_FIND_OPEN_BACKFILL_JOB = """
+    SELECT job_id FROM backfill_jobs
+    WHERE lat = ? AND lon = ? AND start_ts = ? AND end_ts = ? AND status != 'done'
+    ORDER BY job_id DESC
+    LIMIT 1
+"""
+SQL_INSERT_BACKFILL_JOB = """
+    INSERT INTO backfill_jobs (lat, lon, loc, start_ts, end_ts, status, session_id, created_ts, updated_ts)
+    VALUES (?, ?, ?, ?, ?, 'open', ?, ?, ?)
+"""
+# On resume: cached days become done, done days missing from the cache and failed days go back to
+# pending (failed ones with a fresh set of attempts), in-flight days are left to their lease
+SQL_UPSERT_BACKFILL_TASK = """
+    INSERT INTO backfill_tasks (job_id, data_ts, state, attempts, updated_ts) VALUES (?, ?, ?, 0, ?)
+    ON CONFLICT (job_id, data_ts) DO UPDATE SET
+        state = CASE WHEN excluded.state = 'done' THEN 'done'
+                     WHEN backfill_tasks.state IN ('done', 'failed') THEN 'pending'
+                     ELSE backfill_tasks.state END,
+        attempts = CASE WHEN backfill_tasks.state = 'failed' THEN 0 ELSE backfill_tasks.attempts END,
+        updated_ts = excluded.updated_ts
+"""
+# A single statement, so two workers can never claim the same day
+SQL_CLAIM_BACKFILL_TASKS = """
+    UPDATE backfill_tasks SET state = 'in_flight', attempts = attempts + 1, updated_ts = ?
+    WHERE job_id = ? AND data_ts IN (
+        SELECT data_ts FROM backfill_tasks
+        WHERE job_id = ?
+          AND (state = 'pending' OR (state = 'failed' AND attempts < ?) OR (state = 'in_flight' AND updated_ts < ?))
+        ORDER BY data_ts
+        LIMIT ?
+    )
+    RETURNING data_ts, attempts
+"""
+SQL_FINISH_BACKFILL_TASK = """
+    UPDATE backfill_tasks SET state = ?, last_error = ?, updated_ts = ?
+    WHERE job_id = ? AND data_ts = ?
+"""
+SQL_RELEASE_BACKFILL_TASK = """
+    UPDATE backfill_tasks SET state = 'pending', attempts = MAX(attempts - 1, 0), updated_ts = ?
+    WHERE job_id = ? AND data_ts = ? AND state = 'in_flight'
+"""
+SQL_REQUEUE_FAILED_BACKFILL_TASKS = """
+    UPDATE backfill_tasks SET state = 'pending', attempts = 0, updated_ts = ?
+    WHERE job_id = ? AND state = 'failed'
+"""
+SQL_SET_BACKFILL_JOB_STATUS = "UPDATE backfill_jobs SET status = ?, updated_ts = ? WHERE job_id = ?"
+SQL_BACKFILL_JOB_BY_ID = "SELECT * FROM backfill_jobs WHERE job_id = ?"
+SQL_BACKFILL_TASK_COUNTS = """
+    SELECT COUNT(*) AS total,
+           COALESCE(SUM(state = 'done'), 0) AS done,
+           COALESCE(SUM(state = 'pending'), 0) AS pending,
+           COALESCE(SUM(state = 'in_flight'), 0) AS in_flight,
+           COALESCE(SUM(state = 'failed'), 0) AS failed,
+           COALESCE(SUM(state = 'failed' AND attempts < ?), 0) AS retryable,
+           COALESCE(SUM(attempts), 0) AS attempts
+    FROM backfill_tasks WHERE job_id = ?
+"""
+SQL_BACKFILL_TASKS_FOR_JOB = """
+    SELECT data_ts, state, attempts, last_error, updated_ts FROM backfill_tasks
+    WHERE job_id = ?
+    ORDER BY data_ts
+"""
+SQL_RECENT_BACKFILL_JOBS = """
+    SELECT job_id, lat, lon, loc, start_ts, end_ts, status, session_id, created_ts, updated_ts FROM backfill_jobs
+    ORDER BY job_id DESC
+    LIMIT ?
+"""
+SQL_INSERT_API_CALL = "INSERT INTO api_calls (ts, endpoint, status) VALUES (?, ?, ?)"
+SQL_ADD_API_CALL_ROLLUP = """
+    INSERT INTO api_call_rollups (period, period_key, endpoint, calls, errors) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (period, period_key, endpoint) DO UPDATE SET
+        calls = calls + excluded.calls,
+        errors = errors + excluded.errors
+"""
+SQL_API_CALL_TOTAL = """
+    SELECT COALESCE(SUM(calls), 0) AS calls FROM api_call_rollups
+    WHERE period = ? AND period_key = ?
+"""
+SQL_API_CALL_ROLLUPS = """
+    SELECT period, period_key, endpoint, calls, errors FROM api_call_rollups
+    WHERE period = ?
+    ORDER BY period_key DESC
+    LIMIT ?
+"""
+SQL_PURGE_OLD_API_CALLS = "DELETE FROM api_calls WHERE ts < ?"
+SQL_INSERT_USER_QUERY = """
+    INSERT INTO user_queries (session_id, query_ts, location_string, start_date, end_date)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SQL_ALL_USER_QUERIES = """
+    SELECT session_id, query_ts, location_string, start_date, end_date FROM user_queries
+    ORDER BY query_ts DESC
+"""
+
+# (name, sql, sample params, full_read) for every fixed query in this module.
+# Lookups must be index searches; full_read queries intentionally visit every row
+# but must still avoid a temporary sort.
+QUERY_PLAN_CHECKS = [
+    ("latest_coords_for_location", SQL_LATEST_COORDS_FOR_LOCATION, ("x",), False),
+    ("latest_current", SQL_LATEST_CURRENT, (0.0, 0.0, 0), False),
+    ("by_data_ts", SQL_BY_DATA_TS, (0.0, 0.0, 0), False),
+    ("range_by_data_ts", SQL_RANGE_BY_DATA_TS, (0.0, 0.0, 0, 0), False),
+    ("many_by_data_ts", SQL_MANY_BY_DATA_TS.format(values="(?, ?, ?), (?, ?, ?)"), (0.0, 0.0, 0, 0.0, 0.0, 1), False),
+    ("update_weather_cache_by_pk", "UPDATE weather_cache SET data = ? WHERE lat = ? AND lon = ? AND data_ts = ?", (None, 0.0, 0.0, 0), False),
+    ("delete_weather_cache_by_pk", "DELETE FROM weather_cache WHERE lat = ? AND lon = ? AND data_ts = ?", (0.0, 0.0, 0), False),
+    ("observations_by_data_ts_range", SQL_OBSERVATIONS_BY_DATA_TS_RANGE, (0.0, 0.0, 0, 0), False),
+    ("observations_by_ts_range", SQL_OBSERVATIONS_BY_TS_RANGE, (0.0, 0.0, 0, 0), False),
+    ("daily_temperature_stats", SQL_DAILY_TEMPERATURE_STATS, (0.0, 0.0, 0, 0), False),
+    ("delete_observations_for_day", "DELETE FROM weather_observations WHERE lat = ? AND lon = ? AND data_ts = ?", (0.0, 0.0, 0), False),
+    ("geocode_by_key", SQL_GEOCODE_BY_KEY, ("q:x", 0), False),
+    ("purge_expired_geocodes", SQL_PURGE_EXPIRED_GEOCODES, (0,), False),
+    ("purge_expired_batch", SQL_PURGE_EXPIRED_BATCH, (0, CACHE_KIND_CURRENT, 1), False),
+    ("evict_oldest_batch", SQL_EVICT_OLDEST_BATCH, (1,), True),
+    ("insert_user_query", SQL_INSERT_USER_QUERY, ("s", 0.0, "x", None, None), False),
+    ("all_user_queries", SQL_ALL_USER_QUERIES, (), True),
+    ("nearby_locations_scan", SQL_NEARBY_LOCATIONS_SCAN, (CACHE_KIND_CURRENT, 0.0, 0.1, 0.0, 0.1), False),
+    ("find_open_backfill_job", SQL_FIND_OPEN_BACKFILL_JOB, (0.0, 0.0, 0, 0), False),
+    ("upsert_backfill_task", SQL_UPSERT_BACKFILL_TASK, (1, 0, "pending", 0), False),
+    ("claim_backfill_tasks", SQL_CLAIM_BACKFILL_TASKS, (0, 1, 1, 3, 0, 10), False),
+    ("finish_backfill_tasks", SQL_FINISH_BACKFILL_TASK, ("done", None, 0, 1, 0), False),
+    ("release_backfill_task", SQL_RELEASE_BACKFILL_TASK, (0, 1, 0), False),
+    ("requeue_failed_backfill_tasks", SQL_REQUEUE_FAILED_BACKFILL_TASKS, (0, 1), False),
+    ("set_backfill_job_status", SQL_SET_BACKFILL_JOB_STATUS, ("open", 0, 1), False),
+    ("backfill_job_by_id", SQL_BACKFILL_JOB_BY_ID, (1,), False),
+    ("backfill_task_counts", SQL_BACKFILL_TASK_COUNTS, (3, 1), False),
+    ("backfill_tasks_for_job", SQL_BACKFILL_TASKS_FOR_JOB, (1,), False),
+    ("recent_backfill_jobs", SQL_RECENT_BACKFILL_JOBS, (20,), True),
+    ("api_call_total", SQL_API_CALL_TOTAL, ("day", "2024-01-01"), False),
+    ("api_call_rollups", SQL_API_CALL_ROLLUPS, ("day", 10), False),
+    ("purge_old_api_calls", SQL_PURGE_OLD_API_CALLS, (0,), False),
+]
+
+def check_query_plans():
+    """Runs EXPLAIN QUERY PLAN on every query in QUERY_PLAN_CHECKS.
+
+    Returns a list of (query_name, plan_detail) for each query that falls back to a
+    full table scan (or, for full_read queries, to a temporary sort). Empty means healthy.
+    """
+    violations = []
+    tables = set(get_table_names())
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        checks = list(QUERY_PLAN_CHECKS)
+        if _has_spatial_index(conn):
+            checks.append(("nearby_locations_rtree", SQL_NEARBY_LOCATIONS_RTREE, (CACHE_KIND_CURRENT, 0.0, 0.1, 0.0, 0.1), False))
+        # get_table_page() in key order: the first page reads the key index in order, later
+        # pages seek past the cursor on it
+        for table in sorted(tables):
+            key_columns = get_table_primary_key_columns(table) or ['rowid']
+            for direction in ("ASC", "DESC"):
+                sql, params, _ = _table_page_query(table, None, direction, key_columns, None)
+                checks.append((f"table_page_{table}_{direction.lower()}", sql, params + [51], True))
+                sql, params, _ = _table_page_query(table, None, direction, key_columns, [0] * len(key_columns))
+                checks.append((f"table_page_{table}_{direction.lower()}_after", sql, params + [51], False))
+        for name, sql, params, full_read in checks:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            for row in cursor.fetchall():
+                detail = row['detail']
+                # Scans of CTEs or VALUES lists are fine; only scans of real tables count
+                scanned = detail.split()[1] if detail.startswith('SCAN ') else None
+                if 'USE TEMP B-TREE' in detail or (not full_read and scanned in tables):
+                    violations.append((name, detail))
+    return violations
+
+def _is_hourly_payload(data):
+    """True for timemachine-style payloads carrying a list of hourly records under 'data'."""
+    return isinstance(data, dict) and isinstance(data.get('data'), list)
+
+def _observation_rows(lat, lon, data_ts, data):
+    """Extracts weather_observations rows from a timemachine payload."""
+    rows = []
+    for hour in data['data']:
+        if not isinstance(hour, dict) or 'dt' not in hour:
+            continue
+        weather = (hour.get('weather') or [{}])[0]
+        rows.append((lat, lon, hour['dt'], data_ts)
+                    + tuple(hour.get(field) for field in OBSERVATION_FIELDS)
+                    + (weather.get('main'), weather.get('description')))
+    return rows
+
+def _payloads_from_observations(conn, lat, lon, data_ts_values):
+    """Rebuilds {data_ts: payload} for rows whose raw payload was not stored."""
+    payloads = {data_ts: {"lat": lat, "lon": lon, "data": []} for data_ts in data_ts_values}
+    if not payloads:
+        return payloads
+    cursor = conn.execute(SQL_OBSERVATIONS_BY_DATA_TS_RANGE, (lat, lon, min(payloads), max(payloads)))
+    for row in cursor.fetchall():
+        if row['data_ts'] not in payloads:
+            continue
+        hour = {"dt": row['ts']}
+        hour.update({field: row[field] for field in OBSERVATION_FIELDS if row[field] is not None})
+        hour["weather"] = [{"main": row['weather_main'], "description": row['weather_description']}]
+        payloads[row['data_ts']]["data"].append(hour)
+    return payloads
+
+def _payload_size(payload, data):
+    """Bytes charged against the memory tier for an entry."""
+    if payload is not None:
+        return len(payload)
+    return OBSERVATION_ROW_BYTES * len(data.get('data', [])) if isinstance(data, dict) else 0
+
+def classify_payload(data, data_ts, fetch_ts=None):
+    """Returns the TTL kind of a payload about to be cached under data_ts."""
+    fetch_ts = int(time.time()) if fetch_ts is None else fetch_ts
+    if _is_hourly_payload(data):
+        # data_ts is the start of the day; once the whole day is past its hours are final
+        ended = data_ts + 86400 <= fetch_ts
+        return CACHE_KIND_HISTORICAL_FINAL if ended else CACHE_KIND_HISTORICAL_TODAY
+    if isinstance(data, dict) and 'current' not in data and ('daily' in data or 'hourly' in data):
+        return CACHE_KIND_FORECAST
+    if data_ts >= fetch_ts - CACHE_DURATION_SECONDS:
+        return CACHE_KIND_CURRENT
+    return CACHE_KIND_HISTORICAL_FINAL
+
+def get_cache_ttl(kind):
+    """TTL in seconds for a kind, None for entries that never expire; unknown kinds count as current."""
+    return CACHE_TTL_SECONDS.get(kind, CACHE_TTL_SECONDS[CACHE_KIND_CURRENT])
+
+def is_cache_entry_fresh(kind, fetch_ts, now=None):
+    ttl = get_cache_ttl(kind)
+    return ttl is None or fetch_ts + ttl > (time.time() if now is None else now)
+
+def _memory_expiry(kind, fetch_ts, now=None):
+    """Memory-tier expiry for a row: its TTL, or CACHE_DURATION_SECONDS from now if it never expires."""
+    ttl = get_cache_ttl(kind)
+    return fetch_ts + ttl if ttl is not None else (time.time() if now is None else now) + CACHE_DURATION_SECONDS
+
 def get_cache(lat=None, lon=None, target_data_ts=None, location=None):
-    """Retrieves weather data from SQLite cache."""
+    """Retrieves fresh weather data from the in-process cache tier, falling back to SQLite."""
+    if lat is not None and lon is not None:
+        lat, lon = quantize_coords(lat, lon)
+        cached = _memory_cache.get((lat, lon, target_data_ts))
+        if cached is not None:
+            return cached
     with get_db_connection() as conn:
         cursor = conn.cursor()
         if (lat is None or lon is None) and location:
-            cursor.execute("SELECT lat, lon FROM weather_cache WHERE loc = ? ORDER BY fetch_ts DESC LIMIT 1", (location,))
+            cursor.execute(SQL_LATEST_COORDS_FOR_LOCATION, (location,))
             coords_row = cursor.fetchone()
             if coords_row:
                 lat, lon = coords_row['lat'], coords_row['lon']
             else:
                 return None
+            cached = _memory_cache.get((lat, lon, target_data_ts))
+            if cached is not None:
+                return cached
         if lat is None or lon is None:
             return None
 
         if target_data_ts is None:  # Fetch latest current weather
-            cursor.execute("""
-                SELECT data FROM weather_cache
-                WHERE lat = ? AND lon = ? AND fetch_ts > ?
-                ORDER BY fetch_ts DESC
-                LIMIT 1
-            """, (lat, lon, int(time.time()) - CACHE_DURATION_SECONDS))
+            kind = CACHE_KIND_CURRENT
+            cursor.execute(SQL_LATEST_CURRENT, (lat, lon, int(time.time()) - get_cache_ttl(kind)))
+            row = cursor.fetchone()
         else:  # Fetch specific historical data
-            cursor.execute("""
-                SELECT data FROM weather_cache
-                WHERE lat = ? AND lon = ? AND data_ts = ?
-                LIMIT 1
-            """, (lat, lon, target_data_ts))
-        row = cursor.fetchone()
-    return json.loads(row['data']) if row and row['data'] else None
+            cursor.execute(SQL_BY_DATA_TS, (lat, lon, target_data_ts))
+            row = cursor.fetchone()
+            kind = row['kind'] if row else None
+            if row and not is_cache_entry_fresh(kind, row['fetch_ts']):
+                return None
+        if row and row['data_codec'] == OBSERVATIONS_CODEC:
+            data = _payloads_from_observations(conn, lat, lon, [row['data_ts']])[row['data_ts']]
+        elif row and row['data']:
+            data = decode_payload(row['data'], row['data_codec'])
+        else:
+            return None
+    _memory_cache.put((lat, lon, target_data_ts), data, _payload_size(row['data'], data), _memory_expiry(kind, row['fetch_ts']))
+    return data
+
+def get_stale_cache(lat, lon, now=None):
+    """Returns (data, fetch_ts) for the latest current-weather row that expired less than
+    CACHE_STALE_GRACE_SECONDS ago, or (None, None). Call it after get_cache() misses."""
+    if not CACHE_STALE_GRACE_SECONDS:
+        return None, None
+    lat, lon = quantize_coords(lat, lon)
+    now = int(now if now is not None else time.time())
+    cutoff = now - get_cache_ttl(CACHE_KIND_CURRENT) - CACHE_STALE_GRACE_SECONDS
+    with get_db_connection() as conn:
+        row = conn.execute(SQL_LATEST_CURRENT, (lat, lon, cutoff)).fetchone()
+        if row is None:
+            return None, None
+        if row['data_codec'] == OBSERVATIONS_CODEC:
+            data = _payloads_from_observations(conn, lat, lon, [row['data_ts']])[row['data_ts']]
+        elif row['data']:
+            data = decode_payload(row['data'], row['data_codec'])
+        else:
+            return None, None
+    # Stale rows stay out of the memory tier so the next fresh write is what it serves
+    return data, row['fetch_ts']
+
+_spatial_index = {}  # DB_NAME -> whether it has the cache_locations R*Tree
+
+def _has_spatial_index(conn):
+    has_rtree = _spatial_index.get(DB_NAME)
+    if has_rtree is None:
+        has_rtree = _spatial_index[DB_NAME] = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'cache_locations_rtree'").fetchone() is not None
+    return has_rtree
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _search_boxes(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) boxes covering every point within radius_km;
+    split in two across the antimeridian, widened to all longitudes near a pole."""
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat, max_lat = lat - math.degrees(angle), lat + math.degrees(angle)
+    if min_lat <= -90.0 or max_lat >= 90.0 or math.sin(angle) >= math.cos(math.radians(lat)):
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+    # Widest longitude offset of the circle, reached where it is tangent to a meridian
+    dlon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        return [(min_lat, max_lat, min_lon + 360.0, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360.0)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+def get_nearest_cached_locations(lat, lon, k=1, radius_km=None, kind=CACHE_KIND_CURRENT, now=None):
+    """
+    Returns up to k cached cells holding fresh `kind` data within radius_km of (lat, lon),
+    nearest first, as dicts with lat, lon, distance_km and fetch_ts (the cell's latest row).
+    """
+    radius_km = NEARBY_DEFAULT_RADIUS_KM if radius_km is None else radius_km
+    ttl = get_cache_ttl(kind)
+    cutoff = -1 if ttl is None else (time.time() if now is None else now) - ttl
+    candidates = []
+    with get_db_connection() as conn:
+        sql = SQL_NEARBY_LOCATIONS_RTREE if _has_spatial_index(conn) else SQL_NEARBY_LOCATIONS_SCAN
+        for box in _search_boxes(lat, lon, radius_km):
+            for row in conn.execute(sql, (kind, *box)):
+                if row['fetch_ts'] is None or row['fetch_ts'] <= cutoff:
+                    continue
+                distance_km = _haversine_km(lat, lon, row['lat'], row['lon'])
+                if distance_km <= radius_km:
+                    candidates.append((distance_km, row['lat'], row['lon'], row['fetch_ts']))
+    return [{'lat': c_lat, 'lon': c_lon, 'distance_km': distance_km, 'fetch_ts': fetch_ts}
+            for distance_km, c_lat, c_lon, fetch_ts in heapq.nsmallest(k, candidates)]
+
+def get_nearby_cache(lat, lon, radius_km=None):
+    """Fresh current weather of the nearest cached cell within radius_km: (data, location) or (None, None)."""
+    for location in get_nearest_cached_locations(lat, lon, k=3, radius_km=radius_km):
+        data = get_cache(location['lat'], location['lon'])
+        if data:
+            return data, location
+    return None, None
 
 def get_cache_for_range(lat, lon, start_date_ts, end_date_ts):
-    """Retrieves historical weather data from SQLite cache for a date range."""
+    """Retrieves fresh historical weather data from SQLite cache for a date range."""
     cached_data = {}
+    lat, lon = quantize_coords(lat, lon)
+    now = time.time()
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT data_ts, data FROM weather_cache
-            WHERE lat = ? AND lon = ? AND data_ts BETWEEN ? AND ?
-        """, (lat, lon, start_date_ts, end_date_ts))
+        cursor.execute(SQL_RANGE_BY_DATA_TS, (lat, lon, start_date_ts, end_date_ts))
+        observation_only = []
         for row in cursor.fetchall():
-            if row['data']:
-                cached_data[row['data_ts']] = json.loads(row['data'])
+            if not is_cache_entry_fresh(row['kind'], row['fetch_ts'], now):
+                continue
+            if row['data_codec'] == OBSERVATIONS_CODEC:
+                observation_only.append(row['data_ts'])
+            elif row['data']:
+                cached_data[row['data_ts']] = decode_payload(row['data'], row['data_codec'])
+        cached_data.update(_payloads_from_observations(conn, lat, lon, observation_only))
     return cached_data
 
 def set_cache(lat, lon, location, data, data_ts):
-    """Stores weather data in SQLite cache."""
+    """Stores weather data in SQLite cache, keyed by the quantized coordinates."""
+    set_cache_many([(lat, lon, location, data, data_ts)])
+
+def set_cache_many(rows):
+    """Stores many (lat, lon, location, data, data_ts) rows in one transaction; returns the row count.
+
+    Each row is classified with classify_payload() for its TTL. Hourly records in timemachine
+    payloads are also written to weather_observations. With STORE_RAW_HISTORICAL_PAYLOADS
+    off, such rows keep only their observations.
+    """
+    fetch_ts = int(time.time())
+    params = []
+    observations = []
+    written = []
+    for lat, lon, location, data, data_ts in rows:
+        lat, lon = quantize_coords(lat, lon)
+        kind = classify_payload(data, data_ts, fetch_ts)
+        if _is_hourly_payload(data):
+            observations.extend(_observation_rows(lat, lon, data_ts, data))
+        if _is_hourly_payload(data) and not STORE_RAW_HISTORICAL_PAYLOADS:
+            payload, codec = None, OBSERVATIONS_CODEC
+        else:
+            payload, codec = encode_payload(data)
+        params.append((lat, lon, location, data_ts, fetch_ts, payload, codec, kind))
+        written.append(((lat, lon, data_ts), kind, data, _payload_size(payload, data)))
+    if not params:
+        return 0
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            REPLACE INTO weather_cache (lat, lon, loc, data_ts, fetch_ts, data)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (lat, lon, location, data_ts, int(time.time()), json.dumps(data)))
+        conn.executemany(SQL_REPLACE_CACHE, params)
+        if observations:
+            conn.executemany(SQL_REPLACE_OBSERVATION, observations)
         conn.commit()
+    # Write-through: each historical/forecast row is the entry for its data_ts, and the last
+    # current row written per location is that location's latest current weather. Current rows
+    # are looked up by location, not data_ts, so they take one memory slot, not two.
+    latest_current = {}
+    for key, kind, data, size in written:
+        if kind == CACHE_KIND_CURRENT:
+            latest_current[key[:2]] = (data, size)
+        else:
+            _memory_cache.put(key, data, size, _memory_expiry(kind, fetch_ts))
+    for (lat, lon), (data, size) in latest_current.items():
+        _memory_cache.put((lat, lon, None), data, size, _memory_expiry(CACHE_KIND_CURRENT, fetch_ts))
+    return len(params)
 
-def log_user_query(session_id, location_string, start_date_ts=None, end_date_ts=None):
-    """Logs user query details into the SQLite database."""
-    query_ts = int(datetime.now().timestamp())
+def get_cache_many(keys):
+    """Retrieves many (lat, lon, data_ts) keys at once; returns {key: data} for the fresh keys found."""
+    found = {}
+    pending = {}
+    for key in keys:
+        lat, lon = quantize_coords(key[0], key[1])
+        cached = _memory_cache.get((lat, lon, key[2]))
+        if cached is not None:
+            found[key] = cached
+        else:
+            pending.setdefault((lat, lon, key[2]), []).append(key)
+    pending_keys = list(pending)
+    now = time.time()
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO user_queries (session_id, query_ts, location_string, start_date, end_date)
-            VALUES (?, ?, ?, ?, ?)
-        """, (session_id, query_ts, location_string, start_date_ts, end_date_ts))
+        decoded = {}
+        observation_only = {}
+        for start in range(0, len(pending_keys), GET_CACHE_MANY_CHUNK):
+            chunk = pending_keys[start:start + GET_CACHE_MANY_CHUNK]
+            values = ", ".join(["(?, ?, ?)"] * len(chunk))
+            cursor.execute(SQL_MANY_BY_DATA_TS.format(values=values), [v for key in chunk for v in key])
+            for row in cursor.fetchall():
+                if not is_cache_entry_fresh(row['kind'], row['fetch_ts'], now):
+                    continue
+                key = (row['lat'], row['lon'], row['data_ts'])
+                expires_at = _memory_expiry(row['kind'], row['fetch_ts'], now)
+                if row['data_codec'] == OBSERVATIONS_CODEC:
+                    observation_only.setdefault(key[:2], []).append((key[2], expires_at))
+                elif row['data']:
+                    decoded[key] = (decode_payload(row['data'], row['data_codec']), len(row['data']), expires_at)
+        for (lat, lon), entries in observation_only.items():
+            expiries = dict(entries)
+            for data_ts, data in _payloads_from_observations(conn, lat, lon, list(expiries)).items():
+                decoded[(lat, lon, data_ts)] = (data, _payload_size(None, data), expiries[data_ts])
+    for key, (data, size, expires_at) in decoded.items():
+        _memory_cache.put(key, data, size, expires_at)
+        for original_key in pending[key]:
+            found[original_key] = data
+    return found
+
+def get_observations(lat, lon, start_ts, end_ts):
+    """Returns the hourly observations for a location with start_ts <= ts <= end_ts, oldest first."""
+    lat, lon = quantize_coords(lat, lon)
+    with get_db_connection() as conn:
+        cursor = conn.execute(SQL_OBSERVATIONS_BY_TS_RANGE, (lat, lon, start_ts, end_ts))
+        return [dict(row) for row in cursor.fetchall()]
+
+def get_daily_temperature_stats(lat, lon, start_date_ts, end_date_ts):
+    """Returns min/max/mean temperature per cached day (data_ts) in the range, computed in SQL."""
+    lat, lon = quantize_coords(lat, lon)
+    with get_db_connection() as conn:
+        cursor = conn.execute(SQL_DAILY_TEMPERATURE_STATS, (lat, lon, start_date_ts, end_date_ts))
+        return [dict(row) for row in cursor.fetchall()]
+
+# --- Geocoding cache ---
+def normalize_location_query(location, kind='q'):
+    """Builds the geocode_cache key: kind prefix, lower-case, single spaces, no blanks around commas.
+
+    kind is the upstream lookup type ('q' for city names, 'zip' for postal codes), so
+    'Hyderabad , IN' and 'hyderabad,in' share a key but a city never collides with a zip.
+    """
+    parts = [" ".join(part.split()).lower() for part in str(location).split(',')]
+    return f"{kind}:" + ",".join(part for part in parts if part)
+
+def get_geocode(location, kind='q'):
+    """Returns the cached geocoding result for a location, or None when unknown or expired.
+
+    Hits are {'found': True, 'lat', 'lon', 'name'}; cached failures are {'found': False, 'message'}.
+    """
+    with get_db_connection() as conn:
+        row = conn.execute(SQL_GEOCODE_BY_KEY, (normalize_location_query(location, kind), int(time.time()))).fetchone()
+    if row is None:
+        return None
+    if row['found']:
+        return {"found": True, "lat": row['lat'], "lon": row['lon'], "name": row['name']}
+    return {"found": False, "message": row['message']}
+
+def set_geocode(location, lat, lon, name=None, kind='q'):
+    """Caches a successful geocoding result for GEOCODE_CACHE_SECONDS."""
+    now = int(time.time())
+    with get_db_connection() as conn:
+        conn.execute(SQL_REPLACE_GEOCODE, (normalize_location_query(location, kind), 1, lat, lon, name, None,
+                                           now, now + GEOCODE_CACHE_SECONDS))
+        conn.commit()
+
+def set_geocode_miss(location, message=None, kind='q'):
+    """Caches a failed lookup (e.g. unknown city) for GEOCODE_NEGATIVE_CACHE_SECONDS."""
+    now = int(time.time())
+    with get_db_connection() as conn:
+        conn.execute(SQL_REPLACE_GEOCODE, (normalize_location_query(location, kind), 0, None, None, None, message,
+                                           now, now + GEOCODE_NEGATIVE_CACHE_SECONDS))
+        conn.commit()
+
+def purge_expired_geocodes(now=None):
+    """Deletes expired geocode_cache rows; returns how many were removed."""
+    with get_db_connection() as conn:
+        deleted = conn.execute(SQL_PURGE_EXPIRED_GEOCODES, (int(now if now is not None else time.time()),)).rowcount
+        conn.commit()
+    return deleted
+
+# --- Historical backfill jobs ---
+def start_backfill_job(lat, lon, location, data_ts_values, done_data_ts=(), session_id=None):
+    """Creates a backfill job with one task per day key, or resumes the open job for the same range.
+
+    Days in done_data_ts (already cached) are recorded as done. Resuming keeps done days that
+    are still cached, requeues failed ones with fresh attempts and leaves in-flight ones to
+    their lease. Returns the job_id.
+    """
+    data_ts_values = sorted(set(data_ts_values))
+    done_data_ts = set(done_data_ts)
+    lat, lon = quantize_coords(lat, lon)
+    now = int(time.time())
+    with get_db_connection() as conn:
+        row = conn.execute(SQL_FIND_OPEN_BACKFILL_JOB, (lat, lon, data_ts_values[0], data_ts_values[-1])).fetchone()
+        if row:
+            job_id = row['job_id']
+        else:
+            job_id = conn.execute(SQL_INSERT_BACKFILL_JOB, (lat, lon, location, data_ts_values[0], data_ts_values[-1],
+                                                            session_id, now, now)).lastrowid
+        conn.executemany(SQL_UPSERT_BACKFILL_TASK, [
+            (job_id, data_ts, 'done' if data_ts in done_data_ts else 'pending', now) for data_ts in data_ts_values
+        ])
+        _refresh_backfill_job_status(conn, job_id, now)
+        conn.commit()
+    return job_id
+
+def claim_backfill_tasks(job_id, limit):
+    """Marks up to `limit` runnable days of a job in flight; returns [(data_ts, attempts)] oldest first."""
+    now = int(time.time())
+    with get_db_connection() as conn:
+        rows = conn.execute(SQL_CLAIM_BACKFILL_TASKS, (now, job_id, job_id, BACKFILL_MAX_ATTEMPTS,
+                                                       now - BACKFILL_LEASE_SECONDS, limit)).fetchall()
+        conn.commit()
+    return sorted((row['data_ts'], row['attempts']) for row in rows)
+
+def finish_backfill_tasks(job_id, outcomes):
+    """Records [(data_ts, error)] outcomes of claimed days in one transaction: done when error is None, failed otherwise."""
+    if not outcomes:
+        return
+    now = int(time.time())
+    with get_db_connection() as conn:
+        conn.executemany(SQL_FINISH_BACKFILL_TASK, [('done' if error is None else 'failed', error, now, job_id, data_ts)
+                                                    for data_ts, error in outcomes])
+        _refresh_backfill_job_status(conn, job_id, now)
+        conn.commit()
+
+def release_backfill_tasks(job_id, data_ts_values):
+    """Returns claimed days that were never attempted (e.g. the worker stopped) to pending."""
+    now = int(time.time())
+    with get_db_connection() as conn:
+        conn.executemany(SQL_RELEASE_BACKFILL_TASK, [(now, job_id, data_ts) for data_ts in data_ts_values])
+        conn.commit()
+
+def requeue_failed_backfill_tasks(job_id):
+    """Gives a job's failed days a fresh set of attempts; returns how many were requeued."""
+    now = int(time.time())
+    with get_db_connection() as conn:
+        requeued = conn.execute(SQL_REQUEUE_FAILED_BACKFILL_TASKS, (now, job_id)).rowcount
+        _refresh_backfill_job_status(conn, job_id, now)
         conn.commit()
+    return requeued
+
+def _backfill_task_counts(conn, job_id):
+    return dict(conn.execute(SQL_BACKFILL_TASK_COUNTS, (BACKFILL_MAX_ATTEMPTS, job_id)).fetchone())
+
+def _refresh_backfill_job_status(conn, job_id, now):
+    """Sets a job to done, failed (only exhausted days left) or open (work remains)."""
+    counts = _backfill_task_counts(conn, job_id)
+    if counts['done'] == counts['total']:
+        status = 'done'
+    elif counts['pending'] or counts['in_flight'] or counts['retryable']:
+        status = 'open'
+    else:
+        status = 'failed'
+    conn.execute(SQL_SET_BACKFILL_JOB_STATUS, (status, now, job_id))
+
+def get_backfill_job(job_id):
+    """Returns a job's row plus per-state task counts, or None."""
+    with get_db_connection() as conn:
+        row = conn.execute(SQL_BACKFILL_JOB_BY_ID, (job_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(row, **_backfill_task_counts(conn, job_id))
+
+def get_backfill_tasks(job_id):
+    """Returns every task of a job, oldest day first."""
+    with get_db_connection() as conn:
+        return [dict(row) for row in conn.execute(SQL_BACKFILL_TASKS_FOR_JOB, (job_id,)).fetchall()]
+
+def list_backfill_jobs(limit=20):
+    """Returns the most recent jobs, newest first, each with per-state task counts."""
+    with get_db_connection() as conn:
+        jobs = [dict(row) for row in conn.execute(SQL_RECENT_BACKFILL_JOBS, (limit,)).fetchall()]
+        for job in jobs:
+            job.update(_backfill_task_counts(conn, job['job_id']))
+    return jobs
+
+# --- Upstream API quota ledger ---
+_api_quota_lock = threading.Lock()
+_api_calls_pending = []  # (ts, endpoint, status) not yet written
+_api_call_counts = {}  # (period, period_key) -> calls, as of the last sync plus pending ones
+_api_quota_synced_at = 0.0
+
+def _quota_period_keys(ts):
+    """UTC ('day', 'YYYY-MM-DD') and ('month', 'YYYY-MM') keys for a timestamp."""
+    day = time.strftime('%Y-%m-%d', time.gmtime(ts))
+    return ('day', day), ('month', day[:7])
+
+def _sync_api_quota_locked(now):
+    """Writes pending calls and their roll-ups, then reloads the current totals. Caller holds the lock."""
+    global _api_quota_synced_at
+    rollups = {}
+    for ts, endpoint, status in _api_calls_pending:
+        is_error = not str(status).isdigit() or int(status) >= 400
+        for period, period_key in _quota_period_keys(ts):
+            calls, errors = rollups.get((period, period_key, endpoint), (0, 0))
+            rollups[(period, period_key, endpoint)] = (calls + 1, errors + is_error)
+    _api_quota_synced_at = now
+    try:
+        with get_db_connection() as conn:
+            if _api_calls_pending:
+                conn.executemany(SQL_INSERT_API_CALL, _api_calls_pending)
+                conn.executemany(SQL_ADD_API_CALL_ROLLUP, [key + value for key, value in rollups.items()])
+            counts = {key: conn.execute(SQL_API_CALL_TOTAL, key).fetchone()['calls'] for key in _quota_period_keys(now)}
+            conn.commit()
+    except sqlite3.Error as e:
+        # Keep counting in memory and retry on the next sync rather than failing the API call
+        print(f"Could not sync the API call ledger: {e}")
+        return
+    _api_calls_pending.clear()
+    _api_call_counts.clear()
+    _api_call_counts.update(counts)
+
+def flush_api_call_log():
+    """Writes buffered API calls to the ledger and refreshes the counters from it."""
+    with _api_quota_lock:
+        if _api_calls_pending:
+            _sync_api_quota_locked(time.time())
+
+def record_api_call(endpoint, status):
+    """Records one upstream call attempt (status: HTTP code or error name); buffered in memory."""
+    now = time.time()
+    with _api_quota_lock:
+        _api_calls_pending.append((now, endpoint, str(status)))
+        for key in _quota_period_keys(now):
+            _api_call_counts[key] = _api_call_counts.get(key, 0) + 1
+        if len(_api_calls_pending) >= API_QUOTA_SYNC_BATCH or now - _api_quota_synced_at >= API_QUOTA_SYNC_SECONDS:
+            _sync_api_quota_locked(now)
+
+def get_api_quota_status():
+    """Calls used today and this month (UTC) against the budgets; cache_only is True once one is spent."""
+    now = time.time()
+    with _api_quota_lock:
+        if now - _api_quota_synced_at >= API_QUOTA_SYNC_SECONDS:
+            _sync_api_quota_locked(now)
+        day_key, month_key = _quota_period_keys(now)
+        day_calls = _api_call_counts.get(day_key, 0)
+        month_calls = _api_call_counts.get(month_key, 0)
+    day_left = API_DAILY_CALL_BUDGET - day_calls if API_DAILY_CALL_BUDGET else None
+    month_left = API_MONTHLY_CALL_BUDGET - month_calls if API_MONTHLY_CALL_BUDGET else None
+    remaining = min((left for left in (day_left, month_left) if left is not None), default=None)
+    return {
+        "day": day_key[1], "day_calls": day_calls, "day_budget": API_DAILY_CALL_BUDGET,
+        "month": month_key[1], "month_calls": month_calls, "month_budget": API_MONTHLY_CALL_BUDGET,
+        "remaining": None if remaining is None else max(remaining, 0),
+        "cache_only": remaining is not None and remaining <= 0,
+    }
+
+def check_api_quota(calls=1):
+    """True when `calls` more upstream calls fit in the daily and monthly budgets."""
+    remaining = get_api_quota_status()["remaining"]
+    return remaining is None or remaining >= calls
+
+def get_api_call_rollups(period='day', limit=31):
+    """Per-endpoint roll-ups for the most recent days ('day') or months ('month'), newest first."""
+    flush_api_call_log()
+    with get_db_connection() as conn:
+        return [dict(row) for row in conn.execute(SQL_API_CALL_ROLLUPS, (period, limit)).fetchall()]
+
+def purge_old_api_calls(now=None):
+    """Deletes raw ledger rows older than API_CALL_LOG_RETENTION_SECONDS; roll-ups are kept."""
+    cutoff = (now if now is not None else time.time()) - API_CALL_LOG_RETENTION_SECONDS
+    with get_db_connection() as conn:
+        deleted = conn.execute(SQL_PURGE_OLD_API_CALLS, (cutoff,)).rowcount
+        conn.commit()
+    return deleted
+
+atexit.register(flush_api_call_log)
+
+# --- Write-behind query log ---
+_query_log_queue = queue.Queue(maxsize=QUERY_LOG_QUEUE_SIZE)
+_query_log_thread = None
+_query_log_stop = threading.Event()
+_query_log_lock = threading.Lock()
+_last_query_ts = 0.0
+_query_log_stats = {
+    "enqueued": 0, "written": 0, "batches": 0, "sync_writes": 0, "dropped": 0, "retries": 0,
+    "enqueue_seconds": 0.0, "write_seconds": 0.0,
+}
+
+def _next_query_ts():
+    """Returns a strictly increasing sub-second wall-clock timestamp for this process."""
+    global _last_query_ts
+    with _query_log_lock:
+        _last_query_ts = max(round(time.time(), 6), round(_last_query_ts + 0.000001, 6))
+        return _last_query_ts
+
+def _write_user_queries(records):
+    started = time.perf_counter()
+    with get_db_connection() as conn:
+        conn.executemany(SQL_INSERT_USER_QUERY, records)
+        conn.commit()
+    with _query_log_lock:
+        _query_log_stats["written"] += len(records)
+        _query_log_stats["batches"] += 1
+        _query_log_stats["write_seconds"] += time.perf_counter() - started
+
+def _write_query_log_batch(batch):
+    """Writes a batch for the writer thread; returns the records left unwritten by a transient error."""
+    error = None
+    for attempt in range(QUERY_LOG_WRITE_ATTEMPTS):
+        try:
+            _write_user_queries(batch)
+            return []
+        except sqlite3.IntegrityError as e:
+            error = e
+            break  # the same rows fail again; find the offending ones below
+        except sqlite3.Error as e:
+            error = e
+            if attempt + 1 < QUERY_LOG_WRITE_ATTEMPTS:
+                with _query_log_lock:
+                    _query_log_stats["retries"] += 1
+                time.sleep(QUERY_LOG_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+    for i, record in enumerate(batch):
+        try:
+            _write_user_queries([record])
+        except sqlite3.IntegrityError as e:
+            print(f"Dropped query log record {record[:3]}: {e}")
+            with _query_log_lock:
+                _query_log_stats["dropped"] += 1
+        except sqlite3.Error as e:
+            print(f"Failed to write {len(batch) - i} query log record(s), keeping them for the next batch: {e}")
+            return batch[i:]
+    if not isinstance(error, sqlite3.IntegrityError):
+        print(f"Wrote {len(batch)} query log record(s) one by one after: {error}")
+    return []
+
+def _query_log_loop():
+    retry = []  # records already taken from the queue whose write failed with a transient error
+    while True:
+        try:
+            batch = retry + [_query_log_queue.get(timeout=QUERY_LOG_FLUSH_INTERVAL_MS / 1000)]
+        except queue.Empty:
+            if not retry and _query_log_stop.is_set():
+                break
+            if not retry:
+                continue
+            batch = retry
+        deadline = time.monotonic() + QUERY_LOG_FLUSH_INTERVAL_MS / 1000
+        while len(batch) < QUERY_LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_query_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        retry = _write_query_log_batch(batch)
+        for _ in range(len(batch) - len(retry)):
+            _query_log_queue.task_done()
+    close_db_connection()
+
+def _start_query_log_writer():
+    global _query_log_thread
+    with _query_log_lock:
+        if _query_log_thread is None or not _query_log_thread.is_alive():
+            _query_log_stop.clear()
+            _query_log_thread = threading.Thread(target=_query_log_loop, name="db-cache-query-log", daemon=True)
+            _query_log_thread.start()
+
+def log_user_query(session_id, location_string, start_date_ts=None, end_date_ts=None):
+    """Queues user query details for the background writer; returns without touching SQLite."""
+    started = time.perf_counter()
+    record = (session_id, _next_query_ts(), location_string, start_date_ts, end_date_ts)
+    _start_query_log_writer()
+    try:
+        _query_log_queue.put_nowait(record)
+    except queue.Full:
+        _write_user_queries([record])  # Never drop a record; take the slow path instead
+        with _query_log_lock:
+            _query_log_stats["sync_writes"] += 1
+        return
+    with _query_log_lock:
+        _query_log_stats["enqueued"] += 1
+        _query_log_stats["enqueue_seconds"] += time.perf_counter() - started
+
+def flush_query_log():
+    """Blocks until every queued query log record has been written."""
+    if _query_log_thread is not None and _query_log_thread.is_alive():
+        _query_log_queue.join()
+
+def stop_query_log_writer(timeout=None):
+    """Drains the queue and stops the writer thread (registered to run at interpreter exit)."""
+    _query_log_stop.set()
+    if _query_log_thread is not None:
+        _query_log_thread.join(timeout)
+
+atexit.register(stop_query_log_writer, 5.0)
+
+def get_query_log_stats():
+    """Returns query log counters, including the click-path cost (enqueue) versus the deferred write cost."""
+    with _query_log_lock:
+        stats = dict(_query_log_stats)
+    stats["pending"] = _query_log_queue.qsize()
+    stats["avg_enqueue_us"] = stats["enqueue_seconds"] / stats["enqueued"] * 1e6 if stats["enqueued"] else 0.0
+    stats["avg_write_us_per_record"] = stats["write_seconds"] / stats["written"] * 1e6 if stats["written"] else 0.0
+    stats["avg_batch_write_ms"] = stats["write_seconds"] / stats["batches"] * 1000 if stats["batches"] else 0.0
+    return stats
 
 def get_all_user_queries():
     """Retrieves all user queries from SQLite, ordered by query time."""
+    flush_query_log()
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT session_id, query_ts, location_string, start_date, end_date FROM user_queries ORDER BY query_ts DESC")
+        cursor.execute(SQL_ALL_USER_QUERIES)
         return [dict(row) for row in cursor.fetchall()] # Convert rows to dicts
 
 def get_table_names():
     """Retrieves all table names in the SQLite database."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        # sqlite_* tables (e.g. sqlite_stat1 from ANALYZE) are SQLite internals, not app data;
+        # the R*Tree and its shadow tables only mirror cache_locations
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' "
+                       "AND name NOT LIKE 'cache\\_locations\\_rtree%' ESCAPE '\\';")
         return [row['name'] for row in cursor.fetchall()]
 
 def get_table_columns(table_name):
@@ -148,7 +1631,90 @@ def get_table_data(table_name, order_by_column=None, order_direction='ASC'):
             direction = "ASC" if order_direction.upper() == "ASC" else "DESC"
             query += f" ORDER BY `{order_by_column}` {direction}"
         cursor.execute(query)
-        return [dict(row) for row in cursor.fetchall()] # Convert rows to dicts
+        rows = [dict(row) for row in cursor.fetchall()] # Convert rows to dicts
+    if table_name == 'weather_cache':
+        for row in rows:
+            row['data'] = decode_payload(row['data'], row.get('data_codec'))
+    return rows
+
+def _keyset_condition(order_by_column, direction, key_columns, cursor_values):
+    """Builds the WHERE clause and params selecting rows strictly after a keyset cursor.
+
+    SQLite sorts NULLs first, so with a nullable order column NULL rows lead an ASC
+    listing and trail a DESC one; key_columns break ties and are assumed non-NULL.
+    """
+    op = ">" if direction == "ASC" else "<"
+    keys = ", ".join(f"`{col}`" for col in key_columns)
+    key_placeholders = ", ".join(["?"] * len(key_columns))
+    after_key = f"({keys}) {op} ({key_placeholders})"
+    if not order_by_column:
+        return after_key, list(cursor_values)
+    col = f"`{order_by_column}`"
+    last_value, key_values = cursor_values[0], list(cursor_values[1:])
+    if last_value is None:
+        if direction == "ASC":
+            return f"(({col} IS NULL AND {after_key}) OR {col} IS NOT NULL)", key_values
+        return f"({col} IS NULL AND {after_key})", key_values
+    condition = f"({col} {op} ? OR ({col} = ? AND {after_key})"
+    condition += f" OR {col} IS NULL)" if direction == "DESC" else ")"
+    return condition, [last_value, last_value] + key_values
+
+def _table_page_query(table_name, order_by_column, direction, key_columns, after):
+    """Builds get_table_page()'s query; returns (sql, params, sort_columns), the LIMIT param still to add."""
+    sort_columns = ([order_by_column] if order_by_column else []) + key_columns
+    query = f"SELECT {'rowid, ' if key_columns == ['rowid'] else ''}* FROM `{table_name}`"
+    params = []
+    if after is not None:
+        condition, params = _keyset_condition(order_by_column, direction, key_columns, after)
+        query += f" WHERE {condition}"
+    query += " ORDER BY " + ", ".join(f"`{col}` {direction}" for col in sort_columns) + " LIMIT ?"
+    return query, params, sort_columns
+
+def get_table_page(table_name, order_by_column=None, order_direction='ASC', page_size=50, after=None):
+    """Retrieves one page of a table using keyset pagination.
+
+    Rows are ordered by order_by_column (if given) and then the primary key (rowid for
+    tables without one). Pass the returned 'next_cursor' as `after` to get the next page;
+    it is None on the last page. Only the rows of the page are decoded.
+    """
+    columns = get_table_columns(table_name)
+    if order_by_column not in columns:
+        order_by_column = None
+    direction = "ASC" if order_direction.upper() == "ASC" else "DESC"
+    key_columns = get_table_primary_key_columns(table_name) or ['rowid']
+    if order_by_column in key_columns and len(key_columns) == 1:
+        order_by_column = None  # ordering by the key alone needs no tie-breaker
+
+    query, params, sort_columns = _table_page_query(table_name, order_by_column, direction, key_columns, after)
+    params.append(page_size + 1)  # one extra row tells whether another page exists
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = [dict(row) for row in cursor.fetchall()]
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = tuple(rows[-1][col] for col in sort_columns) if has_more else None
+    if key_columns == ['rowid']:
+        for row in rows:
+            row.pop('rowid', None)
+    if table_name == 'weather_cache':
+        for row in rows:
+            row['data'] = decode_payload(row['data'], row.get('data_codec'))
+    return {"rows": rows, "next_cursor": next_cursor}
+
+def estimate_row_count(table_name):
+    """Returns (row_count, is_estimate), using ANALYZE statistics when present to avoid a full count."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_stat1';")
+        if cursor.fetchone():
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table_name,))
+            stat_row = cursor.fetchone()
+            if stat_row and stat_row['stat']:
+                return int(stat_row['stat'].split()[0]), True
+        cursor.execute(f"SELECT COUNT(*) FROM `{table_name}`")
+        return cursor.fetchone()[0], False
 
 def update_record(table_name, pk_dict, field_to_update, new_value):
     """Updates a specific field in a record in SQLite, identified by its primary key."""
@@ -161,12 +1727,17 @@ def update_record(table_name, pk_dict, field_to_update, new_value):
             pk_values.append(pk_val)
         where_clause = " AND ".join(pk_conditions)
 
-        final_value_for_db = json.dumps(new_value) if field_to_update == 'data' else new_value
-
-        sql = f"UPDATE `{table_name}` SET `{field_to_update}` = ? WHERE {where_clause}"
-        params = [final_value_for_db] + pk_values
+        if field_to_update == 'data':
+            payload, codec = encode_payload(new_value)
+            sql = f"UPDATE `{table_name}` SET `data` = ?, `data_codec` = ? WHERE {where_clause}"
+            params = [payload, codec] + pk_values
+        else:
+            sql = f"UPDATE `{table_name}` SET `{field_to_update}` = ? WHERE {where_clause}"
+            params = [new_value] + pk_values
         cursor.execute(sql, params)
         conn.commit()
+    if table_name == 'weather_cache':
+        _memory_cache.clear()
 
 def delete_record(table_name, pk_dict):
     """Deletes a record from a specified table in SQLite, identified by its primary key."""
@@ -178,6 +1749,137 @@ def delete_record(table_name, pk_dict):
         params = list(pk_dict.values())
         cursor.execute(sql, params)
         conn.commit()
+    if table_name == 'weather_cache':
+        _memory_cache.clear()
+
+# --- Background maintenance ---
+_maintenance_thread = None
+_maintenance_stop = threading.Event()
+_maintenance_lock = threading.Lock()
+
+def get_db_size_bytes():
+    """Returns the bytes held by live pages (the file size minus free pages)."""
+    with get_db_connection() as conn:
+        page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+def purge_expired_cache(batch_size=None, now=None, stop=None):
+    """Deletes expired rows of every kind with a TTL in bounded batches; final history is kept.
+
+    Current-weather rows inside the stale grace window are kept too, so get_stale_cache()
+    can still serve them. A set `stop` event (the background loop's) ends it between batches.
+    """
+    batch_size = batch_size or MAINTENANCE_BATCH_ROWS
+    now = int(now if now is not None else time.time())
+    purged = 0
+    for kind, ttl in CACHE_TTL_SECONDS.items():
+        if ttl is None:
+            continue
+        cutoff = now - ttl - (CACHE_STALE_GRACE_SECONDS if kind == CACHE_KIND_CURRENT else 0)
+        while stop is None or not stop.is_set():
+            with get_db_connection() as conn:
+                deleted = conn.execute(SQL_PURGE_EXPIRED_BATCH, (cutoff, kind, batch_size)).rowcount
+                conn.commit()
+            purged += deleted
+            if deleted < batch_size:
+                break
+    return purged
+
+def enforce_db_size_limit(max_bytes=None, batch_size=None, stop=None):
+    """Evicts the least recently fetched weather_cache rows until the live data fits within max_bytes.
+
+    Only cached weather (and its observations) is evicted; if the other tables alone exceed
+    max_bytes, the overshoot is logged once weather_cache is empty. A set `stop` event ends it
+    between batches.
+    """
+    max_bytes = max_bytes or CACHE_MAX_DB_BYTES
+    batch_size = batch_size or MAINTENANCE_BATCH_ROWS
+    evicted = 0
+    while stop is None or not stop.is_set():
+        size = get_db_size_bytes()
+        if size <= max_bytes:
+            break
+        with get_db_connection() as conn:
+            deleted = conn.execute(SQL_EVICT_OLDEST_BATCH, (batch_size,)).rowcount
+            conn.commit()
+        if not deleted:
+            print(f"Cache size limit: weather_cache is empty but live data is {size} bytes, "
+                  f"{size - max_bytes} over the {max_bytes}-byte limit.")
+            break
+        evicted += deleted
+    if evicted:
+        _memory_cache.clear()
+    return evicted
+
+def incremental_vacuum(max_pages=None):
+    """Returns up to max_pages free pages to the filesystem; returns the number of pages freed."""
+    max_pages = max_pages or MAINTENANCE_VACUUM_PAGES
+    with get_db_connection() as conn:
+        before = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        # executescript steps the pragma to completion; a cursor would free a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        after = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        # A passive checkpoint moves the shrink from the WAL into the main file without waiting on readers
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE);").fetchall()
+    return before - after
+
+def refresh_table_statistics():
+    """Refreshes the sampled planner statistics that estimate_row_count() reads."""
+    with get_db_connection() as conn:
+        conn.execute(f"PRAGMA analysis_limit={MAINTENANCE_ANALYSIS_LIMIT};")
+        conn.execute("ANALYZE;")
+        conn.commit()
+
+def run_cache_maintenance(stop=None):
+    """Runs one purge / size-limit / vacuum / statistics pass and returns its stats.
+
+    A set `stop` event cuts the purge and eviction short; manual calls pass none.
+    """
+    started = time.perf_counter()
+    stats = {
+        "purged_rows": purge_expired_cache(stop=stop),
+        "purged_geocodes": purge_expired_geocodes(),
+        "purged_api_calls": purge_old_api_calls(),
+        "evicted_rows": enforce_db_size_limit(stop=stop),
+        "vacuumed_pages": incremental_vacuum(),
+        "db_bytes": get_db_size_bytes(),
+    }
+    flush_api_call_log()
+    refresh_table_statistics()
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"Cache maintenance: purged {stats['purged_rows']} expired rows and {stats['purged_geocodes']} geocodes, evicted {stats['evicted_rows']} rows, "
+          f"vacuumed {stats['vacuumed_pages']} pages, live size {stats['db_bytes']} bytes in {stats['duration_ms']} ms.")
+    return stats
+
+def _maintenance_loop(interval_seconds):
+    while not _maintenance_stop.is_set():
+        try:
+            run_cache_maintenance(_maintenance_stop)
+        except sqlite3.Error as e:
+            print(f"Cache maintenance failed: {e}")
+        _maintenance_stop.wait(interval_seconds)
+    close_db_connection()
+
+def start_cache_maintenance(interval_seconds=None):
+    """Starts the background maintenance thread once per process; later calls are no-ops."""
+    global _maintenance_thread
+    with _maintenance_lock:
+        if _maintenance_thread is not None and _maintenance_thread.is_alive():
+            return _maintenance_thread
+        _maintenance_stop.clear()
+        _maintenance_thread = threading.Thread(
+            target=_maintenance_loop, args=(interval_seconds or MAINTENANCE_INTERVAL_SECONDS,),
+            name="db-cache-maintenance", daemon=True)
+        _maintenance_thread.start()
+        return _maintenance_thread
+
+def stop_cache_maintenance(timeout=None):
+    """Signals the maintenance thread to stop after its current batch and waits for it."""
+    _maintenance_stop.set()
+    if _maintenance_thread is not None:
+        _maintenance_thread.join(timeout)
 
 if __name__ == '__main__':
     # Example usage (optional, for testing)
@@ -209,4 +1911,286 @@ if __name__ == '__main__':
         print("Weather_cache PK:", get_table_primary_key_columns('weather_cache'))
         print("Weather_cache data:", get_table_data('weather_cache'))
 
+    # Every fixed query must stay on an index
+    plan_violations = check_query_plans()
+    print("Query plan violations:", plan_violations)
+    assert not plan_violations
+
+    # Replay a synthetic query trace through the old single TTL and the per-kind policy with a
+    # range of current-weather TTLs. The deciding metric is upstream calls on the busiest day
+    # against API_DAILY_CALL_BUDGET; the age of the current data users were served and the
+    # serves of days cached before they ended show what the calls buy. Trace: three days of
+    # 60 current-weather lookups an hour over 20 locations (Zipf popularity) and 3 7-day
+    # history ranges an hour ending in the last two weeks (today included).
+    import random
+    rng = random.Random(0)
+    trace_start = 1717200000  # 2024-06-01 00:00 UTC
+    popularity = [1 / (i + 1) for i in range(20)]
+    trace = []
+    for hour in range(72):
+        for location in rng.choices(range(20), popularity, k=60):
+            trace.append((trace_start + hour * 3600 + rng.randrange(3600), location, None))
+        for _ in range(3):
+            t = trace_start + hour * 3600 + rng.randrange(3600)
+            last_day = (t // 86400 - rng.randrange(14)) * 86400
+            location = rng.choices(range(20), popularity)[0]
+            trace.extend((t, location, last_day - i * 86400) for i in range(7))
+    trace.sort()
+
+    def replay(is_fresh):
+        entries = {}
+        day_calls = {}
+        current_ages = []
+        unfinished_serves = 0
+        for t, location, data_ts in trace:
+            key = (location, data_ts)
+            entry = entries.get(key)
+            if entry is not None and is_fresh(entry[0], entry[1], t):
+                if data_ts is None:
+                    current_ages.append(t - entry[1])
+                elif entry[1] < data_ts + 86400 <= t:
+                    unfinished_serves += 1  # day fetched before it ended, served after
+                continue
+            if data_ts is None:
+                current_ages.append(0)
+            payload = {'current': {}} if data_ts is None else {'data': []}
+            entries[key] = (classify_payload(payload, t if data_ts is None else data_ts, t), t)
+            day = (t - trace_start) // 86400
+            day_calls[day] = day_calls.get(day, 0) + 1
+        current_ages.sort()
+        return (max(day_calls.values()), sum(current_ages) / len(current_ages),
+                current_ages[int(len(current_ages) * 0.95)], unfinished_serves)
+
+    def old_is_fresh(kind, fetch_ts, now):
+        return kind != CACHE_KIND_CURRENT or fetch_ts + CACHE_DURATION_SECONDS > now
+
+    current_ttl = CACHE_TTL_SECONDS[CACHE_KIND_CURRENT]
+    policies = [("single 12h TTL", old_is_fresh)]
+    policies += [(f"current TTL {ttl // 60} min", ttl) for ttl in (600, 1800, 3600, 3 * 3600)]
+    peak_calls = {}
+    for name, policy in policies:
+        if callable(policy):
+            is_fresh = policy
+        else:
+            CACHE_TTL_SECONDS[CACHE_KIND_CURRENT] = policy
+            is_fresh = is_cache_entry_fresh
+        peak, mean_age, p95_age, unfinished_serves = replay(is_fresh)
+        peak_calls[policy] = peak
+        print(f"TTL replay, {name}: {peak} upstream calls on the busiest day "
+              f"({peak / API_DAILY_CALL_BUDGET:.0%} of the {API_DAILY_CALL_BUDGET}/day budget, "
+              f"{API_DAILY_CALL_BUDGET - peak} headroom); current data served {mean_age / 60:.0f} min old "
+              f"on average, p95 {p95_age / 60:.0f} min; {unfinished_serves} unfinished days served")
+    CACHE_TTL_SECONDS[CACHE_KIND_CURRENT] = current_ttl
+    if current_ttl in peak_calls:
+        assert peak_calls[current_ttl] <= API_DAILY_CALL_BUDGET * 0.6
+
+    # Hit ratio of a jittered query stream (GPS fixes and geocoder results for the same
+    # places differ in the 4th-5th decimal) with exact-coordinate keys vs 0.01 degree cells
+    places = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(50)]
+    jittered = [(round(lat + rng.gauss(0, 0.001), 6), round(lon + rng.gauss(0, 0.001), 6))
+                for lat, lon in (rng.choice(places) for _ in range(20000))]
+    for name, grid in (("exact keys", 0), ("0.01 deg cells", 0.01)):
+        seen, hits = set(), 0
+        for lat, lon in jittered:
+            key = quantize_coords(lat, lon, grid)
+            hits += key in seen
+            seen.add(key)
+        print(f"Hit ratio, {name}: {hits / len(jittered):.1%} of {len(jittered)} lookups "
+              f"({len(seen)} distinct keys for {len(places)} places)")
+
     print("DB cache tests completed.")
+
+    # Optional benchmarks, each against its own temporary database
+    import sys
+    import tempfile
+
+    def flag_value(flag, default):
+        """The number after a command-line flag, or default."""
+        args = sys.argv[sys.argv.index(flag) + 1:]
+        return int(args[0]) if args and args[0].isdigit() else default
+
+    # python db_cache.py --pool-benchmark [threads]: ops/sec of a 4:1 read/write mix with a
+    # connection opened per call on a rollback-journal database (the old behaviour) and with
+    # the pooled WAL connections
+    if "--pool-benchmark" in sys.argv:
+        n_threads = flag_value("--pool-benchmark", 8)
+        BENCH_SECONDS = 3.0
+        payload, codec = encode_payload({"current": {"temp": 20.0}})
+
+        def run_mix(connect, release):
+            ops = [0] * n_threads
+            stop_at = time.perf_counter() + BENCH_SECONDS
+
+            def worker(i):
+                n = 0
+                while time.perf_counter() < stop_at:
+                    conn = connect()
+                    if n % 5 == 4:
+                        conn.execute(SQL_REPLACE_CACHE, (i, n % 50, None, n % 50, int(time.time()), payload, codec, CACHE_KIND_CURRENT))
+                        conn.commit()
+                    else:
+                        conn.execute(SQL_BY_DATA_TS, (i, n % 50, n % 50)).fetchone()
+                    release(conn)
+                    n += 1
+                ops[i] = n
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            return sum(ops) / BENCH_SECONDS
+
+        DB_NAME = os.path.join(tempfile.mkdtemp(), "pool_rollback.db")
+        init_db()
+        close_db_connection()
+        with sqlite3.connect(DB_NAME) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE;")
+
+        def connect_per_call():
+            return sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT_SECONDS)
+
+        before = run_mix(connect_per_call, lambda conn: conn.close())
+        DB_NAME = os.path.join(tempfile.mkdtemp(), "pool_wal.db")
+        init_db()
+        after = run_mix(get_db_connection, lambda conn: None)
+        print(f"Pool benchmark, {n_threads} threads: per-call connections (rollback journal) {before:,.0f} ops/s, "
+              f"pooled WAL connections {after:,.0f} ops/s ({after / before:.1f}x)")
+
+    # python db_cache.py --memory-benchmark [lookups]: get_cache() latency for a mix of current
+    # and historical hits with the in-process tier and with SQLite alone
+    if "--memory-benchmark" in sys.argv:
+        n_lookups = flag_value("--memory-benchmark", 20000)
+        DB_NAME = os.path.join(tempfile.mkdtemp(), "memory_benchmark.db")
+        init_db()
+        now = int(time.time())
+        today = day_key(day_from_key(now))
+        cells = [(round(10 + i * 0.01, 2), 20.0) for i in range(200)]
+        set_cache_many([(lat, lon, None, {"current": {"dt": now, "temp": 20.0}, "daily": [{"dt": now}] * 8}, now)
+                        for lat, lon in cells])
+        set_cache_many([(lat, lon, None, {"data": [{"dt": today - d * 86400 + 43200, "temp": 20.0}]}, today - d * 86400)
+                        for lat, lon in cells for d in range(1, 8)])
+        lookups = [(lat, lon, rng.choice([None, today - rng.randrange(1, 8) * 86400]))
+                   for lat, lon in (rng.choice(cells) for _ in range(n_lookups))]
+        max_bytes = _memory_cache.max_bytes
+        for name, budget in (("memory tier", max_bytes), ("SQLite only", 0)):
+            _memory_cache.max_bytes = budget
+            clear_memory_cache()
+            for lat, lon, data_ts in set(lookups):  # warm up
+                get_cache(lat, lon, data_ts)
+            latencies = []
+            for lat, lon, data_ts in lookups:
+                t0 = time.perf_counter()
+                assert get_cache(lat, lon, data_ts) is not None
+                latencies.append((time.perf_counter() - t0) * 1e6)
+            latencies.sort()
+            print(f"Memory benchmark, {name}: {n_lookups} lookups, p50 {latencies[len(latencies) // 2]:.1f} us, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} us")
+        _memory_cache.max_bytes = max_bytes
+
+    # python db_cache.py --batch-benchmark [rows]: rows/sec written with set_cache_many() and
+    # read back with get_cache_many() in batches of 1, 100 and 10k rows
+    if "--batch-benchmark" in sys.argv:
+        n_rows = flag_value("--batch-benchmark", 10000)
+        DB_NAME = os.path.join(tempfile.mkdtemp(), "batch_benchmark.db")
+        init_db()
+        first_day = day_key(day_from_key(time.time())) - n_rows * 86400
+        for i, batch_size in enumerate((1, 100, 10000)):
+            lat = 30.0 + i
+            rows = [(lat, 40.0, None, {"data": [{"dt": first_day + d * 86400 + 43200, "temp": 20.0}]}, first_day + d * 86400)
+                    for d in range(n_rows)]
+            t0 = time.perf_counter()
+            for start in range(0, n_rows, batch_size):
+                set_cache_many(rows[start:start + batch_size])
+            write_seconds = time.perf_counter() - t0
+            clear_memory_cache()
+            keys = [(lat, 40.0, data_ts) for _, _, _, _, data_ts in rows]
+            t0 = time.perf_counter()
+            found = 0
+            for start in range(0, n_rows, batch_size):
+                found += len(get_cache_many(keys[start:start + batch_size]))
+            read_seconds = time.perf_counter() - t0
+            assert found == n_rows
+            print(f"Batch benchmark, {batch_size}-row batches: write {n_rows / write_seconds:,.0f} rows/s, "
+                  f"read {n_rows / read_seconds:,.0f} rows/s")
+
+    # python db_cache.py --codec-benchmark [iterations]: stored size and median encode/decode
+    # time of every registered codec for representative onecall and timemachine payloads
+    if "--codec-benchmark" in sys.argv:
+        iterations = flag_value("--codec-benchmark", 2000)
+        weather = [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}]
+
+        def hour(dt):
+            h = dt // 3600
+            return {"dt": dt, "temp": round(22 + (h * 7919 % 1100) / 100, 2), "feels_like": round(23 + (h * 104729 % 1200) / 100, 2),
+                    "pressure": 1003 + h % 9, "humidity": 40 + h * 31 % 50, "dew_point": round(15 + (h * 613 % 700) / 100, 2),
+                    "uvi": round((h * 37 % 110) / 10, 2), "clouds": h * 17 % 100, "visibility": 10000,
+                    "wind_speed": round((h * 389 % 900) / 100, 2), "wind_deg": h * 53 % 360,
+                    "wind_gust": round((h * 499 % 1400) / 100, 2), "weather": weather}
+
+        day = {"dt": 1717200000, "sunrise": 1717199500, "sunset": 1717246500,
+               "temp": {"day": 31.2, "min": 23.9, "max": 33.4, "night": 25.1, "eve": 29.8, "morn": 24.2},
+               "feels_like": {"day": 35.0, "night": 25.9, "eve": 33.1, "morn": 24.9},
+               "pressure": 1006, "humidity": 55, "wind_speed": 5.6, "wind_deg": 260, "weather": weather,
+               "clouds": 40, "pop": 0.2, "uvi": 9.1}
+        payloads = {
+            "onecall": {"lat": 17.385, "lon": 78.4867, "timezone": "Asia/Kolkata", "timezone_offset": 19800,
+                        "current": dict(hour(1717200000), sunrise=1717199500, sunset=1717246500),
+                        "hourly": [hour(1717200000 + i * 3600) for i in range(48)],
+                        "daily": [dict(day, dt=1717200000 + i * 86400) for i in range(8)]},
+            "timemachine": {"lat": 17.385, "lon": 78.4867, "timezone": "Asia/Kolkata", "timezone_offset": 19800,
+                            "data": [dict(hour(1717200000), sunrise=1717199500, sunset=1717246500)]},
+        }
+
+        def median_us(fn, arg):
+            samples = []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                fn(arg)
+                samples.append((time.perf_counter() - t0) * 1e6)
+            return sorted(samples)[len(samples) // 2]
+
+        missing = [name for name, module in (("msgpack", msgpack), ("zstandard", zstandard)) if module is None]
+        if missing:
+            print(f"Codec benchmark: {', '.join(missing)} not installed, codecs needing them are skipped")
+        for payload_name, payload in payloads.items():
+            for codec in get_codec_names():
+                encode, decode = _CODECS[codec]
+                stored = encode(payload)
+                assert decode(stored) == payload
+                size = len(stored.encode() if isinstance(stored, str) else stored)
+                print(f"Codec benchmark, {payload_name} with {codec}: {size:,} bytes, "
+                      f"encode {median_us(encode, payload):.1f} us, decode {median_us(decode, stored):.1f} us")
+
+    # python db_cache.py --nearest-benchmark [points]: nearest-cached-location query time with
+    # that many fresh current-weather cells (default 1M), through the R*Tree and the fallback scan
+    if "--nearest-benchmark" in sys.argv:
+        n_points = flag_value("--nearest-benchmark", 1_000_000)
+        DB_NAME = os.path.join(tempfile.mkdtemp(), "nearest.db")
+        init_db()
+        now = int(time.time())
+        payload, codec = encode_payload({"current": {"temp": 20.0}})
+        t0 = time.perf_counter()
+        with get_db_connection() as conn:
+            for start in range(0, n_points, 100_000):
+                conn.executemany(SQL_REPLACE_CACHE, [
+                    (round(rng.uniform(-60.0, 70.0), 2), round(rng.uniform(-180.0, 179.99), 2), None,
+                     now, now, payload, codec, CACHE_KIND_CURRENT)
+                    for _ in range(min(100_000, n_points - start))
+                ])
+            conn.commit()
+            cells = conn.execute("SELECT COUNT(*) FROM cache_locations").fetchone()[0]
+        print(f"Nearest benchmark: {cells} cells loaded in {time.perf_counter() - t0:.1f}s")
+        queries = [(rng.uniform(-60.0, 70.0), rng.uniform(-180.0, 180.0)) for _ in range(2000)]
+        for use_rtree in (True, False):
+            _spatial_index[DB_NAME] = use_rtree
+            for k, radius_km in ((1, 25.0), (5, 50.0), (10, 100.0)):
+                timings, found = [], 0
+                for q_lat, q_lon in (queries if use_rtree else queries[:200]):
+                    t0 = time.perf_counter()
+                    found += len(get_nearest_cached_locations(q_lat, q_lon, k=k, radius_km=radius_km, now=now))
+                    timings.append((time.perf_counter() - t0) * 1000.0)
+                timings.sort()
+                print(f"  {'R*Tree' if use_rtree else 'lat-range scan'}, k={k} within {radius_km:.0f} km: "
+                      f"{len(timings)} queries, {found / len(timings):.2f} results avg, "
+                      f"p50 {timings[len(timings) // 2]:.3f} ms, p99 {timings[int(len(timings) * 0.99)]:.3f} ms")
@@ -0,0 +1,262 @@
+# gazetteer.py
+import bisect
+import heapq
+import math
+import threading
+import unicodedata
+from array import array
+
+from CITIES import CITIES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_SUGGESTIONS = 5
+# Prefixes up to this length keep a precomputed top-k list; longer ones rank their (short) range on demand
+PRECOMPUTED_PREFIX_LENGTH = 2
+PRECOMPUTED_TOP_K = 10
+# GPS fixes farther than this from every bundled place are not given a place name
+REVERSE_GEOCODE_MAX_KM = 50.0
+EARTH_RADIUS_KM = 6371.0088
+BATCH_CHUNK_POINTS = 4096  # points per vectorized batch step, bounds the temporary matrix size
+
+def normalize_name(name):
+    """Lower-cases a place name, strips accents and collapses whitespace ('São  Paulo' -> 'sao paulo')."""
+    decomposed = unicodedata.normalize('NFKD', str(name))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+class PrefixIndex:
+    """Sorted-array prefix index over a subset of place ids, ranked by population."""
+    def __init__(self, keys, ids, population):
+        order = sorted(range(len(ids)), key=lambda i: keys[i])
+        self._keys = [keys[i] for i in order]
+        self._ids = array('l', (ids[i] for i in order))
+        self._population = population
+        self._top = {}
+        by_population = sorted(range(len(self._keys)), key=lambda pos: -population[self._ids[pos]])
+        for pos in by_population:
+            key = self._keys[pos]
+            for length in range(0, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                top = self._top.setdefault(key[:length], [])
+                if len(top) < PRECOMPUTED_TOP_K:
+                    top.append(self._ids[pos])
+
+    def complete(self, prefix, k):
+        """Returns up to k place ids whose key starts with prefix, most populous first."""
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH and k <= PRECOMPUTED_TOP_K:
+            return self._top.get(prefix, [])[:k]
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + "\uffff", lo)
+        return heapq.nlargest(k, self._ids[lo:hi], key=self._population.__getitem__)
+
+def to_unit_vector(lat, lon):
+    """Maps latitude/longitude in degrees to an (x, y, z) point on the unit sphere."""
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat_r)
+    return (cos_lat * math.cos(lon_r), cos_lat * math.sin(lon_r), math.sin(lat_r))
+
+def chord_to_km(chord):
+    """Converts a straight-line distance between unit vectors to a great-circle distance in km."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+class SphereKDTree:
+    """Array-backed 3-d tree over unit-sphere vectors; nearest chord distance = nearest great circle.
+
+    The tree is implicit: the median of each [lo, hi) slice of `order` is the node, split on
+    the axis stored for it, so no node objects are allocated.
+    """
+    def __init__(self, points):
+        self._coords = [array('d', (p[axis] for p in points)) for axis in range(3)]
+        self._order = array('l', range(len(points)))
+        self._axis = array('b', [0] * len(points))
+        self._build(0, len(points))
+
+    def _build(self, lo, hi):
+        if hi - lo <= 1:
+            return
+        ids = self._order[lo:hi]
+        axis = max(range(3), key=lambda a: max(self._coords[a][i] for i in ids) - min(self._coords[a][i] for i in ids))
+        ids = sorted(ids, key=self._coords[axis].__getitem__)
+        self._order[lo:hi] = array('l', ids)
+        mid = (lo + hi) // 2
+        self._axis[mid] = axis
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def nearest(self, point):
+        """Returns (point_id, chord_distance) of the stored vector nearest to point."""
+        best = [-1, float('inf')]  # id, squared distance
+        self._search(0, len(self._order), point, best)
+        return best[0], math.sqrt(best[1])
+
+    def _search(self, lo, hi, point, best):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        point_id = self._order[mid]
+        x, y, z = self._coords[0][point_id], self._coords[1][point_id], self._coords[2][point_id]
+        dist = (x - point[0]) ** 2 + (y - point[1]) ** 2 + (z - point[2]) ** 2
+        if dist < best[1]:
+            best[0], best[1] = point_id, dist
+        axis = self._axis[mid]
+        diff = point[axis] - self._coords[axis][point_id]
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+        self._search(near[0], near[1], point, best)
+        if diff * diff < best[1]:
+            self._search(far[0], far[1], point, best)
+
+class Gazetteer:
+    """Offline city lookup: prefix completion and 'city,cc' resolution over a bundled city list."""
+    def __init__(self, cities):
+        self.names = [city[0] for city in cities]
+        self.country_codes = [city[1] for city in cities]
+        self.lat = array('d', (city[2] for city in cities))
+        self.lon = array('d', (city[3] for city in cities))
+        self.population = array('q', (city[4] for city in cities))
+        keys = [normalize_name(name) for name in self.names]
+
+        ids_by_country = {}
+        self._exact = {}  # (key, country code) -> most populous id with that name
+        for place_id, (key, cc) in enumerate(zip(keys, self.country_codes)):
+            ids_by_country.setdefault(cc, []).append(place_id)
+            for exact_key in ((key, cc), (key, None)):
+                best = self._exact.get(exact_key)
+                if best is None or self.population[place_id] > self.population[best]:
+                    self._exact[exact_key] = place_id
+
+        self._index = PrefixIndex(keys, list(range(len(keys))), self.population)
+        self._country_index = {
+            cc: PrefixIndex([keys[i] for i in ids], ids, self.population) for cc, ids in ids_by_country.items()
+        }
+        vectors = [to_unit_vector(lat, lon) for lat, lon in zip(self.lat, self.lon)]
+        self._tree = SphereKDTree(vectors)
+        self._vectors = np.array(vectors) if np is not None else None
+
+    def place(self, place_id):
+        """Returns the place with the given id as a dict."""
+        return {
+            "name": self.names[place_id], "country_code": self.country_codes[place_id],
+            "lat": self.lat[place_id], "lon": self.lon[place_id], "population": self.population[place_id],
+            "location": f"{self.names[place_id]},{self.country_codes[place_id]}",
+        }
+
+    def complete(self, prefix, k=DEFAULT_SUGGESTIONS, country_code=None):
+        """Returns up to k places whose name starts with prefix, optionally within one country."""
+        index = self._index if country_code is None else self._country_index.get(country_code.lower())
+        if index is None:
+            return []
+        return [self.place(place_id) for place_id in index.complete(normalize_name(prefix), k)]
+
+    def resolve(self, location):
+        """Resolves 'city' or 'city,cc' to a place dict, or None when the city is not bundled."""
+        name, _, country_code = str(location).rpartition(',') if ',' in str(location) else (location, '', '')
+        place_id = self._exact.get((normalize_name(name), country_code.strip().lower() or None))
+        return self.place(place_id) if place_id is not None else None
+
+    def nearest(self, lat, lon, max_km=REVERSE_GEOCODE_MAX_KM):
+        """Returns the bundled place nearest to (lat, lon) with its 'distance_km', or None beyond max_km."""
+        place_id, chord = self._tree.nearest(to_unit_vector(lat, lon))
+        distance_km = chord_to_km(chord)
+        if place_id < 0 or (max_km is not None and distance_km > max_km):
+            return None
+        return dict(self.place(place_id), distance_km=distance_km)
+
+    def nearest_many(self, coordinates, max_km=REVERSE_GEOCODE_MAX_KM):
+        """Reverse-geocodes many (lat, lon) pairs at once; returns a list aligned with the input.
+
+        With numpy installed the lookup is vectorized (one matrix product per chunk of points);
+        otherwise each point goes through the KD-tree.
+        """
+        coordinates = list(coordinates)
+        if self._vectors is None or not coordinates:
+            return [self.nearest(lat, lon, max_km) for lat, lon in coordinates]
+        results = []
+        for start in range(0, len(coordinates), BATCH_CHUNK_POINTS):
+            chunk = np.radians(np.asarray(coordinates[start:start + BATCH_CHUNK_POINTS], dtype=float))
+            cos_lat = np.cos(chunk[:, 0])
+            points = np.column_stack((cos_lat * np.cos(chunk[:, 1]), cos_lat * np.sin(chunk[:, 1]), np.sin(chunk[:, 0])))
+            similarity = points @ self._vectors.T  # cosine of the central angle
+            place_ids = similarity.argmax(axis=1)
+            angles = np.arccos(np.clip(similarity[np.arange(len(place_ids)), place_ids], -1.0, 1.0))
+            for place_id, distance_km in zip(place_ids.tolist(), (angles * EARTH_RADIUS_KM).tolist()):
+                within = max_km is None or distance_km <= max_km
+                results.append(dict(self.place(place_id), distance_km=distance_km) if within else None)
+        return results
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """Returns the process-wide gazetteer, building it from CITIES on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(CITIES)
+    return _gazetteer
+
+def complete_city(prefix, k=DEFAULT_SUGGESTIONS, country_code=None):
+    """Top-k bundled cities starting with prefix (see Gazetteer.complete)."""
+    return get_gazetteer().complete(prefix, k, country_code)
+
+def resolve_city(location):
+    """Resolves 'city,cc' to a bundled place without any network call (see Gazetteer.resolve)."""
+    return get_gazetteer().resolve(location)
+
+def reverse_geocode(lat, lon, max_km=REVERSE_GEOCODE_MAX_KM):
+    """Nearest bundled place to a GPS fix, without any network call (see Gazetteer.nearest)."""
+    return get_gazetteer().nearest(lat, lon, max_km)
+
+def reverse_geocode_many(coordinates, max_km=REVERSE_GEOCODE_MAX_KM):
+    """Batch form of reverse_geocode() (see Gazetteer.nearest_many)."""
+    return get_gazetteer().nearest_many(coordinates, max_km)
+
+if __name__ == '__main__':
+    # Standalone benchmark: build time, memory footprint and per-keystroke latency
+    import time
+    import tracemalloc
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    gazetteer = Gazetteer(CITIES)
+    build_ms = (time.perf_counter() - started) * 1000
+    footprint_kib = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    print(f"Built gazetteer over {len(CITIES)} cities in {build_ms:.1f} ms, ~{footprint_kib:.0f} KiB")
+
+    word = "hyderabad"
+    latencies = []
+    for _ in range(2000):
+        for length in range(1, len(word) + 1):
+            started = time.perf_counter()
+            gazetteer.complete(word[:length], DEFAULT_SUGGESTIONS, "in")
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f"Per-keystroke completion: p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us")
+
+    print("Completions for 'ba':", [place['location'] for place in gazetteer.complete("ba")])
+    print("Resolve 'Hyderabad,in':", gazetteer.resolve("Hyderabad,in"))
+    assert gazetteer.resolve("hyderabad , IN")["name"] == "Hyderabad"
+    assert gazetteer.resolve("Atlantis,in") is None
+
+    # Reverse geocoding: KD-tree answers must match a brute-force scan
+    import random
+    random.seed(7)
+    fixes = [(random.uniform(-60, 70), random.uniform(-180, 180)) for _ in range(5000)]
+    started = time.perf_counter()
+    nearest = [gazetteer.nearest(lat, lon, None) for lat, lon in fixes]
+    print(f"Reverse geocode: {(time.perf_counter() - started) / len(fixes) * 1e6:.1f} us per fix")
+    for (lat, lon), place in zip(fixes[:500], nearest):
+        point = to_unit_vector(lat, lon)
+        brute = min(range(len(CITIES)), key=lambda i: sum((a - b) ** 2 for a, b in zip(point, to_unit_vector(CITIES[i][2], CITIES[i][3]))))
+        assert abs(place['distance_km'] - chord_to_km(math.dist(point, to_unit_vector(CITIES[brute][2], CITIES[brute][3])))) < 1e-6
+    started = time.perf_counter()
+    batch = gazetteer.nearest_many(fixes, None)
+    print(f"Batch reverse geocode ({'numpy' if np is not None else 'KD-tree'}): "
+          f"{(time.perf_counter() - started) / len(fixes) * 1e6:.1f} us per fix")
+    assert [place['location'] for place in batch] == [place['location'] for place in nearest]
+    print("Reverse geocode 17.44,78.35:", gazetteer.nearest(17.44, 78.35))
@@ -1,54 +1,106 @@
 import requests
+import asyncio
 import datetime
 from datetime import timezone
 import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
-from collections import deque
+
+import db_cache
+import http_client
+import rate_limiter as limiters
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
+OPENWEATHER_BASE_URL = "https://api.openweathermap.org"
 
-class RateLimiter:
-    def __init__(self, calls_per_minute):
-        self.calls_per_minute = calls_per_minute
-        self.calls_timestamps = deque()
-        self.interval = 60 # seconds
-
-    def wait_for_slot(self):
-        while True:
-            now = time.time()
-            # Remove timestamps older than the interval
-            while self.calls_timestamps and self.calls_timestamps[0] <= now - self.interval:
-                self.calls_timestamps.popleft()
-
-            if len(self.calls_timestamps) < self.calls_per_minute:
-                self.calls_timestamps.append(now)
-                break
-            else:
-                # Calculate time to wait until the oldest call falls out of the window
-                time_to_wait = self.calls_timestamps[0] - (now - self.interval) + 0.01 # Add a small buffer
-                time.sleep(time_to_wait)
+# Backfill jobs claim this many days at a time; a run that stops early hands unattempted days back
+BACKFILL_BATCH_SIZE = 10
 
-def get_historical_weather_for_day(lat, lon, dt_unix_timestamp, api_key, rate_limiter):
-    """Fetches historical weather data for a single day with rate limiting."""
-    rate_limiter.wait_for_slot() # Wait before making the call
-    url = f"https://api.openweathermap.org/data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={dt_unix_timestamp}&appid={api_key}&units=metric"
+# asyncio fetcher: requests in flight at once, and per-request timeout
+ASYNC_MAX_CONCURRENCY = 10
+ASYNC_REQUEST_TIMEOUT_SECONDS = 30
+
+def _timemachine_url(lat, lon, dt_unix_timestamp, api_key):
+    return f"{OPENWEATHER_BASE_URL}/data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={dt_unix_timestamp}&appid={api_key}&units=metric"
+
+def _fetch_day(lat, lon, dt_unix_timestamp, api_key, rate_limiter):
+    """Returns (timestamp, response or None, error message or None); raises http_client.QuotaExceeded."""
+    url = _timemachine_url(lat, lon, dt_unix_timestamp, api_key)
     try:
-        response = requests.get(url)
+        # Each attempt, retries included, waits for its own rate-limit slot
+        response = http_client.get(url, rate_limiter=rate_limiter)
         response.raise_for_status()
-        return dt_unix_timestamp, response.json()
-    except requests.exceptions.RequestException as e:
+        return dt_unix_timestamp, response.json(), None
+    except http_client.QuotaExceeded:
+        raise
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching data for timestamp {dt_unix_timestamp}: {e}")
-        return dt_unix_timestamp, None
+        return dt_unix_timestamp, None, str(e).replace(api_key, "***") if api_key else str(e)
+
+def get_historical_weather_for_day(lat, lon, dt_unix_timestamp, api_key, rate_limiter):
+    """Fetches historical weather data for a single day with rate limiting."""
+    dt_unix_timestamp, data, _ = _fetch_day(lat, lon, dt_unix_timestamp, api_key, rate_limiter)
+    return dt_unix_timestamp, data
+
+def day_to_api_timestamp(day):
+    """Noon UTC of a date, the timestamp sent to the timemachine endpoint for that day."""
+    return int(datetime.datetime(day.year, day.month, day.day, 12, 0, 0, tzinfo=timezone.utc).timestamp())
+
+def day_to_cache_key(day):
+    """The data_ts a day's payload is cached under (db_cache.day_key(): 00:00 UTC of the date)."""
+    return db_cache.day_key(day)
+
+def _parse_day(day):
+    """Accepts a date, datetime or 'YYYY-MM-DD' string."""
+    if isinstance(day, datetime.datetime):
+        return day.date()
+    if isinstance(day, datetime.date):
+        return day
+    return datetime.datetime.strptime(day, '%Y-%m-%d').date()
+
+def _fetch_timestamps_concurrently(lat, lon, timestamps, api_key, max_total_calls=240, rate_limiter=None):
+    """Fetches the given timestamps concurrently; returns {timestamp: response} for the calls that succeeded."""
+    results = {}
+    # Shared with every other session and process on the host, so the per-key limit holds overall
+    rate_limiter = rate_limiter or limiters.get_openweather_limiter()
+
+    # Use ThreadPoolExecutor for concurrent API calls
+    # Max workers should be less than or equal to calls_per_minute to avoid overwhelming the rate limiter
+    with ThreadPoolExecutor(max_workers=10) as executor: # Adjusted max_workers
+        futures = [executor.submit(get_historical_weather_for_day, lat, lon, ts, api_key, rate_limiter)
+                   for ts in timestamps[:max_total_calls]]
+
+        for future in as_completed(futures):
+            try:
+                dt_ts, data = future.result()
+                if data:
+                    results[dt_ts] = data
+                else:
+                    print(f"Skipping data for {db_cache.day_from_key(dt_ts)} due to error.")
+            except TimeoutError:
+                print("A future timed out, likely due to rate limiting or network issues.")
+            except Exception as exc:
+                print(f"Future generated an exception: {exc}")
+    return results
+
+def _days_in_range(start_date_str, end_date_str):
+    start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    return [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
-def get_historical_weather_in_range_concurrently(lat, lon, start_date_str, end_date_str, api_key):
+def get_historical_weather_in_range_concurrently(lat, lon, start_date_str, end_date_str, api_key, rate_limiter=None):
     """
     Fetches historical weather data for a date range concurrently using ThreadPoolExecutor.
-    Enforces a rate limit of 60 calls per minute and a total limit of 240 calls.
+    Enforces the shared OpenWeather rate limit (60 calls per minute) and a total limit of 240 calls.
 
     Args:
         lat (float): Latitude.
@@ -56,49 +108,316 @@ def get_historical_weather_in_range_concurrently(lat, lon, start_date_str, end_d
         start_date_str (str): Start date in 'YYYY-MM-DD' format.
         end_date_str (str): End date in 'YYYY-MM-DD' format.
         api_key (str): Your OpenWeatherMap API key.
+        rate_limiter: Limiter to draw from; defaults to the shared OpenWeather limiter.
 
     Returns:
         dict: A dictionary where keys are Unix timestamps and values are the API responses.
     """
-    start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
-    end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date()
-
     if not API_KEY:
         print("Error: OpenWeatherMap API key not provided.")
         return {}
 
-    all_timestamps = []
-    current_day = start_date
-    while current_day <= end_date:
-        daily_timestamp = int(datetime.datetime(current_day.year, current_day.month, current_day.day, 12, 0, 0, tzinfo=timezone.utc).timestamp()) # Use the imported timezone directly
-        print('timezone.utc: ', timezone.utc, 'daily_timestamp: ', daily_timestamp)
-        all_timestamps.append(daily_timestamp)
-        current_day += datetime.timedelta(days=1)
+    all_timestamps = [day_to_api_timestamp(day) for day in _days_in_range(start_date_str, end_date_str)]
+    return _fetch_timestamps_concurrently(lat, lon, all_timestamps, api_key, rate_limiter=rate_limiter)
 
+async def _fetch_day_async(session, semaphore, rate_limiter, lat, lon, dt_unix_timestamp, api_key):
+    """Async counterpart of get_historical_weather_for_day(), retrying like http_client.get()."""
+    url = _timemachine_url(lat, lon, dt_unix_timestamp, api_key)
+    endpoint = http_client.endpoint_label(url)
+    attempt = 0
+    while True:
+        async with semaphore:
+            # Each attempt, retries included, waits for its own rate-limit slot
+            await rate_limiter.acquire_async()
+            try:
+                http_client.check_quota()
+            except http_client.QuotaExceeded as e:
+                print(f"Not fetching timestamp {dt_unix_timestamp}: {e}")
+                return dt_unix_timestamp, None
+            start = time.perf_counter()
+            response = None
+            try:
+                async with session.get(url) as response:
+                    http_client.record_call(endpoint, time.perf_counter() - start, response.status)
+                    delay = http_client.retry_delay(attempt, http_client.HTTP_MAX_RETRIES, response.status, response)
+                    if delay is None:
+                        response.raise_for_status()
+                        return dt_unix_timestamp, await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                delay = None
+                if response is None and isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+                    http_client.record_call(endpoint, time.perf_counter() - start, type(e).__name__)
+                    delay = http_client.retry_delay(attempt, http_client.HTTP_MAX_RETRIES)
+                if delay is None:
+                    message = str(e).replace(api_key, "***") if api_key else str(e)
+                    print(f"Error fetching data for timestamp {dt_unix_timestamp}: {message}")
+                    return dt_unix_timestamp, None
+        # Sleep outside the semaphore so the wait does not hold a connection slot
+        http_client.record_retry(endpoint)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+async def fetch_timestamps_async(lat, lon, timestamps, api_key, max_total_calls=240, rate_limiter=None,
+                                 max_concurrency=None):
+    """Fetches the given timestamps on one keep-alive connection pool; returns {timestamp: response}."""
+    if aiohttp is None:
+        raise RuntimeError("aiohttp is required for the asyncio fetcher (pip install aiohttp)")
+    rate_limiter = rate_limiter or limiters.get_openweather_limiter()
+    max_concurrency = max_concurrency or ASYNC_MAX_CONCURRENCY
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=ASYNC_REQUEST_TIMEOUT_SECONDS)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        responses = await asyncio.gather(*[
+            _fetch_day_async(session, semaphore, rate_limiter, lat, lon, ts, api_key)
+            for ts in timestamps[:max_total_calls]
+        ])
     results = {}
-    calls_made = 0
-    max_total_calls = 240
-    rate_limiter = RateLimiter(calls_per_minute=60)
+    for dt_ts, data in responses:
+        if data:
+            results[dt_ts] = data
+        else:
+            print(f"Skipping data for {db_cache.day_from_key(dt_ts)} due to error.")
+    return results
 
-    # Use ThreadPoolExecutor for concurrent API calls
-    # Max workers should be less than or equal to calls_per_minute to avoid overwhelming the rate limiter
-    with ThreadPoolExecutor(max_workers=10) as executor: # Adjusted max_workers
-        futures = []
-        for ts in all_timestamps:
-            if calls_made >= max_total_calls:
-                break
-            futures.append(executor.submit(get_historical_weather_for_day, lat, lon, ts, api_key, rate_limiter))
-            calls_made += 1 # Increment immediately when submitted
+def get_historical_weather_in_range_async(lat, lon, start_date_str, end_date_str, api_key, rate_limiter=None,
+                                          max_concurrency=None):
+    """
+    asyncio variant of get_historical_weather_in_range_concurrently(): same arguments and result.
 
-        for future in as_completed(futures):
-            try:
-                dt_ts, data = future.result()
+    Requests share one aiohttp session (connections are kept alive and reused), a semaphore
+    bounds how many are in flight, and rate-limit waits do not block a thread. Must be called
+    from synchronous code; inside a running event loop await fetch_timestamps_async() instead.
+    """
+    if not API_KEY:
+        print("Error: OpenWeatherMap API key not provided.")
+        return {}
+
+    all_timestamps = [day_to_api_timestamp(day) for day in _days_in_range(start_date_str, end_date_str)]
+    return asyncio.run(fetch_timestamps_async(lat, lon, all_timestamps, api_key, rate_limiter=rate_limiter,
+                                              max_concurrency=max_concurrency))
+
+def _split_cached_days(lat, lon, days):
+    """Reads the cache once for the requested days; returns (wanted, cache_keys, found, missing)."""
+    wanted = sorted({_parse_day(day) for day in days})
+    if not wanted:
+        return [], {}, {}, []
+    cache_keys = {day: day_to_cache_key(day) for day in wanted}
+
+    cached = db_cache.get_cache_for_range(lat, lon, cache_keys[wanted[0]], cache_keys[wanted[-1]])
+    found = {day: cached[key] for day, key in cache_keys.items() if key in cached}
+    missing = [day for day in wanted if day not in found]
+    print(f"Historical weather: {len(found)} of {len(wanted)} day(s) cached, fetching {len(missing)}.")
+    return wanted, cache_keys, found, missing
+
+def get_historical_weather_for_days(lat, lon, days, api_key, location=None, max_total_calls=240):
+    """
+    Returns historical weather for an arbitrary set of days, calling the API only for days not already cached.
+
+    The cache is read once for the span of the requested days; missing days are fetched
+    concurrently under the shared rate limit and written back in a single transaction.
+
+    Args:
+        lat (float): Latitude.
+        lon (float): Longitude.
+        days (iterable): Dates, datetimes or 'YYYY-MM-DD' strings, in any order; duplicates are ignored.
+        api_key (str): Your OpenWeatherMap API key.
+        location (str): Location string stored with newly cached rows.
+        max_total_calls (int): Upper bound on API calls for this request.
+
+    Returns:
+        dict: {date: response} in ascending date order. Days that are neither cached nor
+        fetched successfully are left out.
+    """
+    wanted, cache_keys, found, missing = _split_cached_days(lat, lon, days)
+
+    if missing and not api_key:
+        print("Error: OpenWeatherMap API key not provided.")
+    elif missing:
+        api_days = {day_to_api_timestamp(day): day for day in missing}
+        fetched = _fetch_timestamps_concurrently(lat, lon, list(api_days), api_key, max_total_calls)
+        rows_to_cache = []
+        for api_ts, data in fetched.items():
+            day = api_days[api_ts]
+            found[day] = data
+            rows_to_cache.append((lat, lon, location, data, cache_keys[day]))
+        db_cache.set_cache_many(rows_to_cache)
+
+    return {day: found[day] for day in wanted if day in found}
+
+def start_backfill(lat, lon, days, location=None, session_id=None):
+    """
+    Records a resumable backfill job for the days; returns (job_id, {data_ts: data} for cached days).
+
+    Asking again for the same location and range resumes the unfinished job instead of
+    starting over; cached days are marked done without an API call. No job is recorded
+    (job_id None) when every day is already cached.
+    """
+    wanted, cache_keys, found, missing = _split_cached_days(lat, lon, days)
+    cached = {cache_keys[day]: found[day] for day in wanted if day in found}
+    if not missing:
+        return None, cached
+    job_id = db_cache.start_backfill_job(lat, lon, location, list(cache_keys.values()),
+                                         [cache_keys[day] for day in found], session_id)
+    return job_id, cached
+
+def run_backfill(job_id, api_key, rate_limiter=None, max_total_calls=240):
+    """
+    Works through a backfill job from its checkpoint, yielding (data_ts, data) as days finish.
+
+    Days are claimed BACKFILL_BATCH_SIZE at a time and every outcome is recorded, so a run
+    that is interrupted (rerun, refresh, restart) picks up where it stopped. A failed day is
+    retried until it reaches db_cache.BACKFILL_MAX_ATTEMPTS; it is yielded with data None only
+    once it has run out of attempts. Days are yielded as they arrive and written to the cache,
+    with their outcomes, in one transaction per claimed batch.
+    """
+    job = db_cache.get_backfill_job(job_id)
+    if job is None:
+        return
+    if not api_key:
+        print("Error: OpenWeatherMap API key not provided.")
+        return
+    rate_limiter = rate_limiter or limiters.get_openweather_limiter()
+    calls_made = 0
+    executor = ThreadPoolExecutor(max_workers=BACKFILL_BATCH_SIZE)
+    pending = {}
+    rows, outcomes = [], []
+    try:
+        while calls_made < max_total_calls:
+            # Never claim more days than the API budget has calls left for
+            quota_left = db_cache.get_api_quota_status()['remaining']
+            if quota_left == 0:
+                print(f"Backfill job {job_id} paused: API call budget reached.")
+                break
+            batch_size = min(BACKFILL_BATCH_SIZE, max_total_calls - calls_made, quota_left or BACKFILL_BATCH_SIZE)
+            claimed = db_cache.claim_backfill_tasks(job_id, batch_size)
+            if not claimed:
+                break
+            calls_made += len(claimed)
+            pending = {executor.submit(_fetch_day, job['lat'], job['lon'], _api_timestamp_for_cache_key(data_ts),
+                                       api_key, rate_limiter): (data_ts, attempts)
+                       for data_ts, attempts in claimed}
+            for future in as_completed(list(pending)):
+                data_ts, attempts = pending.pop(future)
+                try:
+                    data, error = _backfill_outcome(future)
+                except http_client.QuotaExceeded as exc:
+                    # Not the day's fault: hand it back untouched and stop once this batch drains
+                    print(f"Backfill job {job_id}: {exc}")
+                    db_cache.release_backfill_tasks(job_id, [data_ts])
+                    max_total_calls = calls_made
+                    continue
                 if data:
-                    results[dt_ts] = data
-                else:
-                    print(f"Skipping data for {datetime.datetime.fromtimestamp(dt_ts).date()} due to error.")
-            except TimeoutError:
-                print("A future timed out, likely due to rate limiting or network issues.")
-            except Exception as exc:
-                print(f"Future generated an exception: {exc}")
-    return results
+                    rows.append((job['lat'], job['lon'], job['loc'], data, data_ts))
+                outcomes.append((data_ts, error))
+                if data or attempts >= db_cache.BACKFILL_MAX_ATTEMPTS:
+                    yield data_ts, data
+            _record_backfill_batch(job_id, rows, outcomes)
+            rows, outcomes = [], []
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _record_backfill_batch(job_id, rows, outcomes)  # days finished before the run stopped
+        # Stopped mid-batch. Requests already sent count against the quota, so their days are
+        # recorded when they return rather than released and fetched again; only the days that
+        # never started go back to pending for the next run to claim without waiting for the lease.
+        unstarted = []
+        for future, (data_ts, _) in pending.items():
+            if future.cancelled():
+                unstarted.append(data_ts)
+            else:
+                future.add_done_callback(lambda future, data_ts=data_ts: _record_late_backfill_day(job, data_ts, future))
+        if unstarted:
+            db_cache.release_backfill_tasks(job_id, unstarted)
+
+def _backfill_outcome(future):
+    """Returns (data, error) for a finished _fetch_day future, error None when data arrived; QuotaExceeded propagates."""
+    try:
+        _, data, error = future.result()
+    except http_client.QuotaExceeded:
+        raise
+    except Exception as exc:
+        print(f"Future generated an exception: {exc}")
+        return None, str(exc)
+    return data, None if data else error or "empty response"
+
+def _record_backfill_batch(job_id, rows, outcomes):
+    """Caches a batch's fetched days, then marks the batch's days finished, so a done day is always cached."""
+    db_cache.set_cache_many(rows)
+    db_cache.finish_backfill_tasks(job_id, outcomes)
+
+def _record_late_backfill_day(job, data_ts, future):
+    """Done callback for a day still in flight when run_backfill stopped."""
+    try:
+        data, error = _backfill_outcome(future)
+    except http_client.QuotaExceeded:
+        db_cache.release_backfill_tasks(job['job_id'], [data_ts])
+        return
+    rows = [(job['lat'], job['lon'], job['loc'], data, data_ts)] if data else []
+    _record_backfill_batch(job['job_id'], rows, [(data_ts, error)])
+
+def _api_timestamp_for_cache_key(data_ts):
+    return day_to_api_timestamp(db_cache.day_from_key(data_ts))
+
+def iter_historical_weather_for_days(lat, lon, days, api_key, location=None, max_total_calls=240, rate_limiter=None,
+                                     session_id=None):
+    """
+    Yields (data_ts, data) for each requested day as soon as it is available.
+
+    Cached days come first, from a single read; missing days follow in completion order and
+    each is written to the cache as it arrives. data_ts is the day's cache key (see
+    day_to_cache_key()); data is None for a day that could not be fetched, so every
+    requested day is yielded exactly once. Progress is checkpointed as a backfill job, so
+    asking for the same range again after an interruption fetches only what is left.
+    """
+    job_id, cached = start_backfill(lat, lon, days, location, session_id)
+    yield from cached.items()
+    if job_id is None:
+        return
+    yielded = set(cached)
+    for data_ts, data in run_backfill(job_id, api_key, rate_limiter, max_total_calls):
+        yielded.add(data_ts)
+        yield data_ts, data
+    # Over the call budget, or still leased to a worker that stopped without releasing it
+    left = [task for task in db_cache.get_backfill_tasks(job_id) if task['data_ts'] not in yielded]
+    # Days finished by another worker meanwhile are read back in one query
+    finished = db_cache.get_cache_many([(lat, lon, task['data_ts']) for task in left if task['state'] == 'done'])
+    for task in left:
+        yield task['data_ts'], finished.get((lat, lon, task['data_ts']))
+
+if __name__ == "__main__":
+    # Thread pool vs asyncio against a local stand-in for the timemachine endpoint
+    from urllib.parse import urlparse, parse_qs
+
+    from stand_in_server import start_stand_in_server
+
+    # Keep the benchmark's calls out of the real quota ledger
+    import tempfile
+    db_cache.DB_NAME = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    db_cache.init_db()
+
+    LATENCY_SECONDS = 0.05
+    connections = []
+
+    def timemachine(path):
+        time.sleep(LATENCY_SECONDS)
+        dt = int(parse_qs(urlparse(path).query)['dt'][0])
+        return 200, {}, {"lat": 0, "lon": 0, "data": [{"dt": dt, "temp": 20.0}]}
+
+    server, OPENWEATHER_BASE_URL = start_stand_in_server(timemachine, on_connect=connections.append)
+    API_KEY = API_KEY or "stand-in"
+    start, end = "2024-01-01", "2024-04-30"  # 121 days, under the 240-call cap
+
+    def unlimited():
+        return limiters.TokenBucket(10 ** 9, 60.0, burst=10 ** 6)
+
+    for name, run in [
+        ("threads (10 workers)", lambda: get_historical_weather_in_range_concurrently(0, 0, start, end, API_KEY, unlimited())),
+        ("asyncio (10 in flight)", lambda: get_historical_weather_in_range_async(0, 0, start, end, API_KEY, unlimited())),
+        ("asyncio (40 in flight)", lambda: get_historical_weather_in_range_async(0, 0, start, end, API_KEY, unlimited(), 40)),
+    ]:
+        connections.clear()
+        t0 = time.perf_counter()
+        results = run()
+        elapsed = time.perf_counter() - t0
+        print(f"{name:24s} {len(results)} days in {elapsed:.2f}s, {len(connections)} TCP connections")
+    server.shutdown()
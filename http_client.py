@@ -0,0 +1,245 @@
+# http_client.py
+import bisect
+import email.utils
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import db_cache
+
+# One pooled session for every upstream call; the pool matches the historical fetch worker count
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05
+HTTP_READ_TIMEOUT_SECONDS = 15
+
+# Retries on connection errors, timeouts and these statuses, with full-jitter exponential backoff.
+# A Retry-After header replaces the computed delay; one longer than HTTP_RETRY_AFTER_MAX_SECONDS
+# is not waited out and the response is returned as is.
+HTTP_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_BASE_SECONDS = 0.5
+HTTP_BACKOFF_MAX_SECONDS = 8.0
+HTTP_RETRY_AFTER_MAX_SECONDS = 60.0
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class QuotaExceeded(requests.exceptions.RequestException):
+    """Raised instead of calling upstream once the API call budget is spent (cache-only mode)."""
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+def get_session():
+    """Returns the process-wide pooled requests.Session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def endpoint_label(url):
+    """Histogram key for a URL: host and path, never the query string (it carries the API key)."""
+    parts = urlparse(url)
+    return f"{parts.netloc}{parts.path}"
+
+def record_latency(endpoint, seconds, outcome):
+    """Adds one attempt to the endpoint's histogram; outcome is an HTTP status or an exception name."""
+    ms = seconds * 1000.0
+    with _stats_lock:
+        stats = _stats.get(endpoint)
+        if stats is None:
+            stats = _stats[endpoint] = {'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1), 'count': 0,
+                                        'total_ms': 0.0, 'max_ms': 0.0, 'retries': 0, 'outcomes': {}}
+        stats['buckets'][bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        stats['count'] += 1
+        stats['total_ms'] += ms
+        stats['max_ms'] = max(stats['max_ms'], ms)
+        stats['outcomes'][outcome] = stats['outcomes'].get(outcome, 0) + 1
+
+def record_call(endpoint, seconds, outcome):
+    """Records one upstream attempt in the latency histogram and the persistent quota ledger."""
+    record_latency(endpoint, seconds, outcome)
+    db_cache.record_api_call(endpoint, outcome)
+
+def check_quota():
+    """Raises QuotaExceeded when the daily or monthly call budget in db_cache is spent."""
+    if not db_cache.check_api_quota():
+        status = db_cache.get_api_quota_status()
+        raise QuotaExceeded(f"API call budget reached ({status['day_calls']}/{status['day_budget']} today, "
+                            f"{status['month_calls']}/{status['month_budget']} this month); serving cached data only")
+
+def record_retry(endpoint):
+    """Counts one retried attempt against the endpoint in the latency stats."""
+    with _stats_lock:
+        _stats[endpoint]['retries'] += 1
+
+def _percentile_ms(buckets, count, fraction, max_ms):
+    """Estimated latency at the given fraction of attempts, or None with no attempts.
+
+    Interpolates linearly inside the bucket holding that rank; the bucket's upper bound is
+    capped at the slowest attempt seen, so no percentile exceeds max_ms.
+    """
+    if not count:
+        return None
+    rank = fraction * count
+    seen = 0
+    for i, n in enumerate(buckets):
+        if n and seen + n >= rank:
+            upper = min(LATENCY_BUCKETS_MS[i], max_ms) if i < len(LATENCY_BUCKETS_MS) else max_ms
+            lower = min(LATENCY_BUCKETS_MS[i - 1], upper) if i else 0.0
+            return round(lower + (upper - lower) * (rank - seen) / n, 1)
+        seen += n
+    return round(max_ms, 1)
+
+def get_latency_stats():
+    """Per-endpoint attempt counts, latency histogram and percentiles interpolated within its buckets."""
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats, buckets=list(stats['buckets']), outcomes=dict(stats['outcomes']))
+                    for endpoint, stats in _stats.items()}
+    result = {}
+    for endpoint, stats in snapshot.items():
+        count = stats['count']
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        result[endpoint] = {
+            'count': count,
+            'retries': stats['retries'],
+            'outcomes': stats['outcomes'],
+            'mean_ms': stats['total_ms'] / count if count else 0.0,
+            'max_ms': stats['max_ms'],
+            'p50_ms': _percentile_ms(stats['buckets'], count, 0.50, stats['max_ms']),
+            'p95_ms': _percentile_ms(stats['buckets'], count, 0.95, stats['max_ms']),
+            'p99_ms': _percentile_ms(stats['buckets'], count, 0.99, stats['max_ms']),
+            'histogram': dict(zip(labels, stats['buckets'])),
+        }
+    return result
+
+def reset_latency_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def _retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff_seconds(attempt):
+    """Full jitter: uniform in [0, min(max, base * 2**attempt)]."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def retry_delay(attempt, max_retries, status=None, response=None):
+    """
+    Seconds to wait before retrying a failed attempt, or None when it must not be retried.
+
+    status and response are None for an attempt that got no response (connection error or
+    timeout). Shared by get() and the asyncio fetcher in historical_data_fetch.
+    """
+    if attempt >= max_retries or (status is not None and status not in HTTP_RETRY_STATUSES):
+        return None
+    delay = _retry_after_seconds(response) if response is not None else None
+    if delay is None:
+        return _backoff_seconds(attempt)
+    return delay if delay <= HTTP_RETRY_AFTER_MAX_SECONDS else None
+
+def get(url, params=None, timeout=None, max_retries=None, rate_limiter=None):
+    """
+    GET through the shared session with timeouts and retries.
+
+    Retries connection errors, timeouts and HTTP_RETRY_STATUSES up to max_retries times. If
+    rate_limiter is given, every attempt (retries included) first takes a slot from it.
+    Every attempt is checked against and counted in the API quota ledger; QuotaExceeded is
+    raised once the budget is spent. Returns the last response, which may still be an error
+    status; raises the last requests exception if no attempt got a response.
+    """
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+    max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+    endpoint = endpoint_label(url)
+    session = get_session()
+    attempt = 0
+    while True:
+        check_quota()
+        if rate_limiter is not None:
+            rate_limiter.wait_for_slot()
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            record_call(endpoint, time.perf_counter() - start, type(e).__name__)
+            delay = retry_delay(attempt, max_retries)
+            if delay is None:
+                raise
+        else:
+            record_call(endpoint, time.perf_counter() - start, response.status_code)
+            delay = retry_delay(attempt, max_retries, response.status_code, response)
+            if delay is None:
+                return response
+            response.close()  # hand the connection back to the pool before sleeping
+        record_retry(endpoint)
+        attempt += 1
+        time.sleep(delay)
+
+if __name__ == "__main__":
+    # Retry behaviour against a local server that fails the first attempts of each request
+    from stand_in_server import start_stand_in_server
+
+    # Keep the benchmark's calls out of the real quota ledger
+    import tempfile
+    db_cache.DB_NAME = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    db_cache.init_db()
+
+    hits = {}
+
+    def flaky(path):
+        n = hits[path] = hits.get(path, 0) + 1
+        if path.startswith("/limited") and n == 1:
+            status, headers = 429, {"Retry-After": "0.2"}
+        elif path.startswith("/flaky") and n <= 2:
+            status, headers = 503, {}
+        elif path.startswith("/slow"):
+            time.sleep(0.5)
+            status, headers = 200, {}
+        else:
+            status, headers = 200, {}
+        return status, headers, {"path": path, "attempt": n}
+
+    server, base = start_stand_in_server(flaky)
+
+    t0 = time.perf_counter()
+    response = get(f"{base}/limited")
+    assert response.status_code == 200 and response.json()["attempt"] == 2
+    assert time.perf_counter() - t0 >= 0.2, "Retry-After was not honoured"
+    assert get(f"{base}/flaky").json()["attempt"] == 3
+    assert get(f"{base}/flaky2", max_retries=1).status_code == 503
+    try:
+        get(f"{base}/slow", timeout=(1, 0.1), max_retries=1)
+        raise AssertionError("read timeout not raised")
+    except requests.exceptions.Timeout:
+        pass
+    for _ in range(20):
+        get(f"{base}/ok")
+    server.shutdown()
+
+    for endpoint, stats in get_latency_stats().items():
+        print(f"{endpoint}: {stats['count']} attempts, {stats['retries']} retries, outcomes {stats['outcomes']}, "
+              f"p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, max {stats['max_ms']:.1f} ms")
+        assert stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms'] <= round(stats['max_ms'], 1)
@@ -0,0 +1,226 @@
+# rate_limiter.py
+import asyncio
+import threading
+import time
+
+import db_cache
+
+# OpenWeather One Call allows 60 calls per minute per API key. The bucket refills at the full
+# limit / period and holds at most OPENWEATHER_BURST tokens; any 60-second window admits at most
+# limit + burst - 1 calls, so a burst of 1 sustains 60/min without a window ever exceeding it.
+OPENWEATHER_CALLS_PER_MINUTE = 60
+OPENWEATHER_BURST = 1
+OPENWEATHER_BUCKET_NAME = "openweather"
+
+RATE_LIMIT_MAX_SLEEP_SECONDS = 1.0  # waiters re-check at least this often
+
+def _refill_rate(limit, period, burst):
+    """Tokens per second that sustain `limit` per `period`; the burst is capacity on top."""
+    if not 0 < burst <= limit:
+        raise ValueError("burst must be at least 1 and at most the limit")
+    return limit / period
+
+class TokenBucket:
+    """Thread-safe token bucket for one process: sustains `limit` acquisitions per `period` seconds.
+
+    Any `period` window admits at most limit + burst - 1, i.e. exactly `limit` with the
+    default burst of 1; a larger burst trades that bound for calls without waiting after idle.
+    """
+
+    def __init__(self, limit, period=60.0, burst=1):
+        self.limit = limit
+        self.period = float(period)
+        self.burst = burst
+        self.rate = _refill_rate(limit, self.period, self.burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, stored, updated, tokens, now):
+        """Refills `stored` tokens as of `updated` and tries to take `tokens`; returns (tokens left, seconds to wait)."""
+        stored = min(self.burst, stored + (now - updated) * self.rate)
+        if stored >= tokens:
+            return stored - tokens, 0.0
+        return stored, (tokens - stored) / self.rate
+
+    def _clock(self):
+        return time.monotonic()
+
+    def _try_acquire(self, tokens):
+        """One attempt; returns (now, seconds to wait), with a wait of 0 meaning the tokens were taken."""
+        with self._lock:
+            now = self._clock()
+            self._tokens, wait = self._take(self._tokens, self._updated, tokens, now)
+            self._updated = now
+            return now, wait
+
+    def acquire(self, tokens=1, timeout=None):
+        """Blocks until `tokens` are available; returns False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            now, wait = self._try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, RATE_LIMIT_MAX_SLEEP_SECONDS))
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        """Like acquire(), but waits with asyncio.sleep() so the event loop keeps running."""
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            now, wait = await self._try_acquire_async(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None and now + wait > deadline:
+                return False
+            await asyncio.sleep(min(wait, RATE_LIMIT_MAX_SLEEP_SECONDS))
+
+    async def _try_acquire_async(self, tokens):
+        return self._try_acquire(tokens)
+
+    def wait_for_slot(self):
+        """Blocks until one call may be made."""
+        self.acquire()
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket whose state is a row of rate_limit_buckets in the cache database, shared by every
+    thread and process using it.
+
+    Each attempt is one BEGIN IMMEDIATE transaction on the thread's pooled connection, so
+    refill-and-take is atomic across processes. Wall-clock time is used because monotonic
+    clocks are not comparable between processes on every platform.
+    """
+
+    def __init__(self, name, limit, period=60.0, burst=1):
+        super().__init__(limit, period, burst)
+        self.name = name
+
+    def _clock(self):
+        return time.time()
+
+    def _try_acquire(self, tokens):
+        conn = db_cache.get_db_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = self._clock()
+            row = conn.execute("SELECT tokens, updated_ts FROM rate_limit_buckets WHERE name = ?",
+                               (self.name,)).fetchone()
+            # A new bucket, or one last touched by a clock that ran backwards, starts full. The state
+            # stays in locals: the row is the bucket, and threads share this object without a lock.
+            if row and row['updated_ts'] <= now:
+                stored, updated = row['tokens'], row['updated_ts']
+            else:
+                stored, updated = float(self.burst), now
+            stored, wait = self._take(stored, updated, tokens, now)
+            conn.execute("REPLACE INTO rate_limit_buckets (name, tokens, updated_ts) VALUES (?, ?, ?)",
+                         (self.name, stored, now))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return now, wait
+
+    async def _try_acquire_async(self, tokens):
+        # The transaction may wait on SQLite's busy timeout, so keep it off the event loop
+        return await asyncio.to_thread(self._try_acquire, tokens)
+
+_openweather_limiter = None
+_openweather_limiter_lock = threading.Lock()
+
+def get_openweather_limiter():
+    """Returns the process-wide limiter for OpenWeather calls, shared with other processes via SQLite."""
+    global _openweather_limiter
+    with _openweather_limiter_lock:
+        if _openweather_limiter is None:
+            _openweather_limiter = SharedTokenBucket(OPENWEATHER_BUCKET_NAME, OPENWEATHER_CALLS_PER_MINUTE,
+                                                     burst=OPENWEATHER_BURST)
+        return _openweather_limiter
+
+def max_calls_in_window(timestamps, period):
+    """Largest number of timestamps falling in any half-open window [t, t + period)."""
+    timestamps = sorted(timestamps)
+    best = 0
+    start = 0
+    for end, ts in enumerate(timestamps):
+        while timestamps[start] <= ts - period:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+if __name__ == "__main__":
+    # Stress test on a scaled-down window: limit 20 per 2 s, with the OpenWeather burst of 1 (any
+    # window holds at most the limit, sustained rate is the full limit) and with a burst of 5
+    # (at most limit + 4 in a window). Windows are checked on the limiter's own admission times.
+    import multiprocessing
+    import os
+    import tempfile
+
+    LIMIT, PERIOD, RUN_SECONDS = 20, 2.0, 6.0
+
+    class Recorded:
+        def _try_acquire(self, tokens):
+            now, wait = super()._try_acquire(tokens)
+            if wait == 0.0:
+                self.stamps.append(now)
+            return now, wait
+
+    class RecordedTokenBucket(Recorded, TokenBucket):
+        pass
+
+    class RecordedSharedTokenBucket(Recorded, SharedTokenBucket):
+        pass
+
+    def hammer(limiter, stop_at):
+        while time.time() < stop_at:
+            limiter.acquire(timeout=0.2)
+
+    def run_threads(limiter, n_threads, seconds):
+        limiter.stamps = []
+        stop_at = time.time() + seconds
+        threads = [threading.Thread(target=hammer, args=(limiter, stop_at)) for _ in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return limiter.stamps
+
+    def process_worker(burst, seconds, out):
+        limiter = RecordedSharedTokenBucket("stress", LIMIT, PERIOD, burst)
+        out.extend(run_threads(limiter, 4, seconds))
+
+    def check(name, stamps, burst):
+        worst = max_calls_in_window(stamps, PERIOD)
+        sustained = LIMIT * RUN_SECONDS / PERIOD
+        print(f"{name}, burst {burst}: {len(stamps)} calls in {RUN_SECONDS:.0f}s (sustained limit {sustained:.0f}), "
+              f"max {worst} in any {PERIOD}s window (bound {LIMIT + burst - 1})")
+        assert worst <= LIMIT + burst - 1
+        assert len(stamps) >= 0.95 * sustained
+
+    for burst in (1, 5):
+        check("TokenBucket, 10 threads", run_threads(RecordedTokenBucket(LIMIT, PERIOD, burst), 10, RUN_SECONDS), burst)
+
+    for burst in (1, 5):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_cache.DB_NAME = os.path.join(tmp, "limiter.db")
+            db_cache.init_db()
+            db_cache.close_db_connection()  # forked workers open their own
+            with multiprocessing.Manager() as manager:
+                out = manager.list()
+                procs = [multiprocessing.Process(target=process_worker, args=(burst, RUN_SECONDS, out))
+                         for _ in range(4)]
+                for p in procs:
+                    p.start()
+                for p in procs:
+                    p.join()
+                stamps = list(out)
+        check("SharedTokenBucket, 4 processes x 4 threads", stamps, burst)
+
+    # Default arguments: both buckets fall back to a burst of 1
+    with tempfile.TemporaryDirectory() as tmp:
+        db_cache.DB_NAME = os.path.join(tmp, "limiter.db")
+        db_cache.init_db()
+        limiter = RecordedSharedTokenBucket("defaults", LIMIT, PERIOD)
+        assert limiter.burst == 1 and TokenBucket(LIMIT, PERIOD).burst == 1
+        check("SharedTokenBucket defaults, 4 threads", run_threads(limiter, 4, RUN_SECONDS), limiter.burst)
+        db_cache.close_db_connection()
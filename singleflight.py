@@ -0,0 +1,215 @@
+# singleflight.py
+import os
+import threading
+import time
+import uuid
+
+import db_cache
+
+# Cross-process flights hold a lease row in the cache database while the leader fetches. A
+# leader that dies keeps the key blocked for at most SINGLEFLIGHT_LEASE_SECONDS.
+SINGLEFLIGHT_LEASE_SECONDS = 30.0
+SINGLEFLIGHT_POLL_SECONDS = 0.05
+SINGLEFLIGHT_CROSS_PROCESS = True  # False: coalesce within this process only
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time in this process; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn, recheck=None):
+        """
+        Returns (result, shared): fn()'s result, and whether it came from another caller's flight.
+
+        If a flight for key is already running, waits for it and returns its result (or raises
+        its exception). The caller that starts a flight first calls recheck(), if given, so a
+        result stored by a flight that ended just before (e.g. in the cache) is reused instead
+        of fetched again.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            result = recheck() if recheck is not None else None
+            shared = result is not None
+            if result is None:
+                result = self._run(key, fn, recheck)
+                shared = False
+            flight.result = result
+            return result, shared
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _run(self, key, fn, recheck):
+        return fn()
+
+class SharedSingleFlight(SingleFlight):
+    """SingleFlight that also coalesces across processes through a singleflight_leases row in the cache database.
+
+    The flight leader of each process competes for the key's lease; the process that wins
+    calls fn(), the others poll recheck() (typically a cache read) until the result appears
+    or the lease is gone, in which case they compete again. Results cross processes only
+    through whatever recheck() reads, so fn() must store its result there.
+    """
+
+    def __init__(self, lease_seconds=None):
+        super().__init__()
+        self.lease_seconds = lease_seconds or SINGLEFLIGHT_LEASE_SECONDS
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _try_lease(self, key):
+        """Takes the key's lease if it is free or expired; True when this process now holds it."""
+        now = time.time()
+        with db_cache.get_db_connection() as conn:
+            row = conn.execute("""
+                INSERT INTO singleflight_leases (flight_key, owner, expires_ts) VALUES (?, ?, ?)
+                ON CONFLICT (flight_key) DO UPDATE SET owner = excluded.owner, expires_ts = excluded.expires_ts
+                WHERE singleflight_leases.expires_ts < ?
+                RETURNING owner
+            """, (key, self.owner, now + self.lease_seconds, now)).fetchone()
+            conn.commit()
+        return row is not None
+
+    def _lease_held(self, key):
+        with db_cache.get_db_connection() as conn:
+            row = conn.execute("SELECT expires_ts FROM singleflight_leases WHERE flight_key = ?", (key,)).fetchone()
+        return row is not None and row['expires_ts'] >= time.time()
+
+    def _release(self, key):
+        with db_cache.get_db_connection() as conn:
+            conn.execute("DELETE FROM singleflight_leases WHERE flight_key = ? AND owner = ?", (key, self.owner))
+            conn.commit()
+
+    def _run(self, key, fn, recheck):
+        deadline = time.time() + self.lease_seconds * 2
+        while True:
+            if self._try_lease(key):
+                try:
+                    # Another process may have finished between our recheck and taking the lease
+                    result = recheck() if recheck is not None else None
+                    return result if result is not None else fn()
+                finally:
+                    self._release(key)
+            while self._lease_held(key):
+                result = recheck() if recheck is not None else None
+                if result is not None:
+                    return result
+                if time.time() > deadline:
+                    return fn()  # give up on coalescing rather than wait forever
+                time.sleep(SINGLEFLIGHT_POLL_SECONDS)
+            result = recheck() if recheck is not None else None
+            if result is not None:
+                return result
+
+_upstream_flights = None
+_upstream_flights_lock = threading.Lock()
+
+def get_upstream_flights():
+    """Returns the process-wide single-flight group for upstream fetches."""
+    global _upstream_flights
+    with _upstream_flights_lock:
+        if _upstream_flights is None:
+            _upstream_flights = SharedSingleFlight() if SINGLEFLIGHT_CROSS_PROCESS else SingleFlight()
+        return _upstream_flights
+
+if __name__ == "__main__":
+    # 100 concurrent callers for one key must cause exactly one upstream call,
+    # first within a process, then spread over 4 processes sharing a SQLite "cache"
+    import multiprocessing
+    import sqlite3
+    import tempfile
+
+    N_CALLERS = 100
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"temp": 21.5}
+
+    group = SingleFlight()
+    barrier = threading.Barrier(N_CALLERS)
+    results = []
+
+    def caller():
+        barrier.wait()
+        results.append(group.do("current:17.39:78.49", upstream))
+
+    threads = [threading.Thread(target=caller) for _ in range(N_CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, calls
+    assert all(result == {"temp": 21.5} for result, _ in results)
+    print(f"SingleFlight: {N_CALLERS} callers, {len(calls)} upstream call, "
+          f"{sum(shared for _, shared in results)} shared results")
+
+    def process_callers(db_path, n_threads, start_at):
+        flights = SharedSingleFlight()
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        lock = threading.Lock()
+
+        def cached():
+            with lock:
+                row = conn.execute("SELECT value FROM fake_cache WHERE key = 'k'").fetchone()
+            return row[0] if row else None
+
+        def fetch():
+            with lock:
+                conn.execute("INSERT INTO upstream_calls VALUES (?)", (os.getpid(),))
+            time.sleep(0.2)
+            with lock:
+                conn.execute("INSERT INTO fake_cache VALUES ('k', 'payload')")
+            return "payload"
+
+        def caller():
+            time.sleep(max(0.0, start_at - time.time()))
+            assert flights.do("k", fetch, recheck=cached)[0] == "payload"
+
+        threads = [threading.Thread(target=caller) for _ in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = db_cache.DB_NAME = os.path.join(tmp, "flights.db")
+        db_cache.init_db()
+        db_cache.close_db_connection()  # forked callers open their own
+        setup = sqlite3.connect(db_path, isolation_level=None)
+        setup.execute("PRAGMA journal_mode=WAL;")
+        setup.execute("CREATE TABLE upstream_calls (pid INTEGER)")
+        setup.execute("CREATE TABLE fake_cache (key TEXT PRIMARY KEY, value TEXT)")
+        start_at = time.time() + 1.0
+        procs = [multiprocessing.Process(target=process_callers, args=(db_path, N_CALLERS // 4, start_at))
+                 for _ in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        assert all(p.exitcode == 0 for p in procs)
+        upstream_calls = setup.execute("SELECT COUNT(*) FROM upstream_calls").fetchone()[0]
+        setup.close()
+    assert upstream_calls == 1, upstream_calls
+    print(f"SharedSingleFlight: {N_CALLERS} callers in 4 processes, {upstream_calls} upstream call")
@@ -0,0 +1,52 @@
+# stand_in_server.py
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenWeather endpoints, used by the module benchmarks
+# (python current_weather.py / http_client.py / historical_data_fetch.py)
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, Nagle + delayed ACK
+        # add ~40 ms to every response on a reused connection
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.server.on_connect is not None:
+            self.server.on_connect(self.client_address)
+
+    def do_GET(self):
+        status, headers, payload = self.server.respond(self.path)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded local HTTP server answering every GET with respond(path) -> (status, headers, JSON payload)."""
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 drops SYNs under a burst of connects
+
+    def __init__(self, respond, on_connect=None):
+        self.respond = respond
+        self.on_connect = on_connect  # called with each new connection's client address
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+
+    def handle_error(self, request, client_address):
+        pass  # slow handlers write to sockets the client already gave up on
+
+def start_stand_in_server(respond, on_connect=None):
+    """Starts a StandInServer on a free local port in a daemon thread; returns (server, base_url)."""
+    server = StandInServer(respond, on_connect)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"